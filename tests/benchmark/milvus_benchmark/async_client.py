@@ -0,0 +1,114 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.async_client")
+
+# the blocking calls running at the same time, the others wait in the queue of the executor,
+# the load runners set it to the in-flight bound of the case, e.g. max_in_flight of qps_search_performance
+DEFAULT_MAX_WORKERS = 64
+
+
+class AsyncMilvusClient(object):
+    """
+    asyncio facade of MilvusClient:
+        the blocking calls run in a dedicated executor, so that a single event loop schedules the requests
+        without the default executor of the loop being starved, up to max_workers of them are in flight,
+        each request is timed inside the worker thread, the time waiting for a free worker is recorded apart,
+        so the latency is not inflated by the client side queue
+    """
+
+    def __init__(self, client, max_workers=DEFAULT_MAX_WORKERS):
+        self._client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async_milvus")
+        self._lock = threading.Lock()
+        # {name: {"latency": LatencyHistogram, "wait": LatencyHistogram, "failures": int}}
+        self._stats = dict()
+
+    @property
+    def client(self):
+        return self._client
+
+    def _record(self, name, wait, latency, failed):
+        with self._lock:
+            item = self._stats.setdefault(name, {"latency": LatencyHistogram(), "wait": LatencyHistogram(),
+                                                 "failures": 0})
+            item["wait"].record(wait)
+            if failed:
+                item["failures"] += 1
+            else:
+                item["latency"].record(latency)
+
+    def _timed(self, name, submit_time, func, args, kwargs):
+        start_time = time.perf_counter()
+        failed = True
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._record(name, start_time - submit_time, time.perf_counter() - start_time, failed)
+
+    async def call(self, name, *args, **kwargs):
+        """ run the method of the client by name, e.g. await call("count") """
+        func = getattr(self._client, name)
+        loop = asyncio.get_running_loop()
+        submit_time = time.perf_counter()
+        return await loop.run_in_executor(
+            self._executor, lambda: self._timed(name, submit_time, func, args, kwargs))
+
+    async def insert(self, entities, collection_name=None, timeout=None):
+        return await self.call("insert", entities, collection_name=collection_name, timeout=timeout, log=False)
+
+    async def query(self, vector_query, filter_query=None, collection_name=None, timeout=300):
+        """ the vector search, named the same as MilvusClient.query """
+        return await self.call("query", vector_query, filter_query=filter_query, collection_name=collection_name,
+                               timeout=timeout, log=False)
+
+    async def get(self, ids, collection_name=None, timeout=None):
+        """ the query of the entities by ids """
+        return await self.call("get", ids, collection_name=collection_name, timeout=timeout, log=False)
+
+    async def flush(self, collection_name=None, timeout=None):
+        return await self.call("flush", collection_name=collection_name, timeout=timeout)
+
+    async def load_collection(self, collection_name=None, timeout=3000):
+        return await self.call("load_collection", collection_name=collection_name, timeout=timeout)
+
+    async def release_collection(self, collection_name=None, timeout=3000):
+        return await self.call("release_collection", collection_name=collection_name, timeout=timeout)
+
+    def stats(self):
+        """ {name: {"requests", "failures", "latency", "wait"}}, the summaries in milliseconds """
+        with self._lock:
+            return {name: {
+                "requests": item["wait"].count,
+                "failures": item["failures"],
+                "latency": item["latency"].summary(),
+                "wait": item["wait"].summary()
+            } for name, item in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = dict()
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+async def gather_bounded(calls, concurrency):
+    """
+    run the calls, zero-argument coroutine functions, with at most concurrency of them in flight,
+    return the results in the order of the calls, the exception raised by a call is returned as its result
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(call):
+        async with semaphore:
+            return await call()
+
+    return await asyncio.gather(*[run(call) for call in calls], return_exceptions=True)
@@ -0,0 +1,194 @@
+import time
+import queue
+import socket
+import struct
+import logging
+import threading
+
+logger = logging.getLogger("milvus_benchmark.chaos.proxy")
+
+LOCAL_HOST = "127.0.0.1"
+BUFFER_SIZE = 65536
+POLL_INTERVAL = 0.1
+DISCONNECT = "disconnect"
+DELAY = "delay"
+BLACKHOLE = "blackhole"
+ACTIONS = [DISCONNECT, DELAY, BLACKHOLE]
+
+
+def reset(sock):
+    """ close with RST instead of FIN, as the peer process is gone """
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    except OSError:
+        pass
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+class ProxyConnection(object):
+    def __init__(self, client, server):
+        self.client = client
+        self.server = server
+        self.closed = False
+
+
+class FaultProxy(object):
+    """
+    Local TCP proxy in front of the server, the stand-in of chaos mesh to run the chaos cases without kubernetes,
+    the clients connect to the proxy port, the faults:
+        disconnect: the open connections are reset and the new ones are refused, as the server pod is killed
+        delay: every chunk is forwarded delay seconds after it is received, as the network delay,
+            the throughput is kept as the chunks in flight are queued
+        blackhole: nothing is forwarded until the recovery, as the network partition
+    """
+
+    def __init__(self, target_host, target_port, listen_host=LOCAL_HOST, listen_port=0):
+        self._target = (target_host, int(target_port))
+        self._listen = (listen_host, listen_port)
+        self._sock = None
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._action = None
+        self._delay = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._listen[0]
+
+    @property
+    def port(self):
+        return self._sock.getsockname()[1]
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(self._listen)
+        self._sock.listen(128)
+        self._sock.settimeout(POLL_INTERVAL)
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+        logger.info("Proxy %s:%d -> %s:%d" % (self.host, self.port, self._target[0], self._target[1]))
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self._sock.close()
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            self._close(conn)
+
+    def inject(self, action, delay=0):
+        if action not in ACTIONS:
+            raise Exception("Proxy fault: %s not supported" % action)
+        logger.info("Inject proxy fault: %s" % action)
+        self._delay = delay
+        self._action = action
+        if action == DISCONNECT:
+            with self._lock:
+                connections = list(self._connections)
+            for conn in connections:
+                self._close(conn, rst=True)
+
+    def recover(self):
+        logger.info("Recover proxy fault: %s" % self._action)
+        self._action = None
+
+    def _accept(self):
+        while not self._stopped.is_set():
+            try:
+                client, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if self._action == DISCONNECT:
+                reset(client)
+                continue
+            try:
+                server = socket.create_connection(self._target, timeout=10)
+            except OSError as e:
+                logger.debug("Proxy connect failed: %s" % str(e))
+                reset(client)
+                continue
+            for sock in [client, server]:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.settimeout(POLL_INTERVAL)
+            conn = ProxyConnection(client, server)
+            with self._lock:
+                self._connections.add(conn)
+            for src, dst in [(client, server), (server, client)]:
+                # one queue per direction, the chunks with the time they are due to be forwarded
+                chunks = queue.Queue()
+                threading.Thread(target=self._pump, args=(conn, src, chunks), daemon=True).start()
+                threading.Thread(target=self._forward, args=(conn, dst, chunks), daemon=True).start()
+
+    def _pump(self, conn, src, chunks):
+        """ receive from src and queue the chunks, None is queued at the end of the stream """
+        try:
+            while not conn.closed and not self._stopped.is_set():
+                if self._action == BLACKHOLE:
+                    # the data is kept in the socket buffers, as the packets are retransmitted after a partition
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                try:
+                    data = src.recv(BUFFER_SIZE)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                delay = self._delay if self._action == DELAY else 0
+                chunks.put((time.perf_counter() + delay, data))
+        except OSError:
+            self._close(conn)
+        finally:
+            chunks.put((time.perf_counter(), None))
+
+    def _forward(self, conn, dst, chunks):
+        """ send the queued chunks to dst in order, each one once it is due """
+        try:
+            while not conn.closed and not self._stopped.is_set():
+                try:
+                    due_time, data = chunks.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                # queued before the blackhole is injected, held until the recovery
+                while self._action == BLACKHOLE and not conn.closed:
+                    time.sleep(POLL_INTERVAL)
+                wait = due_time - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                if data is None:
+                    break
+                while data and not conn.closed:
+                    try:
+                        sent = dst.send(data)
+                    except socket.timeout:
+                        continue
+                    data = data[sent:]
+        except OSError:
+            pass
+        finally:
+            self._close(conn)
+
+    def _close(self, conn, rst=False):
+        with self._lock:
+            if conn.closed:
+                return
+            conn.closed = True
+            self._connections.discard(conn)
+        for sock in [conn.client, conn.server]:
+            if rst:
+                reset(sock)
+            else:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
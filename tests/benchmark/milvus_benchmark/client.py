@@ -11,6 +11,7 @@ import numpy as np
 import utils
 import config
 from milvus_benchmark.runners import utils
+from milvus_benchmark.pool import connect, DeadlineHandle
 
 logger = logging.getLogger("milvus_benchmark.client")
 
@@ -55,39 +56,42 @@ def time_wrapper(func):
 
 
 class MilvusClient(object):
-    def __init__(self, collection_name=None, host=None, port=None, timeout=300):
+    def __init__(self, collection_name=None, host=None, port=None, timeout=config.CONNECT_TIMEOUT, pool=None):
+        """
+        pool: borrow a connection from the pool, e.g. get_pool(host, port), instead of creating a new one,
+        the connection is given back by close()
+        """
         self._collection_name = collection_name
         self._collection_info = None
-        start_time = time.time()
+        self._dimension = None
+        self._pool = pool
+        self._conn = None
         if not host:
             host = config.SERVER_HOST_DEFAULT
         if not port:
             port = config.SERVER_PORT_DEFAULT
-        # retry connect remote server
-        i = 0
-        while time.time() < start_time + timeout:
-            try:
-                self._milvus = Milvus(
-                    host=host,
-                    port=port,
-                    try_connect=False,
-                    pre_ping=False)
-                break
-            except Exception as e:
-                logger.error(str(e))
-                logger.error("Milvus connect failed: %d times" % i)
-                i = i + 1
-                time.sleep(30)
-
-        if time.time() > start_time + timeout:
-            raise Exception("Server connect timeout")
+        if pool is not None:
+            self._conn = pool.acquire()
+            milvus = self._conn.milvus
+        else:
+            # retry connect remote server with backoff
+            milvus = connect(host, port, timeout=timeout)
+        # the requests called without a timeout are given the default deadline
+        self._milvus = DeadlineHandle(milvus)
         # self._metric_type = None
 
+    def close(self):
+        """ give the borrowed connection back to the pool """
+        if self._pool is not None and self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
     def __str__(self):
         return 'Milvus collection %s' % self._collection_name
 
     def set_collection(self, collection_name):
         self._collection_name = collection_name
+        self._dimension = None
 
     # TODO: server not support
     # def check_status(self, status):
@@ -243,18 +247,32 @@ class MilvusClient(object):
     @time_wrapper
     def compact(self, collection_name=None):
         tmp_collection_name = self._collection_name if collection_name is None else collection_name
-        status = self._milvus.compact(tmp_collection_name)
-        self.check_status(status)
+        return self._milvus.compact(tmp_collection_name)
 
     # only support "in" in expr
     @time_wrapper
     def get(self, ids, collection_name=None, timeout=None):
         tmp_collection_name = self._collection_name if collection_name is None else collection_name
         # res = self._milvus.get(tmp_collection_name, ids, output_fields=None, partition_names=None)
-        ids_expr = "id in %s" % (str(ids))
+        ids_expr = utils.ids_to_expr(ids)
         res = self._milvus.query(tmp_collection_name, ids_expr, output_fields=None, partition_names=None, timeout=timeout)
         return res
 
+    @time_wrapper
+    def query_expr(self, expr, collection_name=None, timeout=None):
+        """ query by an expr built by the caller, so the expr building is not timed with the request """
+        tmp_collection_name = self._collection_name if collection_name is None else collection_name
+        return self._milvus.query(tmp_collection_name, expr, output_fields=None, partition_names=None, timeout=timeout)
+
+    @time_wrapper
+    def delete_expr(self, expr, collection_name=None, timeout=None):
+        """ delete the entities matched by the expr, only "in" on the primary field is supported by the server """
+        tmp_collection_name = self._collection_name if collection_name is None else collection_name
+        try:
+            return self._handler_call("delete", tmp_collection_name, expr, timeout=timeout)
+        except AttributeError:
+            raise Exception("Delete by expr is not supported by the installed pymilvus")
+
     @time_wrapper
     def create_index(self, field_name, index_type, metric_type, _async=False, index_param=None):
         index_type = INDEX_MAP[index_type]
@@ -285,6 +303,30 @@ class MilvusClient(object):
                     index_info['index_type'] = k
         return index_info
 
+    def _handler_call(self, name, *args, **kwargs):
+        """ the calls not exposed by the Milvus stub of some pymilvus versions are sent by the grpc handler """
+        func = getattr(self._milvus, name, None)
+        if func is not None:
+            return func(*args, **kwargs)
+        with self._milvus._connection() as handler:
+            return getattr(handler, name)(*args, **kwargs)
+
+    def get_index_state(self, field_name, collection_name=None, timeout=30):
+        """ return (state, fail_reason), the state is common.IndexState of the whole collection """
+        tmp_collection_name = self._collection_name if collection_name is None else collection_name
+        return self._handler_call("get_index_state", tmp_collection_name, field_name, timeout=timeout)
+
+    def get_index_build_progress(self, field_name, collection_name=None, timeout=30):
+        """ return {"total_rows", "indexed_rows"} of the sealed segments """
+        tmp_collection_name = self._collection_name if collection_name is None else collection_name
+        return self._handler_call("get_index_build_progress", tmp_collection_name, field_name, timeout=timeout)
+
+    def get_segment_infos(self, collection_name=None, timeout=30):
+        """ the persistent segments: [{"segment_id", "num_rows", "state"}], the state is common.SegmentState """
+        tmp_collection_name = self._collection_name if collection_name is None else collection_name
+        infos = self._handler_call("get_persistent_segment_infos", tmp_collection_name, timeout=timeout)
+        return [{"segment_id": info.segmentID, "num_rows": info.num_rows, "state": info.state} for info in infos or []]
+
     def drop_index(self, field_name):
         logger.info("Drop index: %s" % self._collection_name)
         return self._milvus.drop_index(self._collection_name, field_name)
@@ -303,7 +345,15 @@ class MilvusClient(object):
 
     @time_wrapper
     def warm_query(self, index_field_name, search_param, metric_type, times=2):
-        query_vectors = [[random.random() for _ in range(self._dimension)] for _ in range(DEFAULT_WARM_QUERY_NQ)]
+        if not self._dimension:
+            self._dimension = self.get_dimension()
+        field_types = {field["name"]: field["type"] for field in self.get_info()["fields"]}
+        if field_types.get(index_field_name) == DataType.BINARY_VECTOR:
+            # packed bits, dimension / 8 bytes per vector
+            query_vectors = [bytes(random.getrandbits(8) for _ in range(self._dimension // 8))
+                             for _ in range(DEFAULT_WARM_QUERY_NQ)]
+        else:
+            query_vectors = [[random.random() for _ in range(self._dimension)] for _ in range(DEFAULT_WARM_QUERY_NQ)]
         # index_info = self.describe_index(index_field_name)
         vector_query = {"vector": {index_field_name: {
             "topk": DEFAULT_WARM_QUERY_TOPK, 
@@ -1,8 +1,16 @@
 MONGO_SERVER = 'mongodb://192.168.1.234:27017/'
 # MONGO_SERVER = 'mongodb://mongodb.test:27017/'
 
+# where the results are saved: mongo or sqlite
+RESULT_SINK = "mongo"
+SQLITE_PATH = "benchmark_results.db"
+RESULT_BATCH_SIZE = 50
+RESULT_FLUSH_INTERVAL = 5
+
 SCHEDULER_DB = "scheduler"
 JOB_COLLECTION = "jobs"
+# persistent job queue of the scheduler
+SCHEDULER_DB_PATH = "scheduler.db"
 
 REGISTRY_URL = "registry.zilliz.com/milvus/milvus"
 IDC_NAS_URL = "//172.16.70.249/test"
@@ -10,7 +18,26 @@ DEFAULT_IMAGE = "milvusdb/milvus:latest"
 
 SERVER_HOST_DEFAULT = "127.0.0.1"
 SERVER_PORT_DEFAULT = 19530
+# connections shared by the clients of one server in a process
+CONNECTION_POOL_SIZE = 16
+CONNECT_TIMEOUT = 300
+HEALTH_CHECK_INTERVAL = 30
+# default deadline in seconds of the requests called without a timeout
+CALL_TIMEOUTS = {
+    "insert": 300,
+    "search": 300,
+    "query": 300,
+    "delete": 300,
+    "has_collection": 60,
+    "describe_collection": 60,
+    "get_collection_stats": 60,
+    "describe_index": 60,
+    "list_collections": 60
+}
 SERVER_VERSION = "2.0.0-RC7"
+# prometheus metrics exported by milvus, polled by the resource sampler, 0 means disabled
+SERVER_METRICS_PORT = 9091
+RESOURCE_SAMPLE_INTERVAL = 1
 DEFUALT_DEPLOY_MODE = "single"
 
 
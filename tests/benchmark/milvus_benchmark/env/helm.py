@@ -1,5 +1,6 @@
 import os
 import time
+import shutil
 import pdb
 import logging
 import traceback
@@ -31,27 +32,20 @@ class HelmEnv(BaseEnv):
 
         logger.debug(self.deploy_mode)
         server_config = helm_utils.update_server_config(server_name, server_tag, server_config)
-        # update values
-        values_file_path = helm_path + "/values.yaml"
-        if not os.path.exists(values_file_path):
-            raise Exception("File {} not existed".format(values_file_path))
-        lock_file_path = helm_path + "/values.yaml.lock"
-        start_time = time.time()
-        while os.path.exists(lock_file_path) and time.time() < start_time+TIMEOUT:
-            logger.debug("Waiting for the lock file to release")
-            time.sleep(1)
-        if not os.path.exists(lock_file_path):
-            # generate lock file
-            open(lock_file_path, 'a').close()
+        # each job deploys from its own copy of the chart, the values of the concurrent jobs are apart,
+        # it is placed beside the chart so that the relative paths of the dependencies still resolve
+        job_helm_path = "%s-%s" % (helm_path.rstrip("/"), self.name)
         try:
+            shutil.copytree(helm_path, job_helm_path, symlinks=True)
+            values_file_path = job_helm_path + "/values.yaml"
+            if not os.path.exists(values_file_path):
+                raise Exception("File {} not existed".format(values_file_path))
             if milvus_config:
                 helm_utils.update_values(values_file_path, self.deploy_mode, server_name, server_tag, milvus_config, server_config)
-                logger.debug("Config file has been updated, remove the lock file")
-            os.system("rm -rf %s" % lock_file_path)
+                logger.debug("Config file has been updated")
             logger.debug("Start install server")
-            hostname = helm_utils.helm_install_server(helm_path, self.deploy_mode, image_tag, image_type, self.name,
+            hostname = helm_utils.helm_install_server(job_helm_path, self.deploy_mode, image_tag, image_type, self.name,
                                                        self._name_space)
-            status_cmd = 'kubectl get pods -n milvus -l release=zong-standalone -o=jsonpath=\'{range .items[*]}{.metadata.name}{"\t"}{.status.phase}{"\n"}{end}\''
             if not hostname:
                 logger.error("Helm install server failed")
                 return False
@@ -62,10 +56,11 @@ class HelmEnv(BaseEnv):
                 else:
                     return hostname
         except Exception as e:
-            os.system("rm -rf %s" % lock_file_path)
             logger.error("Helm install server failed: %s" % (str(e)))
             logger.error(traceback.format_exc())
             return False
+        finally:
+            shutil.rmtree(job_helm_path, ignore_errors=True)
 
     def tear_down(self):
         logger.debug("Start clean up: {}.{}".format(self.name, self._name_space))
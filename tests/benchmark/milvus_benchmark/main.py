@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import time
 import argparse
 import logging
@@ -12,9 +13,11 @@ from milvus_benchmark.metrics.models.env import Env
 from milvus_benchmark.env import get_env
 from milvus_benchmark.runners import get_runner
 from milvus_benchmark.metrics import api
+from milvus_benchmark.metrics.sampler import ResourceSampler
+from milvus_benchmark.metrics import regression
 from milvus_benchmark import config, utils
 from milvus_benchmark import parser
-# from scheduler import back_scheduler
+from milvus_benchmark.scheduler import JobQueue, Scheduler, DEFAULT_RETRIES
 from logs import log
 
 log.setup_logging()
@@ -42,6 +45,60 @@ def get_image_tag(image_version):
 #         back_scheduler.shutdown(wait=False)
 
 
+def get_suite_timeout(suite):
+    """ the job is terminated when running over the timeout, e.g. 2h """
+    return utils.timestr_to_int(suite["timeout"]) if "timeout" in suite else None
+
+
+def parse_endpoints(endpoints):
+    """ host:port,host:port -> [{"host": host, "port": port}] """
+    result = []
+    for endpoint in endpoints.split(","):
+        host, _, port = endpoint.strip().partition(":")
+        result.append({"host": host, "port": port or str(config.SERVER_PORT_DEFAULT)})
+    return result
+
+
+def get_run_ids(job_queue):
+    """ the run ids stamped on the jobs of the batch, one for each invocation adding jobs """
+    return sorted(set([job["env_params"]["run_id"] for job in job_queue.jobs() if "run_id" in job["env_params"]]))
+
+
+def check_regression(window, threshold, run_ids=None):
+    """
+    compare the runs, the latest one by default, with the former runs saved in the result sink,
+    return False if regressed
+    """
+    api.flush()
+    sink = api.get_sink()
+    try:
+        docs = sink.read()
+    finally:
+        sink.close()
+    report = regression.detect_regressions(docs, run_ids=run_ids, window=window, threshold=threshold)
+    regression.log_report(report)
+    return not report
+
+
+def get_sampler(env):
+    metrics_url = None
+    if config.SERVER_METRICS_PORT and env.hostname:
+        metrics_url = "http://%s:%d/metrics" % (env.hostname, config.SERVER_METRICS_PORT)
+    return ResourceSampler(metrics_url=metrics_url, interval=config.RESOURCE_SAMPLE_INTERVAL)
+
+
+def group_cases(runner, cases):
+    """
+    Split the case indexes by the group key of the runner,
+    the groups keep the order of their first case and the cases keep their order inside the group
+    """
+    groups = dict()
+    for index, case in enumerate(cases):
+        key = json.dumps(runner.group_key(case), sort_keys=True, default=str)
+        groups.setdefault(key, []).append(index)
+    return list(groups.values())
+
+
 def run_suite(run_type, suite, env_mode, env_params, timeout=None):
     try:
         start_status = False
@@ -49,7 +106,7 @@ def run_suite(run_type, suite, env_mode, env_params, timeout=None):
         deploy_mode = env_params["deploy_mode"]
         deploy_opology = env_params["deploy_opology"] if "deploy_opology" in env_params else None
         env = get_env(env_mode, deploy_mode)
-        metric.set_run_id()
+        metric.set_run_id(env_params.get("run_id"))
         metric.set_mode(env_mode)
         metric.env = Env()
         metric.server = Server(version=config.SERVER_VERSION, mode=deploy_mode, deploy_opology=deploy_opology)
@@ -74,33 +131,53 @@ def run_suite(run_type, suite, env_mode, env_params, timeout=None):
             logger.debug("Get runner")
             runner = get_runner(run_type, env, metric)
             cases, case_metrics = runner.extract_cases(suite)
-            # TODO: only run when the as_group is equal to True
-            logger.info("Prepare to run cases")
-            runner.prepare(**cases[0])
             logger.info("Start run case")
             suite_status = True
-            for index, case in enumerate(cases):
-                case_metric = case_metrics[index]
-                result = None
-                err_message = ""
+            # cases with the same group key share one prepare, e.g. the same collection and index
+            for group in group_cases(runner, cases):
+                logger.info("Prepare to run cases: %s" % str(group))
+                prepare_err_message = ""
                 try:
-                    result = runner.run_case(case_metric, **case)
+                    runner.prepare(**cases[group[0]])
                 except Exception as e:
-                    err_message = str(e) + "\n" + traceback.format_exc()
+                    prepare_err_message = str(e) + "\n" + traceback.format_exc()
                     logger.error(traceback.format_exc())
-                logger.info(result)
-                if result:
-                    # Save the result of this test as true, and save the related test value results
-                    case_metric.update_status(status="RUN_SUCC")
-                    case_metric.update_result(result)
-                else:
-                    # The test run fails, save the related errors of the run method
-                    case_metric.update_status(status="RUN_FAILED")
-                    case_metric.update_message(err_message)
-                    suite_status = False
-                logger.debug(case_metric.metrics)
-                if deploy_mode:
-                    api.save(case_metric)
+                for index in group:
+                    case = cases[index]
+                    case_metric = case_metrics[index]
+                    result = None
+                    err_message = prepare_err_message
+                    if not prepare_err_message:
+                        sampler = get_sampler(env)
+                        sampler.start()
+                        try:
+                            result = runner.run_case(case_metric, **case)
+                        except Exception as e:
+                            err_message = str(e) + "\n" + traceback.format_exc()
+                            logger.error(traceback.format_exc())
+                        resources = sampler.stop()
+                        case_metric.update_resources(resources)
+                        if resources["client_saturated"]:
+                            logger.warning("Client cpu saturated: %s" % json.dumps(resources["summary"]))
+                        elif resources["host_saturated"]:
+                            logger.warning("Client host cpu saturated: %s" % json.dumps(resources["summary"]))
+                    logger.info(result)
+                    if result:
+                        # Save the result of this test as true, and save the related test value results
+                        case_metric.update_status(status="RUN_SUCC")
+                        case_metric.update_result(result)
+                    else:
+                        # The test run fails, save the related errors of the run method
+                        case_metric.update_status(status="RUN_FAILED")
+                        case_metric.update_message(err_message)
+                        suite_status = False
+                    logger.debug(case_metric.metrics)
+                    if deploy_mode:
+                        api.save(case_metric)
+            try:
+                runner.summarize(case_metrics)
+            except Exception as e:
+                logger.error(traceback.format_exc())
             if suite_status:
                 metric.update_status(status="RUN_SUCC")
             else:
@@ -161,6 +238,41 @@ def main():
         metavar='FILE',
         help='load server config from FILE',
         default='')
+    arg_parser.add_argument(
+        '--check-regression',
+        action='store_true',
+        help='compare the latest run with the former runs, exit with non-zero code if regressed')
+    arg_parser.add_argument(
+        '--regression-window',
+        type=positive_int,
+        help='number of former runs used as the baseline',
+        default=regression.DEFAULT_WINDOW)
+    arg_parser.add_argument(
+        '--regression-threshold',
+        type=float,
+        help='min relative change reported as regression',
+        default=regression.DEFAULT_THRESHOLD)
+
+    # scheduler
+    arg_parser.add_argument(
+        '--endpoints',
+        help='server endpoints for local mode, e.g. host1:19530,host2:19530, one suite runs on each at a time',
+        default='')
+    arg_parser.add_argument(
+        '--parallel',
+        type=positive_int,
+        help='number of suites deployed and run at the same time in helm mode',
+        default=1)
+    arg_parser.add_argument(
+        '--resume',
+        metavar='BATCH',
+        help='resume the job batch of a killed run instead of adding the jobs of the suites',
+        default='')
+    arg_parser.add_argument(
+        '--retries',
+        type=int,
+        help='times to retry the failed or timeout suite',
+        default=DEFAULT_RETRIES)
 
     args = arg_parser.parse_args()
 
@@ -175,7 +287,11 @@ def main():
             schedule_config = full_load(f)
             f.close()
         helm_path = os.path.join(os.getcwd(), "..//milvus-helm-charts/charts/milvus-ha")
-        for item in schedule_config:
+        job_queue = JobQueue(batch=args.resume, resume=bool(args.resume))
+        logger.info("Job batch: %s" % job_queue.batch)
+        # one run id for all the suites of the invocation
+        run_id = int(time.time())
+        for item in ([] if args.resume else schedule_config):
             server_host = item["server"] if "server" in item else ""
             server_tag = item["server_tag"] if "server_tag" in item else ""
             deploy_mode = item["deploy_mode"] if "deploy_mode" in item else config.DEFAULT_DEPLOY_MODE
@@ -207,12 +323,23 @@ def main():
                     env_params = {
                         "deploy_mode": deploy_mode,
                         "helm_path": helm_path,
-                        "helm_params": helm_params
+                        "helm_params": helm_params,
+                        "run_id": run_id
                     }
-                    # job = back_scheduler.add_job(run_suite, args=[run_type, suite, env_mode, env_params],
-                    #                              misfire_grace_time=36000)
-                    # logger.info(job)
-                    # logger.info(job.id)
+                    job_id = job_queue.add(run_type, suite, env_mode, env_params, timeout=get_suite_timeout(suite),
+                                           retries=args.retries)
+                    logger.info("Add job %d: %s, suite: %s" % (job_id, run_type, suite_param["suite"]))
+        # each slot deploys its own helm release
+        scheduler = Scheduler(run_suite, job_queue, [{"slot": i} for i in range(args.parallel)])
+        result = scheduler.run()
+        if args.check_regression:
+            result = check_regression(args.regression_window, args.regression_threshold,
+                                      run_ids=get_run_ids(job_queue)) and result
+        return result
+
+    elif args.check_regression and not args.local:
+        # check the results saved by the former runs only
+        return check_regression(args.regression_window, args.regression_threshold)
 
     elif args.local:
         # for local mode
@@ -230,7 +357,9 @@ def main():
             "port": args.port,
             "deploy_mode": deploy_mode,
             "server_tag": server_tag,
-            "deploy_opology": deploy_params_dict
+            "deploy_opology": deploy_params_dict,
+            # one run id for all the collections of the invocation
+            "run_id": int(time.time())
         }
         suite_file = args.suite
         with open(suite_file) as f:
@@ -239,17 +368,18 @@ def main():
         logger.debug(suite_dict)
         run_type, run_params = parser.operations_parser(suite_dict)
         collections = run_params["collections"]
-        if len(collections) > 1:
-            raise Exception("Multi collections not supported in Local Mode")
-        # ensure there is only one case in suite
-        # suite = {"run_type": run_type, "run_params": collections[0]}
-        suite = collections[0]
-        timeout = suite["timeout"] if "timeout" in suite else None
         env_mode = "local"
-        return run_suite(run_type, suite, env_mode, env_params, timeout=timeout)
-        # job = back_scheduler.add_job(run_suite, args=[run_type, suite, env_mode, env_params], misfire_grace_time=36000)
-        # logger.info(job)
-        # logger.info(job.id)
+        endpoints = parse_endpoints(args.endpoints) if args.endpoints else [{"host": args.host, "port": args.port}]
+        # every collection of the suite is a job, run concurrently on the endpoints
+        job_queue = JobQueue(batch=args.resume, resume=bool(args.resume))
+        logger.info("Job batch: %s" % job_queue.batch)
+        for suite in ([] if args.resume else collections):
+            job_queue.add(run_type, suite, env_mode, env_params, timeout=get_suite_timeout(suite), retries=args.retries)
+        result = Scheduler(run_suite, job_queue, endpoints).run()
+        if args.check_regression:
+            result = check_regression(args.regression_window, args.regression_threshold,
+                                      run_ids=get_run_ids(job_queue)) and result
+        return result
 
 
 if __name__ == "__main__":
@@ -267,6 +397,9 @@ if __name__ == "__main__":
         logger.error(traceback.format_exc())
         # back_scheduler.shutdown(wait=False)
         sys.exit(-2)
+    finally:
+        # wait for the results written in background
+        api.close()
     # block_scheduler.shutdown(wait=False)
     logger.info("All tests run finshed")
     sys.exit(0)
@@ -1,26 +1,40 @@
-import pdb
+import copy
 import logging
-from pymongo import MongoClient
+import threading
 
 from .models.env import Env
 from .models.hardware import Hardware
 from .models.metric import Metric
 from .models.server import Server
-from .config import DB, UNIQUE_ID_COLLECTION, DOC_COLLECTION
+from .sink import MongoSink, SQLiteSink, AsyncWriter, MODEL_KEYS
 from milvus_benchmark import config
 
 
-# Initialize the mongoDB client
-_client = MongoClient(config.MONGO_SERVER)
 logger = logging.getLogger("milvus_benchmark.metric.api")
 
+# created at the first save, no connection is made when nothing is saved
+_writer = None
+_writer_lock = threading.Lock()
 
-def insert_or_get(md5):
-    collection = _client[DB][UNIQUE_ID_COLLECTION]
-    found = collection.find_one({'md5': md5})
-    if not found:
-        return collection.insert_one({'md5': md5}).inserted_id
-    return found['_id']
+
+def get_sink(sink_type=None):
+    if sink_type is None:
+        sink_type = config.RESULT_SINK
+    if sink_type == "mongo":
+        return MongoSink(config.MONGO_SERVER)
+    elif sink_type == "sqlite":
+        return SQLiteSink(config.SQLITE_PATH)
+    else:
+        raise Exception("Result sink: %s not supported" % sink_type)
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AsyncWriter(get_sink(), batch_size=config.RESULT_BATCH_SIZE,
+                                  flush_interval=config.RESULT_FLUSH_INTERVAL)
+        return _writer
 
 
 def save(obj):
@@ -41,17 +55,26 @@ def save(obj):
         logger.error("obj.env is not instance of Env")
         return False
 
-    md5 = obj.server.json_md5()
-    server_doc_id = insert_or_get(md5)
-    obj.server = {"id": server_doc_id, "value": vars(obj.server)}
+    # take a snapshot, the metric may be changed after save
+    doc = dict()
+    for key, value in vars(obj).items():
+        if key in MODEL_KEYS:
+            doc[key] = {"md5": value.json_md5(), "value": copy.deepcopy(vars(value))}
+        else:
+            doc[key] = copy.deepcopy(value)
+    get_writer().save(doc)
+    return True
+
 
-    md5 = obj.hardware.json_md5()
-    hardware_doc_id = insert_or_get(md5)
-    obj.hardware = {"id": hardware_doc_id, "value": vars(obj.hardware)}
+def flush():
+    """ block until the saved metrics are written """
+    if _writer is not None:
+        _writer.flush()
 
-    md5 = obj.env.json_md5()
-    env_doc_id = insert_or_get(md5)
-    obj.env = {"id": env_doc_id, "value": vars(obj.env)}
 
-    collection = _client[DB][DOC_COLLECTION]
-    collection.insert_one(vars(obj))
+def close():
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
@@ -27,10 +27,13 @@ class Metric(object):
             "type": "",
             "value": None,
         }
+        # resource usage sampled while running the case
+        self.resources = {}
         self.datetime = str(datetime.datetime.now())
 
-    def set_run_id(self):
-        self.run_id = int(time.time())
+    def set_run_id(self, run_id=None):
+        """ the suites run by one invocation share its run id, so that they are checked for regression together """
+        self.run_id = int(time.time()) if run_id is None else run_id
 
     def set_mode(self, mode):
         self.mode = mode
@@ -49,5 +52,8 @@ class Metric(object):
     def update_result(self, result):
         self.metrics["value"].update(result)
 
+    def update_resources(self, resources):
+        self.resources = resources
+
     def update_message(self, err_message):
         self.err_message = err_message
\ No newline at end of file
@@ -0,0 +1,151 @@
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger("milvus_benchmark.metrics.regression")
+
+HIGHER_IS_BETTER = 1
+LOWER_IS_BETTER = -1
+# the values compared across runs, nested keys are joined with "."
+REGRESSION_METRICS = {
+    "qps": HIGHER_IS_BETTER,
+    "rps": HIGHER_IS_BETTER,
+    "recall": HIGHER_IS_BETTER,
+    "acc": HIGHER_IS_BETTER,
+    "search_time": LOWER_IS_BETTER,
+    "avc_search_time": LOWER_IS_BETTER,
+    "latency.p50": LOWER_IS_BETTER,
+    "latency.p99": LOWER_IS_BETTER,
+    "build_time": LOWER_IS_BETTER,
+    "get_time": LOWER_IS_BETTER,
+    "avg_response_time": LOWER_IS_BETTER
+}
+DEFAULT_WINDOW = 10
+# the change is reported only when it is both significant and larger than the threshold
+DEFAULT_THRESHOLD = 0.05
+DEFAULT_P_VALUE = 0.05
+DEFAULT_Z_SCORE = 3.0
+MIN_BASELINE_SIZE = 3
+# at least MIN_SAMPLE_SIZE values in the run and in the baseline to apply the rank test
+MIN_SAMPLE_SIZE = 3
+
+
+def case_key(doc):
+    """ the cases are comparable across runs when the run type, params and hardware are the same """
+    key = {
+        "run_type": doc["metrics"]["type"],
+        "collection": doc.get("collection"),
+        "index": doc.get("index"),
+        "search": doc.get("search"),
+        "run_params": doc.get("run_params"),
+        "hardware": doc["hardware"]["id"] if isinstance(doc.get("hardware"), dict) else None
+    }
+    return json.dumps(key, sort_keys=True, default=str)
+
+
+def get_value(value, name):
+    for key in name.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def robust_z_score(baseline, value):
+    """ distance to the median of the baseline, in units of the scaled median absolute deviation """
+    median = np.median(baseline)
+    mad = 1.4826 * np.median(np.abs(np.array(baseline) - median))
+    if mad == 0:
+        return 0.0 if value == median else np.inf * np.sign(value - median)
+    return (value - median) / mad
+
+
+def compare(baseline, current, direction, threshold=DEFAULT_THRESHOLD, p_value=DEFAULT_P_VALUE,
+            z_score=DEFAULT_Z_SCORE):
+    """
+    Compare the values of the current run with the baseline of the former runs,
+    return None if there is no regression, otherwise the change towards the worse direction
+    """
+    baseline_median = float(np.median(baseline))
+    current_median = float(np.median(current))
+    if baseline_median == 0:
+        return None
+    # positive means worse
+    change = (baseline_median - current_median) / abs(baseline_median) * direction
+    if change <= threshold:
+        return None
+    result = {
+        "baseline": round(baseline_median, 4),
+        "current": round(current_median, 4),
+        "change": round(change, 4)
+    }
+    if len(current) >= MIN_SAMPLE_SIZE and len(baseline) >= MIN_SAMPLE_SIZE:
+        try:
+            from scipy.stats import mannwhitneyu
+            alternative = "less" if direction == HIGHER_IS_BETTER else "greater"
+            _, p = mannwhitneyu(current, baseline, alternative=alternative)
+            if p >= p_value:
+                return None
+            result.update({"method": "mannwhitneyu", "p_value": round(float(p), 6)})
+            return result
+        except ImportError:
+            logger.warning("scipy not installed, use the robust z-score")
+    z = robust_z_score(baseline, current_median) * direction
+    if z > -z_score:
+        return None
+    result.update({"method": "robust_z_score", "z_score": round(float(z), 4) if np.isfinite(z) else None})
+    return result
+
+
+def detect_regressions(docs, run_ids=None, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD):
+    """
+    docs: the saved case docs
+    run_ids: the runs to check, e.g. the run of every suite of the invocation, the latest run by default
+    Each case of a run is compared with the same case in the former `window` runs,
+    return the regressions ranked by the change
+    """
+    docs = [doc for doc in docs if doc.get("status") == "RUN_SUCC" and doc.get("run_id") is not None]
+    if not docs:
+        return []
+    if not run_ids:
+        run_ids = [max([doc["run_id"] for doc in docs])]
+    groups = dict()
+    for doc in docs:
+        groups.setdefault(case_key(doc), []).append(doc)
+    report = []
+    for run_id in sorted(set(run_ids)):
+        for key, group in groups.items():
+            current_docs = [doc for doc in group if doc["run_id"] == run_id]
+            if not current_docs:
+                continue
+            # rolling baseline: the latest former runs of the same case
+            baseline_run_ids = sorted(set([doc["run_id"] for doc in group if doc["run_id"] < run_id]))[-window:]
+            baseline_docs = [doc for doc in group if doc["run_id"] in baseline_run_ids]
+            for name, direction in REGRESSION_METRICS.items():
+                current = [get_value(doc["metrics"]["value"], name) for doc in current_docs]
+                current = [x for x in current if x is not None]
+                baseline = [get_value(doc["metrics"]["value"], name) for doc in baseline_docs]
+                baseline = [x for x in baseline if x is not None]
+                if not current or len(baseline) < MIN_BASELINE_SIZE:
+                    continue
+                result = compare(baseline, current, direction, threshold=threshold)
+                if result:
+                    result.update({"case": json.loads(key), "metric": name, "run_id": run_id,
+                                   "baseline_runs": len(baseline_run_ids)})
+                    report.append(result)
+    report.sort(key=lambda x: x["change"], reverse=True)
+    return report
+
+
+def log_report(report):
+    if not report:
+        logger.info("No regression found")
+        return
+    logger.warning("%d regressions found" % len(report))
+    for item in report:
+        case = item["case"]
+        logger.warning("%s %s: %s -> %s (%.1f%% worse, %s), collection: %s, index: %s, search: %s" % (
+            case["run_type"], item["metric"], item["baseline"], item["current"], item["change"] * 100,
+            item["method"], json.dumps(case["collection"]), json.dumps(case["index"]), json.dumps(case["search"])))
@@ -0,0 +1,201 @@
+import os
+import time
+import logging
+import threading
+from urllib import request
+
+logger = logging.getLogger("milvus_benchmark.metrics.sampler")
+
+DEFAULT_INTERVAL = 1
+DEFAULT_MAX_POINTS = 120
+METRICS_TIMEOUT = 2
+# the client is regarded as saturated when a client process uses more than 90% of one core,
+# the python clients are bound to one core by the GIL
+SATURATION_RATIO = 0.9
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+# prometheus metrics of the milvus components, summed across the components exported on the endpoint
+SERVER_METRICS = {
+    "process_cpu_seconds_total": "server_cpu_seconds",
+    "process_resident_memory_bytes": "server_rss",
+    "go_goroutines": "server_goroutines"
+}
+
+
+def parse_prometheus_text(text, names):
+    """
+    Sum the samples of the given metric names in the prometheus text format,
+    e.g. `process_cpu_seconds_total{component="proxy"} 12.3`
+    """
+    values = dict()
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name = line.split("{", 1)[0].split(" ", 1)[0]
+        if name not in names:
+            continue
+        try:
+            value = float(line.rsplit(" ", 1)[-1])
+        except ValueError:
+            continue
+        values[name] = values.get(name, 0.0) + value
+    return values
+
+
+def read_host_cpu_times():
+    """ return (busy, total) jiffies of all the cpus in /proc/stat """
+    with open("/proc/stat") as f:
+        fields = [float(x) for x in f.readline().split()[1:]]
+    # idle and iowait
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    total = sum(fields)
+    return total - idle, total
+
+
+def read_process_stat(pid):
+    """ return (ppid, cpu seconds) of the process from /proc/<pid>/stat """
+    with open("/proc/%s/stat" % pid) as f:
+        # the command name in parentheses may contain spaces
+        fields = f.read().rsplit(")", 1)[1].split()
+    return int(fields[1]), (float(fields[11]) + float(fields[12])) / CLOCK_TICKS
+
+
+def read_children_cpu(pid=None):
+    """ {child pid: cpu seconds} of the running child processes, e.g. the locust workers """
+    pid = pid or os.getpid()
+    children = dict()
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            ppid, cpu_seconds = read_process_stat(name)
+        except (IOError, OSError, IndexError, ValueError):
+            # exited meanwhile
+            continue
+        if ppid == pid:
+            children[int(name)] = cpu_seconds
+    return children
+
+
+def read_process_rss(pid="self"):
+    """ resident memory in bytes of the process """
+    with open("/proc/%s/status" % pid) as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def downsample(series, max_points):
+    """ average every bucket of consecutive points, so that at most max_points are kept """
+    if len(series) <= max_points:
+        return series
+    result = []
+    bucket_size = len(series) / float(max_points)
+    for i in range(max_points):
+        bucket = series[int(i * bucket_size):int((i + 1) * bucket_size)]
+        values = [x for x in bucket if x is not None]
+        result.append(round(sum(values) / len(values), 3) if values else None)
+    return result
+
+
+class ResourceSampler(object):
+    """
+    Sample the resource usage in a background thread while a case is running:
+        client: cpu cores used by this process and by the busiest of its child processes, e.g. the locust workers,
+            host cpu ratio and rss, read from /proc
+        server: cpu cores, rss and goroutines, polled from the milvus prometheus endpoint
+    """
+
+    def __init__(self, metrics_url=None, interval=DEFAULT_INTERVAL, max_points=DEFAULT_MAX_POINTS):
+        self._metrics_url = metrics_url
+        self._interval = interval
+        self._max_points = max_points
+        self._cpu_count = os.cpu_count() or 1
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._series = dict()
+        self._server_available = bool(metrics_url)
+
+    def _fetch_server_metrics(self):
+        if not self._server_available:
+            return {}
+        try:
+            with request.urlopen(self._metrics_url, timeout=METRICS_TIMEOUT) as response:
+                text = response.read().decode("utf-8")
+        except Exception as e:
+            # not every deploy exports the metrics, stop polling after the first failure
+            logger.warning("Metrics endpoint: %s not available: %s" % (self._metrics_url, str(e)))
+            self._server_available = False
+            return {}
+        return parse_prometheus_text(text, SERVER_METRICS.keys())
+
+    def _append(self, key, value):
+        self._series.setdefault(key, []).append(value)
+
+    def _sample(self):
+        start_time = time.time()
+        last_wall = start_time
+        last_process = os.times()
+        last_host = read_host_cpu_times()
+        last_children = read_children_cpu()
+        last_server = self._fetch_server_metrics()
+        while not self._stop_event.wait(self._interval):
+            wall = time.time()
+            process = os.times()
+            host = read_host_cpu_times()
+            children = read_children_cpu()
+            server = self._fetch_server_metrics()
+            elapsed = wall - last_wall
+            self._append("time", round(wall - start_time, 3))
+            self._append("client_cpu", round(
+                (process.user + process.system - last_process.user - last_process.system) / elapsed, 3))
+            self._append("host_cpu_ratio", round(
+                (host[0] - last_host[0]) / (host[1] - last_host[1]), 3) if host[1] > last_host[1] else 0.0)
+            self._append("client_rss", read_process_rss())
+            children_cpu = [(cpu_seconds - last_children[pid]) / elapsed for pid, cpu_seconds in children.items()
+                            if pid in last_children]
+            if children_cpu:
+                self._append("worker_cpu_max", round(max(children_cpu), 3))
+            if server:
+                cpu_key = "process_cpu_seconds_total"
+                if cpu_key in server and cpu_key in last_server:
+                    self._append("server_cpu", round((server[cpu_key] - last_server[cpu_key]) / elapsed, 3))
+                for name, key in SERVER_METRICS.items():
+                    if name != cpu_key and name in server:
+                        self._append(key, server[name])
+            last_wall, last_process, last_host, last_children, last_server = wall, process, host, children, server
+
+    def start(self):
+        self._stop_event.clear()
+        self._series = dict()
+        self._thread = threading.Thread(target=self._sample, name="resource-sampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ stop sampling and return the downsampled series with the summary """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        series = self._series
+        summary = dict()
+        for key, values in series.items():
+            if key == "time" or not values:
+                continue
+            summary[key] = {
+                "mean": round(sum(values) / len(values), 3),
+                "max": max(values)
+            }
+        # a client process takes its one core
+        client_saturated = any([key in summary and summary[key]["mean"] >= SATURATION_RATIO
+                                for key in ["client_cpu", "worker_cpu_max"]])
+        # the server of the local env shares the host, so the busy host is not blamed on the client
+        host_saturated = "host_cpu_ratio" in summary and summary["host_cpu_ratio"]["mean"] >= SATURATION_RATIO
+        return {
+            "interval": self._interval,
+            "client_cpu_count": self._cpu_count,
+            "client_saturated": client_saturated,
+            "host_saturated": host_saturated,
+            "summary": summary,
+            "series": {key: downsample(values, self._max_points) for key, values in series.items()}
+        }
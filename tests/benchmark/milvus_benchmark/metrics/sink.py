@@ -0,0 +1,212 @@
+import json
+import queue
+import sqlite3
+import logging
+import threading
+import traceback
+import numpy as np
+
+from .config import DB, UNIQUE_ID_COLLECTION, DOC_COLLECTION
+
+logger = logging.getLogger("milvus_benchmark.metrics.sink")
+
+# the models saved once and referred by id in the docs
+MODEL_KEYS = ["server", "hardware", "env"]
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 5
+
+
+def to_serializable(obj):
+    """ json default, the results may contain numpy scalars or arrays """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+def to_bson(value):
+    """
+    convert the numpy scalars and arrays nested in the doc, the other values are left as they are,
+    e.g. the ObjectId of the models and datetime are kept as bson types
+    """
+    if isinstance(value, dict):
+        return {k: to_bson(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_bson(v) for v in value]
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return value
+
+
+class BaseSink(object):
+    """
+    A sink writes batches of docs, in each doc the models are given as {"md5": string, "value": dict}
+    and replaced with {"id": model id, "value": dict} by the sink
+    """
+
+    def write(self, docs):
+        raise NotImplementedError()
+
+    def read(self, doc_type="case"):
+        """ return the saved docs of the given type, the model ids are returned as strings """
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class MongoSink(BaseSink):
+    """ the client is created at the first write, the model ids are cached by md5 """
+
+    def __init__(self, server):
+        self._server = server
+        self._client = None
+        self._ids = dict()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from pymongo import MongoClient
+            self._client = MongoClient(self._server)
+        return self._client
+
+    def insert_or_get(self, md5):
+        if md5 not in self._ids:
+            collection = self.client[DB][UNIQUE_ID_COLLECTION]
+            found = collection.find_one({'md5': md5})
+            self._ids[md5] = found['_id'] if found else collection.insert_one({'md5': md5}).inserted_id
+        return self._ids[md5]
+
+    def write(self, docs):
+        for doc in docs:
+            for key in MODEL_KEYS:
+                doc[key] = {"id": self.insert_or_get(doc[key]["md5"]), "value": doc[key]["value"]}
+        # bson does not accept numpy types either
+        docs = [to_bson(doc) for doc in docs]
+        self.client[DB][DOC_COLLECTION].insert_many(docs)
+
+    def read(self, doc_type="case"):
+        docs = []
+        for doc in self.client[DB][DOC_COLLECTION].find({"_type": doc_type}, {"_id": False}):
+            for key in MODEL_KEYS:
+                if isinstance(doc.get(key), dict) and "id" in doc[key]:
+                    doc[key]["id"] = str(doc[key]["id"])
+            docs.append(doc)
+        return docs
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+
+class SQLiteSink(BaseSink):
+    """
+    Local sink without any service, the docs are kept as json with the columns used to filter them
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            # created in the writer thread
+            self._conn = sqlite3.connect(self._path)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS %s (md5 TEXT PRIMARY KEY, type TEXT, value TEXT)"
+                               % UNIQUE_ID_COLLECTION)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS %s (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id INTEGER, "
+                               "type TEXT, metric_type TEXT, status TEXT, datetime TEXT, value TEXT)" % DOC_COLLECTION)
+            self._conn.commit()
+        return self._conn
+
+    def write(self, docs):
+        models = []
+        rows = []
+        for doc in docs:
+            for key in MODEL_KEYS:
+                md5 = doc[key]["md5"]
+                models.append((md5, key, json.dumps(doc[key]["value"], default=to_serializable)))
+                doc[key] = {"id": md5, "value": doc[key]["value"]}
+            rows.append((doc.get("run_id"), doc.get("_type"), doc["metrics"]["type"], doc.get("status"),
+                         doc.get("datetime"), json.dumps(doc, default=to_serializable)))
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO %s VALUES (?, ?, ?)" % UNIQUE_ID_COLLECTION, models)
+            self.conn.executemany("INSERT INTO %s (run_id, type, metric_type, status, datetime, value) "
+                                  "VALUES (?, ?, ?, ?, ?, ?)" % DOC_COLLECTION, rows)
+
+    def read(self, doc_type="case"):
+        cursor = self.conn.execute("SELECT value FROM %s WHERE type = ? ORDER BY id" % DOC_COLLECTION, (doc_type,))
+        return [json.loads(row[0]) for row in cursor]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+
+class AsyncWriter(object):
+    """
+    Write the docs in a background thread, in batches of batch_size or every flush_interval seconds,
+    so that the storage latency is kept out of the cases
+    """
+
+    def __init__(self, sink, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self._sink = sink
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="result-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _write(self, docs):
+        if not docs:
+            return
+        try:
+            self._sink.write(docs)
+            logger.debug("%d docs written" % len(docs))
+        except Exception as e:
+            logger.error("Write %d docs failed" % len(docs))
+            logger.error(traceback.format_exc())
+
+    def _run(self):
+        docs = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                self._write(docs)
+                docs = []
+                continue
+            if isinstance(item, threading.Event):
+                # flush or close request
+                self._write(docs)
+                docs = []
+                if getattr(item, "close", False):
+                    self._sink.close()
+                    item.set()
+                    return
+                item.set()
+                continue
+            docs.append(item)
+            if len(docs) >= self._batch_size:
+                self._write(docs)
+                docs = []
+
+    def save(self, doc):
+        self._queue.put(doc)
+
+    def flush(self):
+        """ block until all the saved docs are written """
+        event = threading.Event()
+        self._queue.put(event)
+        event.wait()
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        event = threading.Event()
+        event.close = True
+        self._queue.put(event)
+        event.wait()
@@ -1,5 +1,7 @@
 import pdb
+import random
 import logging
+import numpy as np
 
 logger = logging.getLogger("milvus_benchmark.parser")
 
@@ -94,3 +96,195 @@ def search_params_parser(param):
         logger.warning("Invalid format nprobes: %s" % str(nprobes))    
 
     return top_ks, nqs, nprobes
+
+
+RANDOM_SAMPLING = "random"
+LHS_SAMPLING = "lhs"
+
+
+def match_value(value, pattern):
+    """ a dict pattern matches the dict value holding all of its items, e.g. {"nprobe": 1} of the search params """
+    if isinstance(pattern, dict) and isinstance(value, dict):
+        return all(k in value and match_value(value[k], v) for k, v in pattern.items())
+    return value == pattern
+
+
+class CaseMatrix(object):
+    """
+    The combinations of the named axes, in the order of the nested loops: the last axis varies fastest.
+    Only the positions of the kept combinations are stored, the combination is built when it is read.
+    The rules, given by the matrix section of the suite:
+        exclude: list of partial combinations, e.g. {"nq": 10000, "top_k": 1000}, the matched ones are dropped
+        include: list of full combinations run besides the product
+        sample: {"method": random|lhs, "size": n, "seed": s}, run n of the combinations when the space is big,
+            lhs: latin hypercube, the values of every axis are covered evenly by the sample
+    """
+
+    def __init__(self, axes, include=None, exclude=None, sample=None):
+        # [(name, values)]
+        self._axes = [(name, list(values)) for name, values in axes]
+        self._sizes = [len(values) for _, values in self._axes]
+        self._exclude = exclude or []
+        self._include = []
+        names = [name for name, _ in self._axes]
+        for item in include or []:
+            missing = [name for name in names if name not in item]
+            if missing:
+                raise Exception("Matrix include: %s, missing axes: %s" % (str(item), str(missing)))
+            self._include.append(dict(item))
+        self._total = 1
+        for size in self._sizes:
+            self._total *= size
+        # None: every position of the product is kept
+        self._positions = None
+        if sample:
+            self._positions = self._sample(sample)
+        elif self._exclude:
+            self._positions = [p for p in range(self._total) if not self.excluded(self.combination(p))]
+        logger.info("Case matrix: %d combinations, %d kept, %d included" %
+                    (self._total, self._total if self._positions is None else len(self._positions),
+                     len(self._include)))
+
+    @property
+    def names(self):
+        return [name for name, _ in self._axes]
+
+    @property
+    def total(self):
+        """ size of the full product """
+        return self._total
+
+    def combination(self, position):
+        """ decode the position in the product to {axis: value} """
+        combination = dict()
+        for (name, values), size in zip(reversed(self._axes), reversed(self._sizes)):
+            position, i = divmod(position, size)
+            combination[name] = values[i]
+        return {name: combination[name] for name in self.names}
+
+    def excluded(self, combination):
+        return any(all(k in combination and match_value(combination[k], v) for k, v in rule.items())
+                   for rule in self._exclude)
+
+    def _position(self, indexes):
+        position = 0
+        for i, size in zip(indexes, self._sizes):
+            position = position * size + i
+        return position
+
+    def _sample(self, sample):
+        method = sample["method"] if "method" in sample else RANDOM_SAMPLING
+        size = sample["size"]
+        rng = random.Random(sample["seed"] if "seed" in sample else None)
+        positions = set()
+        if method == RANDOM_SAMPLING:
+            seen = set()
+            while len(positions) < size and len(seen) < self._total:
+                position = rng.randrange(self._total)
+                if position in seen:
+                    continue
+                seen.add(position)
+                if not self.excluded(self.combination(position)):
+                    positions.add(position)
+        elif method == LHS_SAMPLING:
+            # the size strata of every axis are shuffled apart, the stratum k of the axis maps to its value
+            # int(k * len(values) / size), the points falling on the same or an excluded combination are dropped
+            strata = []
+            for axis_size in self._sizes:
+                order = list(range(size))
+                rng.shuffle(order)
+                strata.append([k * axis_size // size for k in order])
+            for point in zip(*strata):
+                position = self._position(point)
+                if not self.excluded(self.combination(position)):
+                    positions.add(position)
+        else:
+            raise Exception("Matrix sample method: %s not supported" % method)
+        if len(positions) < size:
+            logger.warning("Matrix sample: %d of %d combinations kept" % (len(positions), size))
+        # in the order of the product, the cases of the same group stay together
+        return sorted(positions)
+
+    def __len__(self):
+        kept = self._total if self._positions is None else len(self._positions)
+        return kept + len(self._include)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("case matrix index out of range")
+        kept = len(self) - len(self._include)
+        if index >= kept:
+            return dict(self._include[index - kept])
+        return self.combination(index if self._positions is None else self._positions[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def matrix_parser(collection, axes):
+    """ axes: [(name, values)], the rules are read from the matrix section of the suite """
+    rules = collection["matrix"] if "matrix" in collection and collection["matrix"] else {}
+    for key in rules:
+        if key not in ["include", "exclude", "sample"]:
+            raise Exception("Matrix rule: %s not supported" % key)
+    return CaseMatrix(axes, include=rules.get("include"), exclude=rules.get("exclude"), sample=rules.get("sample"))
+
+
+class LazyCases(object):
+    """
+    Sequence of the cases, or the case metrics, of the matrix, built by build(combination) when they are read.
+    The case metrics are updated by the run and summarized at the end, so they are cached once built,
+    the cases are built again on every read, the vectors they refer to are shared
+    """
+
+    def __init__(self, matrix, build, cache=False):
+        self._matrix = matrix
+        self._build = build
+        self._hooks = []
+        self._cache = dict() if cache else None
+
+    def apply(self, func):
+        """ func(item) is called on every item once built, e.g. to set the params added by a sub runner """
+        self._hooks.append(func)
+
+    def __len__(self):
+        return len(self._matrix)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if self._cache is not None and index in self._cache:
+            return self._cache[index]
+        item = self._build(self._matrix[index])
+        for func in self._hooks:
+            func(item)
+        if self._cache is not None:
+            self._cache[index] = item
+        return item
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class QueryVectors(object):
+    """
+    The query vectors loaded once for all the cases,
+    the cases take the first nq rows as a view of the array instead of a copy of the list
+    """
+
+    def __init__(self, vectors):
+        # the binary vectors of the hdf5 datasets are bytes rows, kept as a list
+        if len(vectors) and isinstance(vectors[0], bytes):
+            self._vectors = list(vectors)
+        else:
+            self._vectors = np.asarray(vectors)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def query(self, nq):
+        return self._vectors[:nq]
@@ -0,0 +1,161 @@
+import os
+import time
+import random
+import logging
+import threading
+from pymilvus import Milvus
+
+from milvus_benchmark import config
+
+logger = logging.getLogger("milvus_benchmark.pool")
+
+INITIAL_BACKOFF = 0.5
+MAX_BACKOFF = 10
+BACKOFF_MULTIPLIER = 2
+HEALTH_CHECK_TIMEOUT = 5
+
+
+class DeadlineHandle(object):
+    """
+    Pass the default deadline to the calls of the Milvus handle which are not given a timeout,
+    timeouts: {method name: seconds}, the methods not in it, e.g. create_index, are not limited
+    """
+
+    def __init__(self, milvus, timeouts=None):
+        self._milvus = milvus
+        self._timeouts = config.CALL_TIMEOUTS if timeouts is None else timeouts
+
+    def __getattr__(self, name):
+        func = getattr(self._milvus, name)
+        if name not in self._timeouts:
+            return func
+
+        def wrapper(*args, **kwargs):
+            if kwargs.get("timeout") is None:
+                kwargs["timeout"] = self._timeouts[name]
+            return func(*args, **kwargs)
+
+        return wrapper
+
+
+def health_check(milvus, timeout=HEALTH_CHECK_TIMEOUT):
+    """ the cheapest call answered by the server """
+    milvus.list_collections(timeout=timeout)
+
+
+def connect(host, port, timeout=config.CONNECT_TIMEOUT):
+    """
+    Create the Milvus handle and check that the server answers,
+    retry with exponential backoff and jitter until the timeout
+    """
+    deadline = time.time() + timeout
+    backoff = INITIAL_BACKOFF
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            milvus = Milvus(host=host, port=port, try_connect=False, pre_ping=False)
+            health_check(milvus)
+            return milvus
+        except Exception as e:
+            remaining = deadline - time.time()
+            logger.warning("Milvus connect %s:%s failed: %d times, %s" % (host, port, attempt, str(e)))
+            if remaining <= 0:
+                raise Exception("Server connect timeout: %s:%s" % (host, port))
+            time.sleep(min(remaining, backoff * random.uniform(0.5, 1.5)))
+            backoff = min(backoff * BACKOFF_MULTIPLIER, MAX_BACKOFF)
+
+
+class PooledConnection(object):
+    def __init__(self, milvus):
+        self.milvus = milvus
+        self.borrowed = 0
+        self.checked_time = time.time()
+
+
+class ConnectionPool(object):
+    """
+    A bounded set of connections to one server.
+    A grpc channel serves concurrent calls, so when all the connections are borrowed and the pool is full,
+    the least borrowed one is shared instead of blocking the caller.
+    The connection idle for more than health_check_interval is checked before it is lent again
+    """
+
+    def __init__(self, host, port, max_size=config.CONNECTION_POOL_SIZE, connect_timeout=config.CONNECT_TIMEOUT,
+                 health_check_interval=config.HEALTH_CHECK_INTERVAL):
+        self._host = host
+        self._port = port
+        self._max_size = max_size
+        self._connect_timeout = connect_timeout
+        self._health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._connections = []
+        self._connecting = 0
+
+    @property
+    def size(self):
+        return len(self._connections)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                idle = [c for c in self._connections if not c.borrowed]
+                if idle:
+                    conn = idle[0]
+                elif len(self._connections) + self._connecting < self._max_size or not self._connections:
+                    conn = None
+                    self._connecting += 1
+                else:
+                    conn = min(self._connections, key=lambda c: c.borrowed)
+                if conn is not None:
+                    conn.borrowed += 1
+            if conn is None:
+                try:
+                    conn = PooledConnection(connect(self._host, self._port, timeout=self._connect_timeout))
+                finally:
+                    with self._lock:
+                        self._connecting -= 1
+                with self._lock:
+                    conn.borrowed += 1
+                    self._connections.append(conn)
+                logger.debug("New connection to %s:%s, pool size: %d" % (self._host, self._port, self.size))
+                return conn
+            if conn.borrowed > 1 or time.time() - conn.checked_time < self._health_check_interval:
+                return conn
+            try:
+                health_check(conn.milvus)
+                conn.checked_time = time.time()
+                return conn
+            except Exception as e:
+                logger.warning("Connection to %s:%s broken, reconnect: %s" % (self._host, self._port, str(e)))
+                self.release(conn, broken=True)
+
+    def release(self, conn, broken=False):
+        with self._lock:
+            conn.borrowed = max(0, conn.borrowed - 1)
+            if broken and conn in self._connections:
+                self._connections.remove(conn)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.milvus.close()
+                except Exception as e:
+                    logger.debug(str(e))
+            self._connections = []
+
+
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def get_pool(host=None, port=None):
+    """ the pool shared by the clients of the server in this process, a forked child creates its own pool """
+    host = host or config.SERVER_HOST_DEFAULT
+    port = port or config.SERVER_PORT_DEFAULT
+    key = (host, str(port), os.getpid())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(host, port)
+        return _pools[key]
@@ -1,11 +1,16 @@
 from .insert import InsertRunner, BPInsertRunner
 from .locust import LocustInsertRunner, LocustSearchRunner, LocustRandomRunner
 from .search import SearchRunner, InsertSearchRunner
-from .build import BuildRunner, InsertBuildRunner
-from .get import InsertGetRunner
+from .qps import QPSSearchRunner
+from .filter import FilterSearchRunner
+from .mixed import MixedReadWriteRunner
+from .build import BuildRunner, InsertBuildRunner, ConcurrentBuildRunner
+from .get import InsertGetRunner, PointLookupRunner
+from .load import LoadRunner
 from .accuracy import AccuracyRunner
 from .accuracy import AccAccuracyRunner
-from .chaos import SimpleChaosRunner
+from .pareto import ParetoRunner
+from .chaos import SimpleChaosRunner, ChaosPerformanceRunner
 
 
 def get_runner(name, env, metric):
@@ -14,13 +19,21 @@ def get_runner(name, env, metric):
         "bp_insert_performance": BPInsertRunner(env, metric),
         "search_performance": SearchRunner(env, metric),
         "insert_search_performance": InsertSearchRunner(env, metric),
+        "qps_search_performance": QPSSearchRunner(env, metric),
+        "filter_search_performance": FilterSearchRunner(env, metric),
+        "mixed_read_write_performance": MixedReadWriteRunner(env, metric),
         "locust_insert_performance": LocustInsertRunner(env, metric),
         "locust_search_performance": LocustSearchRunner(env, metric),
         "locust_random_performance": LocustRandomRunner(env, metric),
         "insert_build_performance": InsertBuildRunner(env, metric),
         "insert_get_performance": InsertGetRunner(env, metric),
+        "point_lookup_performance": PointLookupRunner(env, metric),
+        "load_performance": LoadRunner(env, metric),
         "build_performance": BuildRunner(env, metric),
+        "concurrent_build_performance": ConcurrentBuildRunner(env, metric),
         "accuracy": AccuracyRunner(env, metric),
         "ann_accuracy": AccAccuracyRunner(env, metric),
-        "simple_chaos": SimpleChaosRunner(env, metric)
+        "ann_pareto": ParetoRunner(env, metric),
+        "simple_chaos": SimpleChaosRunner(env, metric),
+        "chaos_performance": ChaosPerformanceRunner(env, metric)
     }.get(name)
@@ -7,6 +7,7 @@ import numpy as np
 from milvus_benchmark import parser
 from milvus_benchmark.runners import utils
 from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.dataset import HDF5Dataset
 
 logger = logging.getLogger("milvus_benchmark.runners.accuracy")
 INSERT_INTERVAL = 50000
@@ -24,7 +25,7 @@ class AccuracyRunner(BaseRunner):
         (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
         vector_type = utils.get_vector_type(data_type)
         index_field_name = utils.get_default_field_name(vector_type)
-        base_query_vectors = utils.get_vectors_from_binary(utils.MAX_NQ, dimension, data_type)
+        query_vectors = parser.QueryVectors(utils.load_query_vectors(utils.MAX_NQ, dimension, data_type))
         collection_info = {
             "dimension": dimension,
             "metric_type": metric_type,
@@ -33,58 +34,50 @@ class AccuracyRunner(BaseRunner):
         }
         index_info = self.milvus.describe_index(index_field_name, collection_name)
         filters = collection["filters"] if "filters" in collection else []
-        filter_query = []
         top_ks = collection["top_ks"]
         nqs = collection["nqs"]
         search_params = collection["search_params"]
         search_params = utils.generate_combinations(search_params)
-        cases = list()
-        case_metrics = list()
         self.init_metric(self.name, collection_info, index_info, search_info=None)
-        for search_param in search_params:
-            if not filters:
-                filters.append(None)
-            for filter in filters:
-                filter_param = []
-                if isinstance(filter, dict) and "range" in filter:
-                    filter_query.append(eval(filter["range"]))
-                    filter_param.append(filter["range"])
-                if isinstance(filter, dict) and "term" in filter:
-                    filter_query.append(eval(filter["term"]))
-                    filter_param.append(filter["term"])
-                for nq in nqs:
-                    query_vectors = base_query_vectors[0:nq]
-                    for top_k in top_ks:
-                        search_info = {
-                            "topk": top_k,
-                            "query": query_vectors,
-                            "metric_type": utils.metric_type_trans(metric_type),
-                            "params": search_param}
-                        # TODO: only update search_info
-                        case_metric = copy.deepcopy(self.metric)
-                        # set metric type as case
-                        case_metric.set_case_metric_type()
-                        case_metric.search = {
-                            "nq": nq,
-                            "topk": top_k,
-                            "search_param": search_param,
-                            "filter": filter_param
-                        }
-                        vector_query = {"vector": {index_field_name: search_info}}
-                        case = {
-                            "collection_name": collection_name,
-                            "index_field_name": index_field_name,
-                            "dimension": dimension,
-                            "data_type": data_type,
-                            "metric_type": metric_type,
-                            "vector_type": vector_type,
-                            "collection_size": collection_size,
-                            "filter_query": filter_query,
-                            "vector_query": vector_query
-                        }
-                        cases.append(case)
-                        case_metrics.append(case_metric)
-        return cases, case_metrics
+        matrix = parser.matrix_parser(collection, [
+            ("search_param", search_params),
+            ("filter", filters or [None]),
+            ("nq", nqs),
+            ("top_k", top_ks)])
+
+        def build_metric(combination):
+            filter_query, filter_param = utils.parse_filter(combination["filter"])
+            case_metric = copy.deepcopy(self.metric)
+            # set metric type as case
+            case_metric.set_case_metric_type()
+            case_metric.search = {
+                "nq": combination["nq"],
+                "topk": combination["top_k"],
+                "search_param": combination["search_param"],
+                "filter": filter_param
+            }
+            return case_metric
+
+        def build_case(combination):
+            filter_query, filter_param = utils.parse_filter(combination["filter"])
+            search_info = {
+                "topk": combination["top_k"],
+                "query": query_vectors.query(combination["nq"]),
+                "metric_type": utils.metric_type_trans(metric_type),
+                "params": combination["search_param"]}
+            return {
+                "collection_name": collection_name,
+                "index_field_name": index_field_name,
+                "dimension": dimension,
+                "data_type": data_type,
+                "metric_type": metric_type,
+                "vector_type": vector_type,
+                "collection_size": collection_size,
+                "filter_query": filter_query,
+                "vector_query": {"vector": {index_field_name: search_info}}
+            }
+
+        return parser.LazyCases(matrix, build_case), parser.LazyCases(matrix, build_metric, cache=True)
 
     def prepare(self, **case_param):
         collection_name = case_param["collection_name"]
@@ -98,12 +91,19 @@ class AccuracyRunner(BaseRunner):
         nq = case_metric.search["nq"]
         top_k = case_metric.search["topk"]
         query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"])
-        true_ids = utils.get_ground_truth_ids(collection_size)
-        logger.debug({"true_ids": [len(true_ids[0]), len(true_ids[0])]})
-        result_ids = self.milvus.get_ids(query_res)
-        logger.debug({"result_ids": len(result_ids[0])})
-        acc_value = utils.get_recall_value(true_ids[:nq, :top_k].tolist(), result_ids)
-        tmp_result = {"acc": acc_value}
+        filter_query = case_param["filter_query"]
+        # mapped once per ground truth file, only the rows of the case are read
+        true_ids = utils.get_ground_truth_ids(collection_size, data_type=case_param["data_type"],
+                                              dimension=case_param["dimension"],
+                                              metric_type=case_param["metric_type"],
+                                              filter_query=filter_query[0] if len(filter_query) == 1 else filter_query,
+                                              nq=nq, top_k=top_k)
+        logger.debug({"true_ids": true_ids.shape})
+        result_ids = utils.result_ids_to_array(self.milvus.get_ids(query_res), top_k)
+        logger.debug({"result_ids": result_ids.shape})
+        recall_metrics = utils.get_recall_metrics(true_ids[:nq, :top_k], result_ids)
+        tmp_result = {"acc": recall_metrics["recall"]}
+        tmp_result.update(recall_metrics)
         return tmp_result
 
 
@@ -117,6 +117,11 @@ class AccAccuracyRunner(AccuracyRunner):
 
     def __init__(self, env, metric):
         super(AccAccuracyRunner, self).__init__(env, metric)
+        # the state of the collection, used to skip the insert, index building and loading already done
+        self._inserted_dataset = None
+        self._index = None
+        self._loaded = False
+        self._datasets = dict()
 
     def extract_cases(self, collection):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
@@ -130,146 +135,167 @@ class AccAccuracyRunner(AccuracyRunner):
         search_params = collection["search_params"]
         vector_type = utils.get_vector_type(data_type)
         index_field_name = utils.get_default_field_name(vector_type)
-        dataset = utils.get_dataset(hdf5_source_file)
+        dataset = self.get_dataset(hdf5_source_file, metric_type)
         collection_info = {
             "dimension": dimension,
             "metric_type": metric_type,
             "dataset_name": collection_name
         }
         filters = collection["filters"] if "filters" in collection else []
-        filter_query = []
         # Convert list data into a set of dictionary data
         search_params = utils.generate_combinations(search_params)
         index_params = utils.generate_combinations(index_params)
-        cases = list()
-        case_metrics = list()
         self.init_metric(self.name, collection_info, {}, search_info=None)
-
         # true_ids: The data set used to verify the results returned by query
-        true_ids = np.array(dataset["neighbors"])
-        for index_type in index_types:
-            for index_param in index_params:
-                index_info = {
-                    "index_type": index_type,
-                    "index_param": index_param
-                }
-                for search_param in search_params:
-                    if not filters:
-                        filters.append(None)
-                    for filter in filters:
-                        filter_param = []
-                        if isinstance(filter, dict) and "range" in filter:
-                            filter_query.append(eval(filter["range"]))
-                            filter_param.append(filter["range"])
-                        if isinstance(filter, dict) and "term" in filter:
-                            filter_query.append(eval(filter["term"]))
-                            filter_param.append(filter["term"])
-                        for nq in nqs:
-                            query_vectors = utils.normalize(metric_type, np.array(dataset["test"][:nq]))
-                            for top_k in top_ks:
-                                search_info = {
-                                    "topk": top_k,
-                                    "query": query_vectors,
-                                    "metric_type": utils.metric_type_trans(metric_type),
-                                    "params": search_param}
-                                # TODO: only update search_info
-                                case_metric = copy.deepcopy(self.metric)
-                                # set metric type as case
-                                case_metric.set_case_metric_type()
-                                case_metric.index = index_info
-                                case_metric.search = {
-                                    "nq": nq,
-                                    "topk": top_k,
-                                    "search_param": search_param,
-                                    "filter": filter_param
-                                }
-                                vector_query = {"vector": {index_field_name: search_info}}
-                                case = {
-                                    "collection_name": collection_name,
-                                    "dataset": dataset,
-                                    "index_field_name": index_field_name,
-                                    "dimension": dimension,
-                                    "data_type": data_type,
-                                    "metric_type": metric_type,
-                                    "vector_type": vector_type,
-                                    "index_type": index_type,
-                                    "index_param": index_param,
-                                    "filter_query": filter_query,
-                                    "vector_query": vector_query,
-                                    "true_ids": true_ids
-                                }
-                                # Obtain the parameters of the use case to be tested
-                                cases.append(case)
-                                case_metrics.append(case_metric)
-        return cases, case_metrics
+        true_ids = dataset.neighbors
+        # the test vectors shared by the cases, read once
+        query_vectors = parser.QueryVectors(dataset.query_vectors(max(nqs)))
+        matrix = parser.matrix_parser(collection, [
+            ("index_type", index_types),
+            ("index_param", index_params),
+            ("search_param", search_params),
+            ("filter", filters or [None]),
+            ("nq", nqs),
+            ("top_k", top_ks)])
+
+        def build_metric(combination):
+            filter_query, filter_param = utils.parse_filter(combination["filter"])
+            case_metric = copy.deepcopy(self.metric)
+            # set metric type as case
+            case_metric.set_case_metric_type()
+            case_metric.index = {
+                "index_type": combination["index_type"],
+                "index_param": combination["index_param"]
+            }
+            case_metric.search = {
+                "nq": combination["nq"],
+                "topk": combination["top_k"],
+                "search_param": combination["search_param"],
+                "filter": filter_param
+            }
+            return case_metric
+
+        def build_case(combination):
+            filter_query, filter_param = utils.parse_filter(combination["filter"])
+            search_info = {
+                "topk": combination["top_k"],
+                "query": query_vectors.query(combination["nq"]),
+                "metric_type": utils.metric_type_trans(metric_type),
+                "params": combination["search_param"]}
+            # Obtain the parameters of the use case to be tested
+            return {
+                "collection_name": collection_name,
+                "source_file": hdf5_source_file,
+                "index_field_name": index_field_name,
+                "dimension": dimension,
+                "data_type": data_type,
+                "metric_type": metric_type,
+                "vector_type": vector_type,
+                "index_type": combination["index_type"],
+                "index_param": combination["index_param"],
+                "filter_query": filter_query,
+                "vector_query": {"vector": {index_field_name: search_info}},
+                "true_ids": true_ids
+            }
+
+        return parser.LazyCases(matrix, build_case), parser.LazyCases(matrix, build_metric, cache=True)
+
+    def get_dataset(self, source_file, metric_type):
+        """ open the hdf5 file once, the cases only hold the file path """
+        if source_file not in self._datasets:
+            self._datasets[source_file] = HDF5Dataset(source_file, metric_type)
+        return self._datasets[source_file]
+
+    def group_key(self, case):
+        """ the dataset is inserted once, the index is re-created for each group """
+        return [case["source_file"], case["index_type"], case["index_param"]]
 
     def prepare(self, **case_param):
         """ According to the test case parameters, initialize the test """
 
         collection_name = case_param["collection_name"]
         metric_type = case_param["metric_type"]
-        dimension = case_param["dimension"]
-        vector_type = case_param["vector_type"]
         index_type = case_param["index_type"]
         index_param = case_param["index_param"]
         index_field_name = case_param["index_field_name"]
-        
+
         self.milvus.set_collection(collection_name)
+        dataset = self.get_dataset(case_param["source_file"], metric_type)
+        if not self.is_dataset_inserted(collection_name, dataset, case_param["dimension"]):
+            self.insert_dataset(**case_param)
+            self._index = None
+        if self._index is None:
+            # the collection is kept from the former suite, check the index built on it
+            index_info = self.milvus.describe_index(index_field_name)
+            if index_info["index_type"] == index_type and index_info["index_param"] == index_param:
+                self._index = (index_type, index_param)
+        if self._index != (index_type, index_param):
+            if self._loaded is not False:
+                self.milvus.release_collection()
+                self._loaded = False
+            if self.milvus.describe_index(index_field_name):
+                self.milvus.drop_index(index_field_name)
+                logger.info("Re-create index: %s" % collection_name)
+            self.milvus.create_index(index_field_name, index_type, metric_type, index_param=index_param)
+            self._index = (index_type, index_param)
+            logger.info(self.milvus.describe_index(index_field_name))
+        else:
+            logger.info("Reuse index: %s, index_param: %s" % (index_type, json.dumps(index_param)))
+        if not self._loaded:
+            logger.info("Start load collection: %s" % collection_name)
+            self.milvus.load_collection(timeout=600)
+            self._loaded = True
+            logger.info("End load collection: %s" % collection_name)
+
+    def is_dataset_inserted(self, collection_name, dataset, dimension):
+        """ the collection could be reused when it holds all the train vectors of the dataset """
+        if self._inserted_dataset == collection_name:
+            return True
+        if not self.milvus.exists_collection(collection_name):
+            return False
+        if self.milvus.get_dimension() != dimension or self.milvus.count() != dataset.train_size:
+            return False
+        logger.info("Reuse collection: %s" % collection_name)
+        self._inserted_dataset = collection_name
+        # the collection may be loaded by the former suite
+        self._loaded = None
+        return True
+
+    def insert_dataset(self, **case_param):
+        collection_name = case_param["collection_name"]
+        metric_type = case_param["metric_type"]
+        dimension = case_param["dimension"]
+        vector_type = case_param["vector_type"]
         if self.milvus.exists_collection(collection_name):
             logger.info("Re-create collection: %s" % collection_name)
             self.milvus.drop()
-        dataset = case_param["dataset"]
+        self._loaded = False
+        dataset = self.get_dataset(case_param["source_file"], metric_type)
         self.milvus.create_collection(dimension, data_type=vector_type)
-        # Get the data set train for inserting into the collection
-        insert_vectors = utils.normalize(metric_type, np.array(dataset["train"]))
-        if len(insert_vectors) != dataset["train"].shape[0]:
-            raise Exception("Row count of insert vectors: %d is not equal to dataset size: %d" % (
-                len(insert_vectors), dataset["train"].shape[0]))
-        logger.debug("The row count of entities to be inserted: %d" % len(insert_vectors))
-        # Insert batch once
-        # milvus_instance.insert(insert_vectors)
+        logger.debug("The row count of entities to be inserted: %d" % dataset.train_size)
         info = self.milvus.get_info(collection_name)
-        loops = len(insert_vectors) // INSERT_INTERVAL + 1
-        for i in range(loops):
-            start = i * INSERT_INTERVAL
-            end = min((i + 1) * INSERT_INTERVAL, len(insert_vectors))
-            if start < end:
-                # Insert up to INSERT_INTERVAL=50000 at a time
-                tmp_vectors = insert_vectors[start:end]
-                ids = [i for i in range(start, end)]
-                if not isinstance(tmp_vectors, list):
-                    entities = utils.generate_entities(info, tmp_vectors.tolist(), ids)
-                    res_ids = self.milvus.insert(entities)
-                else:
-                    entities = utils.generate_entities(tmp_vectors, ids)
-                    res_ids = self.milvus.insert(entities)
-                assert res_ids == ids
+        # the train set is read and normalized chunk by chunk, up to INSERT_INTERVAL=50000 at a time
+        for start_id, vectors in dataset.iter_train(INSERT_INTERVAL):
+            self.insert_core(self.milvus, info, start_id, vectors, columnar=True)
         logger.debug("End insert, start flush")
         self.milvus.flush()
         logger.debug("End flush")
         res_count = self.milvus.count()
         logger.info("Table: %s, row count: %d" % (collection_name, res_count))
-        if res_count != len(insert_vectors):
+        if res_count != dataset.train_size:
             raise Exception("Table row count is not equal to insert vectors")
-        if self.milvus.describe_index(index_field_name):
-            self.milvus.drop_index(index_field_name)
-            logger.info("Re-create index: %s" % collection_name)
-        self.milvus.create_index(index_field_name, index_type, metric_type, index_param=index_param)
-        logger.info(self.milvus.describe_index(index_field_name))
-        logger.info("Start load collection: %s" % collection_name)
-        # self.milvus.release_collection()
-        self.milvus.load_collection(timeout=600)
-        logger.info("End load collection: %s" % collection_name)
+        self._inserted_dataset = collection_name
 
     def run_case(self, case_metric, **case_param):
         true_ids = case_param["true_ids"]
         nq = case_metric.search["nq"]
         top_k = case_metric.search["topk"]
         query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"])
-        result_ids = self.milvus.get_ids(query_res)
+        result_ids = utils.result_ids_to_array(self.milvus.get_ids(query_res), top_k)
         # Calculate the accuracy of the result of query
-        acc_value = utils.get_recall_value(true_ids[:nq, :top_k].tolist(), result_ids)
-        tmp_result = {"acc": acc_value}
+        recall_metrics = utils.get_recall_metrics(true_ids[:nq, :top_k], result_ids)
+        tmp_result = {"acc": recall_metrics["recall"]}
+        tmp_result.update(recall_metrics)
         # Return accuracy results for reporting
         return tmp_result
 
@@ -9,7 +9,9 @@ import numpy as np
 from milvus_benchmark.env import get_env
 from milvus_benchmark import config
 from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.pool import get_pool
 from . import utils
+from .insert_engine import ParallelInsertEngine
 
 logger = logging.getLogger("milvus_benchmark.runners.base")
 
@@ -22,7 +24,8 @@ class BaseRunner(object):
         self._env = env
         self._run_as_group = False
         self._result = dict()
-        self._milvus = MilvusClient(host=self._env.hostname)
+        self._milvus = MilvusClient(host=self._env.hostname, port=self._env.port,
+                                    pool=get_pool(self._env.hostname, self._env.port))
 
     def run(self, run_params):
         pass
@@ -70,12 +73,38 @@ class BaseRunner(object):
     def update_metric(self, key, value):
         pass
 
-    def insert_core(self, milvus, info, start_id, vectors):
+    def group_key(self, case):
+        """
+        Cases with the same key share one prepare, prepare is called again each time the key changes,
+        None means all the cases are prepared once with the first case
+        """
+        return None
+
+    def summarize(self, case_metrics):
+        """
+        Called after all the cases finished, the summary across cases could be updated into self.result,
+        which is saved as the value of the suite metric
+        """
+        pass
+
+    def insert_core(self, milvus, info, start_id, vectors, columnar=False):
+        """
+        Insert one batch, return (serialize_time, insert_time)
+        serialize_time: client side time used to build the entities
+        insert_time: time of the insert request
+        """
         # start insert vectors
         end_id = start_id + len(vectors)
         logger.debug("Start id: %s, end id: %s" % (start_id, end_id))
-        ids = [k for k in range(start_id, end_id)]
-        entities = utils.generate_entities(info, vectors, ids)
+        serialize_start_time = time.time()
+        if columnar:
+            ids = np.arange(start_id, end_id, dtype=np.int64)
+            entities = utils.generate_columnar_entities(info, vectors, ids)
+        else:
+            if isinstance(vectors, np.ndarray):
+                vectors = vectors.tolist()
+            ids = [k for k in range(start_id, end_id)]
+            entities = utils.generate_entities(info, vectors, ids)
         ni_start_time = time.time()
         try:
             _res_ids = milvus.insert(entities)
@@ -86,12 +115,20 @@ class BaseRunner(object):
         # assert ids == res_ids
         # milvus.flush()
         ni_end_time = time.time()
-        logger.debug(milvus.count())
-        return ni_end_time-ni_start_time
+        return ni_start_time-serialize_start_time, ni_end_time-ni_start_time
 
     # TODO: need to improve
-    def insert(self, milvus, collection_name, data_type, dimension, size, ni):
+    def insert(self, milvus, collection_name, data_type, dimension, size, ni, columnar=False,
+               insert_concurrency=1, prefetch_files=0, count_interval=0):
+        """
+        columnar: load the source files with mmap and pass the numpy slices to the client
+        directly instead of converting them into python lists
+        insert_concurrency: number of connections sending the batches
+        prefetch_files: number of files read ahead while the current one is being sent
+        count_interval: check the row count every count_interval batches, 0 means disabled
+        """
         total_time = 0.0
+        serialize_time = 0.0
         rps = 0.0
         ni_time = 0.0
         vectors_per_file = utils.get_len_vectors_per_file(data_type, dimension)
@@ -102,55 +139,38 @@ class BaseRunner(object):
             """
             logger.error("Not invalid collection size or ni")
             return False
-        i = 0
         info = milvus.get_info(collection_name)
-        if data_type == "local" or not data_type:
-            # insert local
-            info = milvus.get_info(collection_name)
-            while i < (size // vectors_per_file):
-                vectors = []
-                for j in range(vectors_per_file // ni):
-                    # vectors = src_vectors[j * ni:(j + 1) * ni]
-                    vectors = utils.generate_vectors(ni, dimension)
-                    if vectors:
-                        start_id = i * vectors_per_file + j * ni
-                        ni_time = self.insert_core(milvus, info, start_id, vectors)
-                        total_time = total_time+ni_time
-                i += 1
-        else:
-            # insert from file
-            while i < (size // vectors_per_file):
-                vectors = []
-                if vectors_per_file >= ni:
-                    file_name = utils.gen_file_name(i, dimension, data_type)
-                    # logger.info("Load npy file: %s start" % file_name)
-                    data = np.load(file_name)
-                    # logger.info("Load npy file: %s end" % file_name)
-                    for j in range(vectors_per_file // ni):
-                        vectors = data[j * ni:(j + 1) * ni].tolist()
-                        if vectors:
-                            start_id = i * vectors_per_file + j * ni
-                            ni_time = self.insert_core(milvus, info, start_id, vectors)
-                            total_time = total_time+ni_time
-                    i += 1
-                else:
-                    vectors.clear()
-                    loops = ni // vectors_per_file
-                    for j in range(loops):
-                        file_name = utils.gen_file_name(loops * i + j, dimension, data_type)
-                        data = np.load(file_name)
-                        vectors.extend(data.tolist())
-                    if vectors:
-                        start_id = i * vectors_per_file
-                        ni_time = self.insert_core(milvus, info, start_id, vectors)
-                        total_time = total_time+ni_time
-                    i += loops
+        batches = utils.iter_insert_batches(data_type, dimension, size, ni, columnar=columnar)
+        if insert_concurrency > 1 or prefetch_files > 0:
+            engine = ParallelInsertEngine(self.insert_core,
+                                          lambda: MilvusClient(collection_name=collection_name, host=self.hostname,
+                                                               port=self.port, pool=get_pool(self.hostname, self.port)),
+                                          info,
+                                          concurrency=insert_concurrency,
+                                          prefetch_files=prefetch_files,
+                                          batches_per_file=max(1, vectors_per_file // ni),
+                                          count_interval=count_interval,
+                                          columnar=columnar)
+            result = engine.run(batches)
+            logger.info(result)
+            return result
+        start_time = time.time()
+        for index, (start_id, vectors) in enumerate(batches):
+            s_time, ni_time = self.insert_core(milvus, info, start_id, vectors, columnar=columnar)
+            serialize_time = serialize_time+s_time
+            total_time = total_time+ni_time
+            if count_interval and (index + 1) % count_interval == 0:
+                logger.debug(milvus.count())
+        wall_time = time.time() - start_time
+        # rps only counts the time of insert requests
         rps = round(size / total_time, 2)
         ni_time = round(total_time / (size / ni), 2)
         result = {
             "total_time": round(total_time, 2),
             "rps": rps,
-            "ni_time": ni_time
+            "ni_time": ni_time,
+            "serialize_time": round(serialize_time, 2),
+            "wall_time": round(wall_time, 2)
         }
         logger.info(result)
         return result
@@ -1,12 +1,24 @@
 import time
 import copy
+import json
 import logging
+import threading
 from milvus_benchmark import parser
+from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.pool import get_pool
 from milvus_benchmark.runners import utils
 from milvus_benchmark.runners.base import BaseRunner
 
 logger = logging.getLogger("milvus_benchmark.runners.build")
 
+# common.IndexState and common.SegmentState
+INDEX_STATE_UNISSUED = 1
+INDEX_STATE_FINISHED = 3
+INDEX_STATE_FAILED = 4
+SEGMENT_STATE_FLUSHED = 4
+DEFAULT_POLL_INTERVAL = 0.5
+DEFAULT_BUILD_TIMEOUT = 3600
+
 
 class BuildRunner(BaseRunner):
     """run build"""
@@ -104,3 +116,277 @@ class InsertBuildRunner(BuildRunner):
         flush_time = round(time.time() - start_time, 2)
         logger.debug({"collection count": self.milvus.count()})
         logger.debug({"flush_time": flush_time})
+
+
+def segments_done(segment_rows, indexed_rows):
+    """
+    the number of segments built, estimated from the indexed rows: the progress is reported in rows,
+    the segments are counted from the smallest, so the estimation never exceeds the real number
+    """
+    done = 0
+    total = 0
+    for num_rows in sorted(segment_rows):
+        total += num_rows
+        if total > indexed_rows:
+            break
+        done += 1
+    return done
+
+
+class BuildTracker(object):
+    """
+    build the index of one collection and poll its state, the phases:
+        seal: flush until all the segments are flushed
+        queue: create_index until the index state leaves unissued
+        build: until the index state is finished
+        load: load_collection of the built index
+    """
+
+    def __init__(self, client, index_field_name, poll_interval=DEFAULT_POLL_INTERVAL,
+                 build_timeout=DEFAULT_BUILD_TIMEOUT):
+        self._client = client
+        self._index_field_name = index_field_name
+        self._poll_interval = poll_interval
+        self._build_timeout = build_timeout
+        self.phases = dict()
+        self.segments = []
+        self.timeline = []
+        self.build_start_time = None
+        self.build_end_time = None
+
+    def seal(self):
+        start_time = time.time()
+        self._client.flush()
+        deadline = start_time + self._build_timeout
+        while True:
+            self.segments = self._client.get_segment_infos()
+            if all([item["state"] == SEGMENT_STATE_FLUSHED for item in self.segments]):
+                break
+            if time.time() > deadline:
+                raise Exception("Seal segments timeout: %ss" % self._build_timeout)
+            time.sleep(self._poll_interval)
+        self.phases["seal"] = round(time.time() - start_time, 3)
+
+    def build(self, index_type, metric_type, index_param):
+        segment_rows = [item["num_rows"] for item in self.segments]
+        self.build_start_time = time.time()
+        self._client.create_index(self._index_field_name, index_type, metric_type, _async=True,
+                                  index_param=index_param)
+        queue_end_time = None
+        deadline = self.build_start_time + self._build_timeout
+        while True:
+            state, fail_reason = self._client.get_index_state(self._index_field_name)
+            progress = self._client.get_index_build_progress(self._index_field_name)
+            now = time.time()
+            if state == INDEX_STATE_FAILED:
+                raise Exception("Build index failed: %s" % fail_reason)
+            if queue_end_time is None and (state != INDEX_STATE_UNISSUED or progress["indexed_rows"]):
+                queue_end_time = now
+            indexed_rows = progress["indexed_rows"]
+            # a point is added only when the progress changes
+            if not self.timeline or self.timeline[-1]["indexed_rows"] != indexed_rows:
+                self.timeline.append({
+                    "time": round(now - self.build_start_time, 3),
+                    "indexed_rows": indexed_rows,
+                    "total_rows": progress["total_rows"],
+                    "segments_done": segments_done(segment_rows, indexed_rows)
+                })
+            if state == INDEX_STATE_FINISHED:
+                break
+            if now > deadline:
+                raise Exception("Build index timeout: %ss" % self._build_timeout)
+            time.sleep(self._poll_interval)
+        self.build_end_time = time.time()
+        queue_end_time = queue_end_time or self.build_end_time
+        self.phases["queue"] = round(queue_end_time - self.build_start_time, 3)
+        self.phases["build"] = round(self.build_end_time - queue_end_time, 3)
+
+    def load(self):
+        start_time = time.time()
+        self._client.load_collection(timeout=3000)
+        self.phases["load"] = round(time.time() - start_time, 3)
+
+    def run(self, index_type, metric_type, index_param):
+        self.seal()
+        self.build(index_type, metric_type, index_param)
+        self.load()
+        return self.result()
+
+    def result(self):
+        return {
+            "collection_name": self._client.collection_name,
+            "phases": self.phases,
+            "segments": len(self.segments),
+            "rows": sum([item["num_rows"] for item in self.segments]),
+            "segment_rows": [item["num_rows"] for item in self.segments],
+            "timeline": self.timeline
+        }
+
+
+class ConcurrentBuildRunner(BaseRunner):
+    """
+    run the index build of K copies of the collection at the same time:
+        one case for each index type, index param and K,
+        each build is broken into the seal, queue, build and load phases,
+        segments/s and vectors/s are counted over the time from the first create_index to the last finished build
+    """
+    name = "concurrent_build_performance"
+
+    def __init__(self, env, metric):
+        super(ConcurrentBuildRunner, self).__init__(env, metric)
+        self._inserted = set()
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        ni_per = collection["ni_per"]
+        vector_type = utils.get_vector_type(data_type)
+        index_types = collection["index_types"]
+        index_params = utils.generate_combinations(collection["index_params"])
+        build_concurrencies = collection["build_concurrencies"] if "build_concurrencies" in collection else [1]
+        poll_interval = collection["poll_interval"] if "poll_interval" in collection else DEFAULT_POLL_INTERVAL
+        build_timeout = collection["build_timeout"] if "build_timeout" in collection else DEFAULT_BUILD_TIMEOUT
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size,
+            "ni_per": ni_per
+        }
+        self.init_metric(self.name, collection_info, None, None, {"build_concurrencies": build_concurrencies})
+        cases = list()
+        case_metrics = list()
+        for index_type in index_types:
+            for index_param in index_params:
+                for build_concurrency in build_concurrencies:
+                    case_metric = copy.deepcopy(self.metric)
+                    case_metric.set_case_metric_type()
+                    case_metric.index = {
+                        "index_type": index_type,
+                        "index_param": index_param
+                    }
+                    case_metric.run_params = {"build_concurrency": build_concurrency}
+                    case = {
+                        "collection_name": collection_name,
+                        "data_type": data_type,
+                        "dimension": dimension,
+                        "collection_size": collection_size,
+                        "ni_per": ni_per,
+                        "metric_type": metric_type,
+                        "vector_type": vector_type,
+                        "index_field_name": utils.get_default_field_name(vector_type),
+                        "index_type": index_type,
+                        "index_param": index_param,
+                        "build_concurrency": build_concurrency,
+                        "poll_interval": poll_interval,
+                        "build_timeout": build_timeout
+                    }
+                    cases.append(case)
+                    case_metrics.append(case_metric)
+        return cases, case_metrics
+
+    def get_collection_names(self, collection_name, num):
+        return ["%s_%d" % (collection_name, i) for i in range(num)]
+
+    def group_key(self, case):
+        return [case["collection_name"], case["build_concurrency"]]
+
+    def prepare(self, **case_param):
+        """ insert the copies not inserted yet without flush, the first build of each copy seals the segments """
+        dimension = case_param["dimension"]
+        for collection_name in self.get_collection_names(case_param["collection_name"],
+                                                         case_param["build_concurrency"]):
+            if collection_name in self._inserted:
+                continue
+            self.milvus.set_collection(collection_name)
+            if self.milvus.exists_collection():
+                logger.debug("Start drop collection")
+                self.milvus.drop()
+                time.sleep(utils.DELETE_INTERVAL_TIME)
+            self.milvus.create_collection(dimension, data_type=case_param["vector_type"])
+            self.insert(self.milvus, collection_name, case_param["data_type"], dimension,
+                        case_param["collection_size"], case_param["ni_per"])
+            self._inserted.add(collection_name)
+
+    def reset_index(self, client, index_field_name):
+        try:
+            client.release_collection()
+        except Exception as e:
+            # not loaded yet
+            logger.debug(str(e))
+        # describe_index gives the flat index without metric type if there is no index
+        if client.describe_index(index_field_name)["metric_type"]:
+            client.drop_index(index_field_name)
+
+    def run_case(self, case_metric, **case_param):
+        index_field_name = case_param["index_field_name"]
+        collection_names = self.get_collection_names(case_param["collection_name"], case_param["build_concurrency"])
+        clients = [MilvusClient(collection_name=collection_name, host=self.hostname, port=self.port,
+                                pool=get_pool(self.hostname, self.port)) for collection_name in collection_names]
+        trackers = [BuildTracker(client, index_field_name, poll_interval=case_param["poll_interval"],
+                                 build_timeout=case_param["build_timeout"]) for client in clients]
+        errors = []
+        try:
+            for client in clients:
+                self.reset_index(client, index_field_name)
+
+            def work(tracker):
+                try:
+                    tracker.run(case_param["index_type"], case_param["metric_type"], case_param["index_param"])
+                except Exception as e:
+                    logger.error(str(e))
+                    errors.append(e)
+
+            threads = [threading.Thread(target=work, args=(tracker,)) for tracker in trackers]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            for client in clients:
+                client.close()
+        if errors:
+            raise errors[0]
+        build_start_time = min([tracker.build_start_time for tracker in trackers])
+        build_end_time = max([tracker.build_end_time for tracker in trackers])
+        build_time = max(build_end_time - build_start_time, 1e-6)
+        collections = [tracker.result() for tracker in trackers]
+        segments = sum([item["segments"] for item in collections])
+        rows = sum([item["rows"] for item in collections])
+        tmp_result = {
+            "build_concurrency": case_param["build_concurrency"],
+            "build_time": round(build_time, 3),
+            "segments": segments,
+            "rows": rows,
+            "segments_per_second": round(segments / build_time, 4),
+            "vectors_per_second": round(rows / build_time, 2),
+            # the mean of each phase over the collections
+            "phases": {phase: round(sum([item["phases"][phase] for item in collections]) / len(collections), 3)
+                       for phase in ["seal", "queue", "build", "load"]},
+            "collections": collections
+        }
+        logger.info({k: v for k, v in tmp_result.items() if k != "collections"})
+        return tmp_result
+
+    def summarize(self, case_metrics):
+        """ build throughput over the number of concurrent builds for each index """
+        curves = dict()
+        for case_metric in case_metrics:
+            value = case_metric.metrics["value"]
+            if case_metric.status != "RUN_SUCC" or "build_time" not in value:
+                continue
+            key = json.dumps(case_metric.index, sort_keys=True)
+            curves.setdefault(key, []).append({
+                "build_concurrency": value["build_concurrency"],
+                "build_time": value["build_time"],
+                "segments_per_second": value["segments_per_second"],
+                "vectors_per_second": value["vectors_per_second"],
+                "phases": value["phases"]
+            })
+        result = []
+        for key, points in curves.items():
+            item = {"index": json.loads(key)}
+            item["points"] = sorted(points, key=lambda x: x["build_concurrency"])
+            result.append(item)
+        logger.info("Build curves: %s" % json.dumps(result))
+        self.result.update({"curves": result})
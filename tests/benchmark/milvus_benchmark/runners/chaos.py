@@ -1,20 +1,41 @@
 import copy
+import json
 import logging
 import pdb
 import time
-from operator import methodcaller
 from yaml import full_load, dump
 import threading
+import numpy as np
+from milvus_benchmark import parser
 from milvus_benchmark import utils
 from milvus_benchmark.runners import utils as runner_utils
+from milvus_benchmark.runners import datagen
 from milvus_benchmark.chaos import utils as chaos_utils
 from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners import locust_stats
+from milvus_benchmark.runners.locust_stats import TimeSeriesStats
+from milvus_benchmark.async_client import AsyncMilvusClient
+from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.pool import get_pool
 from chaos.chaos_opt import ChaosOpt
 from milvus_benchmark import config
 from milvus_benchmark.chaos.chaos_mesh import PodChaos, NetworkChaos
+from milvus_benchmark.chaos.proxy import FaultProxy
 
 logger = logging.getLogger("milvus_benchmark.runners.chaos")
 
+SEARCH_TASK = "search"
+INSERT_TASK = "insert"
+DEFAULT_BASELINE_TIME = 60
+DEFAULT_FAULT_TIME = 60
+DEFAULT_RECOVER_TIME = 120
+DEFAULT_RECOVER_TOLERANCE = 0.1
+DEFAULT_STATS_INTERVAL = 1
+DEFAULT_REQUEST_TIMEOUT = 10
+DEFAULT_INSERT_BATCH = 100
+# the ids inserted by the chaos load start from here, away from the ids of the collection
+CHAOS_ID_BASE = 10 ** 12
+
 kind_chaos_mapping = {
     "PodChaos": PodChaos,
     "NetworkChaos": NetworkChaos
@@ -32,9 +53,17 @@ class SimpleChaosRunner(BaseRunner):
 
     def __init__(self, env, metric):
         super(SimpleChaosRunner, self).__init__(env, metric)
+        self._async_milvus = None
+
+    @property
+    def async_milvus(self):
+        if self._async_milvus is None:
+            self._async_milvus = AsyncMilvusClient(self.milvus)
+        return self._async_milvus
 
     async def async_call(self, func, **kwargs):
-        future = methodcaller(func, **kwargs)(self.milvus)
+        """ the blocking call runs in the executor of the facade instead of blocking the event loop """
+        return await self.async_milvus.call(func, **kwargs)
 
     def run_step(self, interface_name, interface_params):
         if interface_name == "create_collection":
@@ -125,3 +154,326 @@ class SimpleChaosRunner(BaseRunner):
         finally:
             chaos_opt.delete_all_chaos_object()
             logger.info(chaos_opt.list_chaos_object())
+
+
+class ChaosMeshFault(object):
+    """ the chaos object of chaos mesh, created by inject and deleted by recover """
+
+    def __init__(self, kind, spec):
+        metadata = {"name": config.NAMESPACE + "-" + kind.lower()}
+        self._chaos_mesh = kind_chaos_mapping[kind](config.DEFAULT_API_VERSION, kind, metadata, spec)
+        self._chaos_opt = ChaosOpt(kind)
+
+    def start(self):
+        self._experiment_config = self._chaos_mesh.gen_experiment_config()
+        if len(self._chaos_opt.list_chaos_object()["items"]) != 0:
+            self._chaos_opt.delete_chaos_object(self._chaos_mesh.metadata["name"])
+        return None
+
+    def inject(self):
+        self._chaos_opt.create_chaos_object(self._experiment_config)
+
+    def recover(self):
+        self._chaos_opt.delete_chaos_object(self._chaos_mesh.metadata["name"])
+
+    def stop(self):
+        self._chaos_opt.delete_all_chaos_object()
+
+
+class ProxyFault(object):
+    """ the fault of the local proxy, the load is sent through the proxy instead of to the server directly """
+
+    def __init__(self, host, port, action, delay=0):
+        self._proxy = FaultProxy(host, port)
+        self._action = action
+        self._delay = delay
+
+    def start(self):
+        """ return the (host, port) the clients connect to """
+        self._proxy.start()
+        return self._proxy.host, self._proxy.port
+
+    def inject(self):
+        self._proxy.inject(self._action, delay=self._delay)
+
+    def recover(self):
+        self._proxy.recover()
+
+    def stop(self):
+        self._proxy.stop()
+
+
+def analyze_fault(time_series, inject_offset, recover_offset, tolerance=DEFAULT_RECOVER_TOLERANCE):
+    """
+    time_series: the export of TimeSeriesStats, inject_offset/recover_offset: seconds from the start of the load
+    for each task, the rps is the rate of the successful requests:
+        baseline: the intervals before the fault, the first one is skipped as the ramp up
+        fault: the intervals starting during the fault
+        time_to_recover: from the recovery to the first interval from which the rps and the p99 of all the intervals
+        are within the tolerance of the baseline, None if not recovered at the end of the run
+    """
+    interval = time_series["interval"]
+    times = time_series["time"]
+    result = dict()
+    for name, task in time_series["tasks"].items():
+        baseline = [i for i, t in enumerate(times) if 0 < i and t + interval <= inject_offset]
+        fault = [i for i, t in enumerate(times) if inject_offset <= t < recover_offset]
+        after = [i for i, t in enumerate(times) if t >= recover_offset]
+        if not baseline:
+            logger.warning("No baseline interval of task: %s" % name)
+            continue
+        rps = [r * (1 - (f or 0)) for r, f in zip(task["rps"], task["fail_ratio"])]
+        baseline_rps = float(np.mean([rps[i] for i in baseline]))
+        baseline_p99 = [task["p99"][i] for i in baseline if task["p99"][i] is not None]
+        baseline_p99 = float(np.median(baseline_p99)) if baseline_p99 else None
+
+        def mean(values, indexes):
+            values = [values[i] for i in indexes if values[i] is not None]
+            return round(float(np.mean(values)), 3) if values else None
+
+        def within(i):
+            if rps[i] < baseline_rps * (1 - tolerance):
+                return False
+            if baseline_p99 is not None and (task["p99"][i] is None or task["p99"][i] > baseline_p99 * (1 + tolerance)):
+                return False
+            return True
+
+        recovered = None
+        for i in reversed(after):
+            if not within(i):
+                break
+            recovered = i
+        fault_rps = mean(rps, fault)
+        fault_p99 = mean(task["p99"], fault)
+        result[name] = {
+            "baseline": {"rps": round(baseline_rps, 2), "p99": baseline_p99},
+            "fault": {"rps": fault_rps, "p99": fault_p99, "fail_ratio": mean(task["fail_ratio"], fault)},
+            "rps_change": round(fault_rps / baseline_rps - 1, 4) if fault_rps is not None and baseline_rps else None,
+            "p99_change": round(fault_p99 / baseline_p99 - 1, 4) if fault_p99 is not None and baseline_p99 else None,
+            "time_to_recover": round(max(0.0, times[recovered] - recover_offset), 3) if recovered is not None else None
+        }
+    return result
+
+
+def count_lost_requests(summary):
+    """ the failed requests of all the tasks, each one is counted both in its task and in total by TimeSeriesStats """
+    if locust_stats.TOTAL in summary:
+        return summary[locust_stats.TOTAL]["failures"]
+    return sum([item["failures"] for item in summary.values()])
+
+
+class ChaosPerformanceRunner(BaseRunner):
+    """
+    run the steady search and insert load on an existing collection, inject the fault in the middle of the load:
+        baseline_time, then fault_time with the fault, then recover_time after the fault is removed,
+        the fault is a chaos mesh object, or the local proxy in front of the server without kubernetes,
+        the requests lost are the failed ones, and the acknowledged rows missing from the collection at the end
+    """
+    name = "chaos_performance"
+
+    def __init__(self, env, metric):
+        super(ChaosPerformanceRunner, self).__init__(env, metric)
+        self._next_id = CHAOS_ID_BASE
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        search_concurrency = collection["search_concurrency"] if "search_concurrency" in collection else 1
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else 0
+        insert_batch = collection["insert_batch"] if "insert_batch" in collection else DEFAULT_INSERT_BATCH
+        baseline_time = utils.timestr_to_int(collection["baseline_time"]) if "baseline_time" in collection else DEFAULT_BASELINE_TIME
+        fault_time = utils.timestr_to_int(collection["fault_time"]) if "fault_time" in collection else DEFAULT_FAULT_TIME
+        recover_time = utils.timestr_to_int(collection["recover_time"]) if "recover_time" in collection else DEFAULT_RECOVER_TIME
+        recover_tolerance = collection["recover_tolerance"] if "recover_tolerance" in collection else DEFAULT_RECOVER_TOLERANCE
+        stats_interval = collection["stats_interval"] if "stats_interval" in collection else DEFAULT_STATS_INTERVAL
+        request_timeout = collection["request_timeout"] if "request_timeout" in collection else DEFAULT_REQUEST_TIMEOUT
+        top_k = collection["top_k"]
+        nq = collection["nq"]
+        search_param = collection["search_param"]
+        vector_type = runner_utils.get_vector_type(data_type)
+        index_field_name = runner_utils.get_default_field_name(vector_type)
+        search_info = {
+            "topk": top_k,
+            "query": runner_utils.get_vectors_from_binary(nq, dimension, data_type),
+            "metric_type": runner_utils.metric_type_trans(metric_type),
+            "params": search_param}
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size
+        }
+        self.init_metric(self.name, collection_info, None, None)
+        cases = list()
+        case_metrics = list()
+        for fault in collection["faults"]:
+            if "local" not in fault and "chaos" not in fault:
+                raise Exception("Fault: %s is neither local nor chaos" % json.dumps(fault))
+            case_metric = copy.deepcopy(self.metric)
+            case_metric.set_case_metric_type()
+            case_metric.search = {
+                "nq": nq,
+                "topk": top_k,
+                "search_param": search_param
+            }
+            case_metric.run_params = {
+                "fault": fault,
+                "search_concurrency": search_concurrency,
+                "insert_concurrency": insert_concurrency,
+                "insert_batch": insert_batch,
+                "baseline_time": baseline_time,
+                "fault_time": fault_time,
+                "recover_time": recover_time
+            }
+            case = {
+                "collection_name": collection_name,
+                "dimension": dimension,
+                "fault": fault,
+                "search_concurrency": search_concurrency,
+                "insert_concurrency": insert_concurrency,
+                "insert_batch": insert_batch,
+                "baseline_time": baseline_time,
+                "fault_time": fault_time,
+                "recover_time": recover_time,
+                "recover_tolerance": recover_tolerance,
+                "stats_interval": stats_interval,
+                "request_timeout": request_timeout,
+                "vector_query": {"vector": {index_field_name: search_info}}
+            }
+            cases.append(case)
+            case_metrics.append(case_metric)
+        return cases, case_metrics
+
+    def group_key(self, case):
+        return [case["collection_name"]]
+
+    def prepare(self, **case_param):
+        collection_name = case_param["collection_name"]
+        self.milvus.set_collection(collection_name)
+        if not self.milvus.exists_collection():
+            raise Exception("collection name: {} not existed".format(collection_name))
+        self.milvus.load_collection(timeout=1200)
+
+    def get_fault(self, fault):
+        if "local" in fault:
+            local = fault["local"]
+            return ProxyFault(self.hostname, self.port, local["action"], delay=local.get("delay", 0))
+        return ChaosMeshFault(fault["chaos"]["kind"], fault["chaos"]["spec"])
+
+    def run_case(self, case_metric, **case_param):
+        collection_name = case_param["collection_name"]
+        vector_query = case_param["vector_query"]
+        insert_batch = case_param["insert_batch"]
+        request_timeout = case_param["request_timeout"]
+        fault = self.get_fault(case_param["fault"])
+        address = fault.start()
+        host, port = address if address else (self.hostname, self.port)
+        pool = get_pool(host, port)
+        clients = [MilvusClient(collection_name=collection_name, host=host, port=port, pool=pool)
+                   for _ in range(case_param["search_concurrency"] + case_param["insert_concurrency"])]
+        info = self.milvus.get_info()
+        generator = datagen.get_generator()
+        stats = TimeSeriesStats(case_param["stats_interval"])
+        lock = threading.Lock()
+        acked = {"rows": 0}
+        stop_event = threading.Event()
+        self.milvus.flush()
+        count_before = self.milvus.count()
+
+        def record(name, start, failed):
+            with lock:
+                stats.record(name, (time.time() - start) * 1000, failed=failed)
+
+        def search(client):
+            while not stop_event.is_set():
+                start = time.time()
+                try:
+                    client.query(vector_query, timeout=request_timeout, log=False)
+                    record(SEARCH_TASK, start, False)
+                except Exception as e:
+                    logger.debug(str(e))
+                    record(SEARCH_TASK, start, True)
+
+        def insert(client):
+            while not stop_event.is_set():
+                with lock:
+                    start_id = self._next_id
+                    self._next_id += insert_batch
+                vectors = generator.float_vectors(insert_batch, case_param["dimension"], part=start_id)
+                ids = np.arange(start_id, start_id + insert_batch, dtype=np.int64)
+                entities = runner_utils.generate_columnar_entities(info, vectors, ids)
+                start = time.time()
+                # the failure is logged and None returned by the client
+                res = client.insert(entities, timeout=request_timeout, log=False)
+                record(INSERT_TASK, start, res is None)
+                if res is not None:
+                    with lock:
+                        acked["rows"] += insert_batch
+
+        threads = [threading.Thread(target=search, args=(client,))
+                   for client in clients[:case_param["search_concurrency"]]]
+        threads.extend([threading.Thread(target=insert, args=(client,))
+                        for client in clients[case_param["search_concurrency"]:]])
+        timestamps = dict()
+        start_time = time.time()
+        try:
+            stats.start(start_time)
+            for t in threads:
+                t.start()
+            time.sleep(case_param["baseline_time"])
+            timestamps["inject"] = time.time()
+            fault.inject()
+            logger.info("Fault injected: %s" % json.dumps(case_param["fault"]))
+            time.sleep(case_param["fault_time"])
+            timestamps["recover"] = time.time()
+            fault.recover()
+            logger.info("Fault recovered")
+            time.sleep(case_param["recover_time"])
+        finally:
+            stop_event.set()
+            # the in-flight requests end within the request timeout
+            for t in threads:
+                t.join()
+            stats.stop()
+            if "recover" not in timestamps:
+                fault.recover()
+            fault.stop()
+            for client in clients:
+                client.close()
+            if address:
+                # the connections to the proxy are useless after it is stopped
+                pool.close()
+        time_series = stats.export()
+        summary = stats.summary()
+        self.milvus.flush()
+        written_rows = self.milvus.count() - count_before
+        tmp_result = {
+            "fault": case_param["fault"],
+            "inject_time": round(timestamps["inject"] - start_time, 3),
+            "recover_time": round(timestamps["recover"] - start_time, 3),
+            "tasks": summary,
+            "impact": analyze_fault(time_series, timestamps["inject"] - start_time,
+                                    timestamps["recover"] - start_time, case_param["recover_tolerance"]),
+            "lost_requests": count_lost_requests(summary),
+            "acked_rows": acked["rows"],
+            "lost_rows": max(0, acked["rows"] - written_rows),
+            "time_series": time_series
+        }
+        logger.info({k: v for k, v in tmp_result.items() if k != "time_series"})
+        return tmp_result
+
+    def summarize(self, case_metrics):
+        """ the impact of each fault on each task """
+        result = []
+        for case_metric in case_metrics:
+            value = case_metric.metrics["value"]
+            if case_metric.status != "RUN_SUCC" or "impact" not in value:
+                continue
+            result.append({
+                "fault": value["fault"],
+                "impact": value["impact"],
+                "lost_requests": value["lost_requests"],
+                "lost_rows": value["lost_rows"]
+            })
+        logger.info("Chaos impact: %s" % json.dumps(result))
+        self.result.update({"faults": result})
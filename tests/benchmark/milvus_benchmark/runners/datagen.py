@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+
+logger = logging.getLogger("milvus_benchmark.runners.datagen")
+
+DEFAULT_SEED = 1234
+UNIFORM = "uniform"
+NORMAL = "normal"
+GAUSSIAN_MIXTURE = "gaussian_mixture"
+ZIPF = "zipf"
+SEQUENCE = "sequence"
+DEFAULT_CLUSTERS = 100
+DEFAULT_CLUSTER_STD = 0.05
+DEFAULT_ZIPF_A = 1.2
+# the vectors are generated in blocks of rows, each block is keyed by its position, not by the requested batch
+BLOCK_SIZE = 1024
+
+
+class DataGenerator(object):
+    """
+    Seeded generator of contiguous columns, the same (seed, kind, shape, distribution, params)
+    always gives the same data whatever the order of the calls is,
+    the row of the vectors depends on its id only, not on the size of the batch it is requested in,
+    with cache_dir the data is saved as npy and loaded with mmap next time
+    """
+
+    def __init__(self, seed=DEFAULT_SEED, cache_dir=None):
+        self._seed = seed
+        self._cache_dir = cache_dir
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _key(self, kind, **params):
+        params.update({"kind": kind, "seed": self._seed})
+        return hashlib.md5(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _generate(self, func, kind, **params):
+        key = self._key(kind, **params)
+        file_name = os.path.join(self._cache_dir, "%s_%s.npy" % (kind, key)) if self._cache_dir else None
+        if file_name and os.path.exists(file_name):
+            logger.debug("Load %s from cache: %s" % (kind, file_name))
+            return np.load(file_name, mmap_mode="r")
+        # an independent stream for each key
+        rng = np.random.default_rng(np.random.SeedSequence([self._seed, int(key[:8], 16)]))
+        data = np.ascontiguousarray(func(rng))
+        if file_name:
+            # write to a temp file first, the cache may be shared by the concurrent runs
+            tmp_file_name = "%s.%d.tmp.npy" % (file_name[:-len(".npy")], os.getpid())
+            np.save(tmp_file_name, data)
+            os.replace(tmp_file_name, file_name)
+        return data
+
+    def _rows(self, func, kind, nb, part, **params):
+        """
+        rows [part, part + nb) of the data set generated by func(rng, n), read from the blocks covering them,
+        a negative part is a data set apart starting from the row 0, e.g. -1 for the query vectors
+        """
+        data_set, start = (part, 0) if part < 0 else (0, part)
+        first = start // BLOCK_SIZE
+        last = (start + max(nb, 1) - 1) // BLOCK_SIZE
+        blocks = [self._generate(lambda rng: func(rng, BLOCK_SIZE), kind, data_set=data_set, block=block, **params)
+                  for block in range(first, last + 1)]
+        offset = start - first * BLOCK_SIZE
+        data = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        return data[offset:offset + nb]
+
+    def float_vectors(self, nb, dim, distribution=UNIFORM, normalize=False, clusters=DEFAULT_CLUSTERS,
+                      cluster_std=DEFAULT_CLUSTER_STD, part=0):
+        """
+        float32 array of shape (nb, dim), part is the id of the first row, the row of an id is the same for any nb
+            uniform: [0, 1)
+            normal: standard normal
+            gaussian_mixture: points around `clusters` uniform centers with cluster_std
+        """
+        def func(rng, nb):
+            if distribution == UNIFORM:
+                X = rng.random((nb, dim), dtype=np.float32)
+            elif distribution == NORMAL:
+                X = rng.standard_normal((nb, dim), dtype=np.float32)
+            elif distribution == GAUSSIAN_MIXTURE:
+                # the centers are shared by all the parts
+                centers = np.random.default_rng(self._seed).random((clusters, dim), dtype=np.float32)
+                labels = rng.integers(0, clusters, size=nb)
+                X = centers[labels]
+                X += rng.standard_normal((nb, dim), dtype=np.float32) * np.float32(cluster_std)
+            else:
+                raise Exception("Distribution: %s not supported" % distribution)
+            if normalize:
+                norms = np.linalg.norm(X, axis=1, keepdims=True)
+                norms[norms == 0] = 1
+                X /= norms
+            return X
+
+        params = {"dim": dim, "distribution": distribution, "normalize": normalize}
+        if distribution == GAUSSIAN_MIXTURE:
+            params.update({"clusters": clusters, "cluster_std": cluster_std})
+        return self._rows(func, "float_vectors", nb, part, **params)
+
+    def binary_vectors(self, nb, dim, density=0.5, part=0):
+        """
+        uint8 array of shape (nb, dim / 8), the bits are set with the probability of density,
+        part is the id of the first row as float_vectors
+        """
+        def func(rng, nb):
+            return np.packbits(rng.random((nb, dim), dtype=np.float32) < density, axis=-1)
+
+        return self._rows(func, "binary_vectors", nb, part, dim=dim, density=density)
+
+    def scalars(self, nb, dtype="int64", distribution=UNIFORM, low=0, high=None, a=DEFAULT_ZIPF_A):
+        """
+        1-D array of nb values in [low, high)
+            uniform: uniform values
+            zipf: low + k - 1 with k ~ zipf(a), clipped to high, a few values are very frequent
+            sequence: low, low + 1, ...
+        """
+        if high is None:
+            high = low + nb
+
+        def func(rng):
+            if distribution == UNIFORM:
+                if np.dtype(dtype).kind == "f":
+                    values = rng.uniform(low, high, size=nb)
+                else:
+                    values = rng.integers(low, high, size=nb)
+            elif distribution == ZIPF:
+                values = np.minimum(rng.zipf(a, size=nb) - 1 + low, high - 1)
+            elif distribution == SEQUENCE:
+                values = np.arange(low, low + nb)
+            else:
+                raise Exception("Distribution: %s not supported" % distribution)
+            return values.astype(dtype)
+
+        return self._generate(func, "scalars", nb=nb, dtype=dtype, distribution=distribution, low=low, high=high,
+                              a=a if distribution == ZIPF else None)
+
+    def near_duplicates(self, base, nb, noise=0.01):
+        """
+        nb float32 vectors, each one is a random row of base with gaussian noise,
+        used as queries whose nearest neighbors are known to be very close
+        return (vectors, source row indexes)
+        """
+        base = np.asarray(base)
+        key = hashlib.md5(np.ascontiguousarray(base[:16]).tobytes()).hexdigest()
+        rng = np.random.default_rng(np.random.SeedSequence([self._seed, int(key[:8], 16), nb]))
+        indexes = rng.integers(0, len(base), size=nb)
+        vectors = base[indexes].astype(np.float32)
+        vectors += rng.standard_normal(vectors.shape, dtype=np.float32) * np.float32(noise)
+        return vectors, indexes
+
+
+_default_generator = DataGenerator()
+
+
+def get_generator(seed=DEFAULT_SEED, cache_dir=None):
+    if seed == DEFAULT_SEED and cache_dir is None:
+        return _default_generator
+    return DataGenerator(seed=seed, cache_dir=cache_dir)
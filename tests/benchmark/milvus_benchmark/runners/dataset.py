@@ -0,0 +1,78 @@
+import os
+import logging
+import numpy as np
+import h5py
+
+logger = logging.getLogger("milvus_benchmark.runners.dataset")
+
+DEFAULT_CHUNK_SIZE = 50000
+BINARY_METRIC_TYPES = ["jaccard", "hamming", "sub", "super"]
+
+
+def normalize_chunk(metric_type, X):
+    """
+    Same as utils.normalize, but work on the chunk in place when possible and keep the result as ndarray:
+        ip: float32 rows divided by their l2 norm, zero rows are kept
+        l2: float32
+        binary: bits packed into uint8, one row is dim / 8 bytes
+    """
+    if metric_type in BINARY_METRIC_TYPES:
+        return np.packbits(X, axis=-1)
+    X = np.asarray(X, dtype=np.float32)
+    if metric_type == "ip":
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        np.divide(X, norms, out=X)
+    return X
+
+
+class HDF5Dataset(object):
+    """
+    ANN dataset in hdf5 format, e.g. sift-128-euclidean.hdf5:
+        train: the vectors inserted into the collection, read in chunks and never resident
+        test: the query vectors, resident after normalization
+        neighbors: the ground truth ids of the test vectors, resident
+    """
+
+    def __init__(self, source_file, metric_type):
+        if not os.path.exists(source_file):
+            raise Exception("%s not existed" % source_file)
+        self._source_file = source_file
+        self._metric_type = metric_type
+        self._file = h5py.File(source_file, "r")
+        self._train = self._file["train"]
+        self._test = normalize_chunk(metric_type, self._file["test"][:])
+        self._neighbors = self._file["neighbors"][:]
+        logger.debug("Dataset: %s, train: %s, test: %s, neighbors: %s" % (
+            source_file, self._train.shape, self._test.shape, self._neighbors.shape))
+
+    @property
+    def source_file(self):
+        return self._source_file
+
+    @property
+    def train_size(self):
+        return self._train.shape[0]
+
+    @property
+    def neighbors(self):
+        return self._neighbors
+
+    def query_vectors(self, nq):
+        """ the first nq test vectors, binary vectors are returned as bytes """
+        vectors = self._test[:nq]
+        if self._metric_type in BINARY_METRIC_TYPES:
+            return [row.tobytes() for row in vectors]
+        return vectors
+
+    def iter_train(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Yield (start_id, vectors) for every chunk of the train set,
+        only one chunk is read from the file at a time
+        """
+        for start in range(0, self.train_size, chunk_size):
+            end = min(start + chunk_size, self.train_size)
+            yield start, normalize_chunk(self._metric_type, self._train[start:end])
+
+    def close(self):
+        self._file.close()
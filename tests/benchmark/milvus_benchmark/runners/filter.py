@@ -0,0 +1,260 @@
+import copy
+import json
+import logging
+import numpy as np
+
+from milvus_benchmark import parser
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import datagen
+from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.search import run_search, search_result
+from milvus_benchmark.runners.groundtruth import brute_force_search, filter_mask
+
+logger = logging.getLogger("milvus_benchmark.runners.filter")
+
+DEFAULT_SELECTIVITIES = [0.001, 0.01, 0.1, 0.5, 0.99]
+DEFAULT_NI = 50000
+
+
+def get_field_dtype(field_name):
+    """ the field type is given by the prefix of the name, the same as MilvusClient.create_collection """
+    if field_name.startswith("int"):
+        return "int64"
+    elif field_name.startswith("float"):
+        return "float32"
+    elif field_name.startswith("double"):
+        return "float64"
+    raise Exception("Field name: %s not supported" % field_name)
+
+
+def selectivity_filter(field_name, sorted_values, selectivity):
+    """
+    Derive the range filter selecting the lowest or the highest values of the field,
+    with repeated values, e.g. the head of a zipf field, the exact selectivity may not be reachable,
+    the nearest one is taken
+    return (filter, actual selectivity)
+    """
+    size = len(sorted_values)
+    count = min(max(int(round(selectivity * size)), 1), size)
+    low = sorted_values[0].item()
+    high = sorted_values[-1].item()
+    candidates = []
+    # the lowest values: GE min and LT/LE threshold
+    threshold = sorted_values[count - 1].item()
+    for op, side in [("LT", "left"), ("LE", "right")]:
+        selected = int(np.searchsorted(sorted_values, threshold, side=side))
+        candidates.append((selected, {"GE": low, op: threshold}))
+    # the highest values: GT/GE threshold and LE max
+    threshold = sorted_values[size - count].item()
+    for op, side in [("GE", "left"), ("GT", "right")]:
+        selected = size - int(np.searchsorted(sorted_values, threshold, side=side))
+        candidates.append((selected, {op: threshold, "LE": high}))
+    selected, ops = min([x for x in candidates if x[0]], key=lambda x: abs(x[0] / size - selectivity))
+    return {"range": {field_name: ops}}, round(selected / size, 6)
+
+
+class FilterSearchRunner(BaseRunner):
+    """
+    run search with filters of known selectivity:
+        the scalar fields are generated with the given distributions,
+        the range filters are derived from the values for each target selectivity,
+        the recall is calculated with the filtered ground truth computed on the client
+    """
+    name = "filter_search_performance"
+
+    def __init__(self, env, metric):
+        super(FilterSearchRunner, self).__init__(env, metric)
+        self._columns = dict()
+        self._ground_truth = dict()
+        self._inserted = False
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        ni_per = collection["ni_per"] if "ni_per" in collection else DEFAULT_NI
+        scalar_fields = collection["scalar_fields"]
+        selectivities = collection["selectivities"] if "selectivities" in collection else DEFAULT_SELECTIVITIES
+        index_types = collection["index_types"]
+        index_params = utils.generate_combinations(collection["index_params"])
+        search_params = utils.generate_combinations(collection["search_params"])
+        top_k = collection["top_k"]
+        nq = collection["nq"]
+        run_count = collection["run_count"]
+        vector_type = utils.get_vector_type(data_type)
+        index_field_name = utils.get_default_field_name(vector_type)
+        generator = datagen.get_generator()
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size,
+            "scalar_fields": scalar_fields
+        }
+        self.init_metric(self.name, collection_info, None, None, {"selectivities": selectivities})
+        # the unfiltered search is the baseline of each index
+        filters = [{"field": None, "selectivity": 1.0, "actual_selectivity": 1.0, "filter": None}]
+        for field_name, field_param in scalar_fields.items():
+            values = generator.scalars(collection_size, dtype=get_field_dtype(field_name),
+                                       distribution=field_param.get("distribution", datagen.UNIFORM),
+                                       low=field_param.get("low", 0), high=field_param.get("high"),
+                                       a=field_param.get("a", datagen.DEFAULT_ZIPF_A))
+            self._columns[field_name] = values
+            sorted_values = np.sort(values)
+            for selectivity in selectivities:
+                filter_query, actual_selectivity = selectivity_filter(field_name, sorted_values, selectivity)
+                filters.append({"field": field_name, "selectivity": selectivity,
+                                "actual_selectivity": actual_selectivity, "filter": filter_query})
+        query_vectors = generator.float_vectors(nq, dimension, part=-1)
+        cases = list()
+        case_metrics = list()
+        for index_type in index_types:
+            for index_param in index_params:
+                for search_param in search_params:
+                    for item in filters:
+                        case_metric = copy.deepcopy(self.metric)
+                        case_metric.set_case_metric_type()
+                        case_metric.index = {
+                            "index_type": index_type,
+                            "index_param": index_param
+                        }
+                        case_metric.search = {
+                            "nq": nq,
+                            "topk": top_k,
+                            "search_param": search_param,
+                            "filter": [item["filter"]] if item["filter"] else [],
+                            "selectivity": item["selectivity"]
+                        }
+                        search_info = {
+                            "topk": top_k,
+                            "query": query_vectors,
+                            "metric_type": utils.metric_type_trans(metric_type),
+                            "params": search_param}
+                        case = {
+                            "collection_name": collection_name,
+                            "collection_size": collection_size,
+                            "dimension": dimension,
+                            "metric_type": metric_type,
+                            "vector_type": vector_type,
+                            "ni_per": ni_per,
+                            "index_field_name": index_field_name,
+                            "index_type": index_type,
+                            "index_param": index_param,
+                            "filter_field": item["field"],
+                            "selectivity": item["selectivity"],
+                            "actual_selectivity": item["actual_selectivity"],
+                            "filter_query": [item["filter"]] if item["filter"] else [],
+                            "vector_query": {"vector": {index_field_name: search_info}},
+                            "run_count": run_count
+                        }
+                        cases.append(case)
+                        case_metrics.append(case_metric)
+        return cases, case_metrics
+
+    def iter_blocks(self, collection_size, dimension, ni_per):
+        """ the vectors of the collection, regenerated from the seed instead of kept in memory """
+        generator = datagen.get_generator()
+        for start_id in range(0, collection_size, ni_per):
+            yield start_id, generator.float_vectors(min(ni_per, collection_size - start_id), dimension,
+                                                    part=start_id)
+
+    def insert_data(self, **case_param):
+        collection_name = case_param["collection_name"]
+        collection_size = case_param["collection_size"]
+        if self.milvus.exists_collection(collection_name):
+            logger.info("Re-create collection: %s" % collection_name)
+            self.milvus.drop()
+        self.milvus.create_collection(case_param["dimension"], data_type=case_param["vector_type"],
+                                      other_fields=",".join(self._columns.keys()))
+        info = self.milvus.get_info(collection_name)
+        for start_id, vectors in self.iter_blocks(collection_size, case_param["dimension"], case_param["ni_per"]):
+            end_id = start_id + len(vectors)
+            ids = np.arange(start_id, end_id, dtype=np.int64)
+            entities = []
+            for field in info["fields"]:
+                if field["name"] in self._columns:
+                    values = self._columns[field["name"]][start_id:end_id]
+                else:
+                    values = utils.generate_columnar_values(field, vectors, ids)
+                entities.append({"name": field["name"], "type": field["type"], "values": values})
+            self.milvus.insert(entities)
+        self.milvus.flush()
+        row_count = self.milvus.count()
+        if row_count != collection_size:
+            raise Exception("Row count: %d is not equal to collection size: %d" % (row_count, collection_size))
+        self._inserted = True
+
+    def group_key(self, case):
+        return [case["index_type"], case["index_param"]]
+
+    def prepare(self, **case_param):
+        """ insert once, re-create the index for each group """
+        collection_name = case_param["collection_name"]
+        index_field_name = case_param["index_field_name"]
+        index_type = case_param["index_type"]
+        index_param = case_param["index_param"]
+        self.milvus.set_collection(collection_name)
+        if not self._inserted:
+            self.insert_data(**case_param)
+        else:
+            self.milvus.release_collection()
+        if self.milvus.describe_index(index_field_name):
+            self.milvus.drop_index(index_field_name)
+        self.milvus.create_index(index_field_name, index_type, case_param["metric_type"], index_param=index_param)
+        logger.info(self.milvus.describe_index(index_field_name))
+        self.milvus.load_collection(timeout=600)
+
+    def get_ground_truth(self, case_param):
+        """ filtered exact top_k, computed once for each filter """
+        filter_query = case_param["filter_query"]
+        key = json.dumps(filter_query, sort_keys=True)
+        if key not in self._ground_truth:
+            search_info = case_param["vector_query"]["vector"][case_param["index_field_name"]]
+            mask = filter_mask(self._columns, filter_query[0]) if filter_query else None
+            logger.info("Compute ground truth, filter: %s" % key)
+            self._ground_truth[key] = brute_force_search(
+                search_info["query"], self.iter_blocks(case_param["collection_size"], case_param["dimension"],
+                                                       case_param["ni_per"]),
+                search_info["topk"], case_param["metric_type"], mask=mask)
+        return self._ground_truth[key]
+
+    def run_case(self, case_metric, **case_param):
+        top_k = case_metric.search["topk"]
+        vector_query = case_param["vector_query"]
+        filter_query = case_param["filter_query"]
+        true_ids = self.get_ground_truth(case_param)
+        query_res = self.milvus.query(vector_query, filter_query=filter_query)
+        result_ids = utils.result_ids_to_array(self.milvus.get_ids(query_res), top_k)
+        tmp_result = utils.get_recall_metrics(true_ids, result_ids)
+        histogram = run_search(self.milvus, vector_query, filter_query, case_param["run_count"])
+        tmp_result.update(search_result(histogram))
+        tmp_result.update({
+            "filter_field": case_param["filter_field"],
+            "selectivity": case_param["selectivity"],
+            "actual_selectivity": case_param["actual_selectivity"]
+        })
+        logger.info({k: v for k, v in tmp_result.items() if k != "histogram"})
+        return tmp_result
+
+    def summarize(self, case_metrics):
+        """ latency and recall over the selectivity for each index and filter field """
+        curves = dict()
+        for case_metric in case_metrics:
+            value = case_metric.metrics["value"]
+            if case_metric.status != "RUN_SUCC" or "latency" not in value:
+                continue
+            key = json.dumps({"index": case_metric.index, "search_param": case_metric.search["search_param"]},
+                             sort_keys=True)
+            curves.setdefault(key, []).append({
+                "filter_field": value["filter_field"],
+                "selectivity": value["selectivity"],
+                "actual_selectivity": value["actual_selectivity"],
+                "recall": value["recall"],
+                "p50": value["latency"]["p50"],
+                "p99": value["latency"]["p99"]
+            })
+        result = []
+        for key, points in curves.items():
+            item = json.loads(key)
+            item["points"] = sorted(points, key=lambda x: (x["filter_field"] or "", x["actual_selectivity"]))
+            result.append(item)
+        self.result.update({"curves": result})
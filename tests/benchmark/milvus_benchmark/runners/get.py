@@ -1,12 +1,39 @@
 import time
 import copy
+import json
 import logging
+import threading
+import itertools
+import numpy as np
+from pymilvus import DataType
 from milvus_benchmark import parser
+from milvus_benchmark import utils as common_utils
+from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.pool import get_pool
 from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import datagen
 from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.qps import run_closed_loop
 
 logger = logging.getLogger("milvus_benchmark.runners.get")
 
+UNIFORM = "uniform"
+ZIPF = "zipf"
+RECENT = "recent"
+MISSING = "missing"
+DELETED = "deleted"
+ID_DISTRIBUTIONS = [UNIFORM, ZIPF, RECENT, MISSING, DELETED]
+DEFAULT_DURING_TIME = 60
+DEFAULT_WARMUP_TIME = 5
+DEFAULT_RECENT_SIZE = 10000
+DEFAULT_DELETED_SIZE = 10000
+# distinct id batches drawn for each case, the clients take them in turn
+DEFAULT_BATCHES = 100
+# the hot ranks of the zipf draw are scattered over the id space by a multiplicative hash,
+# so that the hot keys are not all in the first segment
+HOT_KEY_MULTIPLIER = 2654435761
+VISIBLE_TIMEOUT = 60
+
 
 def get_ids(length, size):
     ids_list = []
@@ -87,7 +114,7 @@ class GetRunner(BaseRunner):
         ids = case_param["ids"]
         start_time = time.time()
         self.milvus.get(ids)
-        get_time = round(time.time() - start_time, 2)
+        get_time = round(time.time() - start_time, 4)
         tmp_result = {"get_time": get_time}
         return tmp_result
 
@@ -120,3 +147,255 @@ class InsertGetRunner(GetRunner):
         logger.debug("Start load collection")
         self.milvus.load_collection(timeout=1200)
         logger.debug("Load collection end")
+
+
+def get_deleted_ids(collection_size, deleted_size):
+    """ the flushed ids deleted after the load, spread evenly over the id space and so over the segments """
+    if not deleted_size:
+        return np.array([], dtype=np.int64)
+    step = max(collection_size // deleted_size, 1)
+    return np.arange(0, step * deleted_size, step, dtype=np.int64)[:collection_size]
+
+
+def draw_ids(rng, distribution, batch_size, collection_size, recent_size=0, deleted_size=0, a=datagen.DEFAULT_ZIPF_A):
+    """
+    int64 array of batch_size ids, the collection holds the ids [0, collection_size + recent_size)
+        uniform: any of the flushed ids
+        zipf: a few hot ids requested most of the time
+        recent: the last recent_size ids, inserted after the collection is loaded
+        missing: ids never inserted
+        deleted: the deleted_size ids of get_deleted_ids, inserted then deleted after the load
+    """
+    if distribution == UNIFORM:
+        return rng.integers(0, collection_size, size=batch_size, dtype=np.int64)
+    elif distribution == ZIPF:
+        ranks = (rng.zipf(a, size=batch_size) - 1) % collection_size
+        return (ranks * HOT_KEY_MULTIPLIER) % collection_size
+    elif distribution == RECENT:
+        if not recent_size:
+            raise Exception("recent_size is required by the recent distribution")
+        return rng.integers(collection_size, collection_size + recent_size, size=batch_size, dtype=np.int64)
+    elif distribution == MISSING:
+        total = collection_size + recent_size
+        return rng.integers(total, 2 * total, size=batch_size, dtype=np.int64)
+    elif distribution == DELETED:
+        if not deleted_size:
+            raise Exception("deleted_size is required by the deleted distribution")
+        return rng.choice(get_deleted_ids(collection_size, deleted_size), size=batch_size)
+    raise Exception("Id distribution: %s not supported" % distribution)
+
+
+class PointLookupRunner(BaseRunner):
+    """
+    run point lookups by id with closed loop clients:
+        one case for each id distribution, batch size and concurrency,
+        the ids of the recent distribution are inserted after the load and not flushed,
+        the ids of the deleted distribution are deleted after the load, they are part of the flushed ids
+        so they lower the hit ratio of the other distributions by deleted_size / collection_size,
+        the hit ratio is the entities returned over the distinct ids requested
+    """
+    name = "point_lookup_performance"
+
+    def __init__(self, env, metric):
+        super(PointLookupRunner, self).__init__(env, metric)
+        self._clients = []
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        ni_per = collection["ni_per"]
+        distributions = collection["distributions"] if "distributions" in collection else [UNIFORM]
+        for distribution in distributions:
+            if distribution not in ID_DISTRIBUTIONS:
+                raise Exception("Id distribution: %s not supported" % distribution)
+        batch_sizes = collection["batch_sizes"]
+        concurrencies = collection["concurrencies"] if "concurrencies" in collection else [1]
+        recent_size = collection["recent_size"] if "recent_size" in collection else DEFAULT_RECENT_SIZE
+        deleted_size = collection["deleted_size"] if "deleted_size" in collection else DEFAULT_DELETED_SIZE
+        zipf_a = collection["zipf_a"] if "zipf_a" in collection else datagen.DEFAULT_ZIPF_A
+        batches = collection["batches"] if "batches" in collection else DEFAULT_BATCHES
+        during_time = common_utils.timestr_to_int(collection["during_time"]) if "during_time" in collection else DEFAULT_DURING_TIME
+        warmup_time = common_utils.timestr_to_int(collection["warmup_time"]) if "warmup_time" in collection else DEFAULT_WARMUP_TIME
+        if RECENT not in distributions:
+            recent_size = 0
+        if DELETED not in distributions:
+            deleted_size = 0
+        vector_type = utils.get_vector_type(data_type)
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size,
+            "ni_per": ni_per,
+            "recent_size": recent_size,
+            "deleted_size": deleted_size
+        }
+        self.init_metric(self.name, collection_info, None, None)
+        cases = list()
+        case_metrics = list()
+        for distribution in distributions:
+            for batch_size in batch_sizes:
+                for concurrency in concurrencies:
+                    case_metric = copy.deepcopy(self.metric)
+                    case_metric.set_case_metric_type()
+                    case_metric.run_params = {
+                        "distribution": distribution,
+                        "batch_size": batch_size,
+                        "concurrency": concurrency,
+                        "during_time": during_time
+                    }
+                    case = {
+                        "collection_name": collection_name,
+                        "data_type": data_type,
+                        "dimension": dimension,
+                        "collection_size": collection_size,
+                        "ni_per": ni_per,
+                        "vector_type": vector_type,
+                        "recent_size": recent_size,
+                        "deleted_size": deleted_size,
+                        "distribution": distribution,
+                        "zipf_a": zipf_a,
+                        "batch_size": batch_size,
+                        "batches": batches,
+                        "concurrency": concurrency,
+                        "during_time": during_time,
+                        "warmup_time": warmup_time
+                    }
+                    cases.append(case)
+                    case_metrics.append(case_metric)
+        return cases, case_metrics
+
+    def group_key(self, case):
+        return [case["collection_name"]]
+
+    def insert_recent(self, collection_name, vector_type, dimension, collection_size, recent_size, ni_per):
+        """ insert the ids [collection_size, collection_size + recent_size) without flush """
+        info = self.milvus.get_info(collection_name)
+        generator = datagen.get_generator()
+        for start_id in range(collection_size, collection_size + recent_size, ni_per):
+            nb = min(ni_per, collection_size + recent_size - start_id)
+            if vector_type == DataType.BINARY_VECTOR:
+                vectors = generator.binary_vectors(nb, dimension, part=start_id)
+            else:
+                vectors = generator.float_vectors(nb, dimension, part=start_id)
+            self.insert_core(self.milvus, info, start_id, vectors, columnar=True)
+        # wait until the last recent id can be got
+        last_id = collection_size + recent_size - 1
+        deadline = time.time() + VISIBLE_TIMEOUT
+        while not self.milvus.get([last_id]):
+            if time.time() > deadline:
+                raise Exception("Recent id: %d not visible in %ds" % (last_id, VISIBLE_TIMEOUT))
+            time.sleep(0.1)
+
+    def delete_sample(self, collection_size, deleted_size, ni_per):
+        """ delete the ids of get_deleted_ids from the loaded collection """
+        deleted_ids = get_deleted_ids(collection_size, deleted_size)
+        for start in range(0, len(deleted_ids), ni_per):
+            self.milvus.delete_expr(utils.ids_to_expr(deleted_ids[start:start + ni_per]))
+        # wait until the last deleted id can not be got
+        last_id = int(deleted_ids[-1])
+        deadline = time.time() + VISIBLE_TIMEOUT
+        while self.milvus.get([last_id]):
+            if time.time() > deadline:
+                raise Exception("Deleted id: %d still visible in %ds" % (last_id, VISIBLE_TIMEOUT))
+            time.sleep(0.1)
+
+    def prepare(self, **case_param):
+        collection_name = case_param["collection_name"]
+        dimension = case_param["dimension"]
+        self.milvus.set_collection(collection_name)
+        if self.milvus.exists_collection():
+            logger.debug("Start drop collection")
+            self.milvus.drop()
+            time.sleep(utils.DELETE_INTERVAL_TIME)
+        self.milvus.create_collection(dimension, data_type=case_param["vector_type"])
+        self.insert(self.milvus, collection_name, case_param["data_type"], dimension,
+                    case_param["collection_size"], case_param["ni_per"])
+        self.milvus.flush()
+        logger.debug({"collection count": self.milvus.count()})
+        self.milvus.load_collection(timeout=1200)
+        if case_param["recent_size"]:
+            self.insert_recent(collection_name, case_param["vector_type"], dimension, case_param["collection_size"],
+                               case_param["recent_size"], case_param["ni_per"])
+        if case_param["deleted_size"]:
+            self.delete_sample(case_param["collection_size"], case_param["deleted_size"], case_param["ni_per"])
+
+    def get_clients(self, collection_name, num):
+        """ each client borrows a pooled connection, reuse them across the cases """
+        while len(self._clients) < num:
+            self._clients.append(MilvusClient(collection_name=collection_name, host=self.hostname, port=self.port,
+                                              pool=get_pool(self.hostname, self.port)))
+        return self._clients[:num]
+
+    def run_case(self, case_metric, **case_param):
+        distribution = case_param["distribution"]
+        batch_size = case_param["batch_size"]
+        concurrency = case_param["concurrency"]
+        rng = np.random.default_rng(datagen.DEFAULT_SEED)
+        id_batches = [draw_ids(rng, distribution, batch_size, case_param["collection_size"],
+                               recent_size=case_param["recent_size"], deleted_size=case_param["deleted_size"],
+                               a=case_param["zipf_a"])
+                      for _ in range(case_param["batches"])]
+        unique_sizes = [len(np.unique(ids)) for ids in id_batches]
+        # the expressions are built before the timed loop, expr_time is the mean client side cost of one
+        start_time = time.perf_counter()
+        exprs = [utils.ids_to_expr(ids) for ids in id_batches]
+        expr_time = (time.perf_counter() - start_time) / len(exprs)
+        counter = itertools.count()
+        lock = threading.Lock()
+        hits = {"requested": 0, "returned": 0}
+
+        def get_func(client):
+            i = next(counter) % len(id_batches)
+            res = client.query_expr(exprs[i], log=False)
+            with lock:
+                hits["requested"] += unique_sizes[i]
+                hits["returned"] += len(res) if res else 0
+
+        clients = self.get_clients(case_param["collection_name"], concurrency)
+        logger.info("Start point lookup, distribution: %s, batch_size: %d, concurrency: %d" % (
+            distribution, batch_size, concurrency))
+        result, during_time = run_closed_loop(clients, get_func, case_param["during_time"],
+                                              case_param["warmup_time"])
+        requests = result.latency.count
+        tmp_result = {
+            "distribution": distribution,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+            "qps": round(requests / during_time, 2),
+            "ids_per_second": round(requests * batch_size / during_time, 2),
+            "requests": requests,
+            "failures": result.failures,
+            # the warmup requests are counted too, the ratio does not depend on the time
+            "hit_ratio": round(hits["returned"] / hits["requested"], 4) if hits["requested"] else None,
+            "expr_time": round(expr_time * 1000, 3),
+            "latency": result.latency.summary(),
+            "histogram": result.latency.export()
+        }
+        logger.info({k: v for k, v in tmp_result.items() if k != "histogram"})
+        return tmp_result
+
+    def summarize(self, case_metrics):
+        """ latency and throughput over the batch size and the concurrency for each distribution """
+        curves = dict()
+        for case_metric in case_metrics:
+            value = case_metric.metrics["value"]
+            if case_metric.status != "RUN_SUCC" or "qps" not in value:
+                continue
+            curves.setdefault(value["distribution"], []).append({
+                "batch_size": value["batch_size"],
+                "concurrency": value["concurrency"],
+                "qps": value["qps"],
+                "ids_per_second": value["ids_per_second"],
+                "hit_ratio": value["hit_ratio"],
+                "p50": value["latency"]["p50"],
+                "p99": value["latency"]["p99"]
+            })
+        result = []
+        for distribution, points in curves.items():
+            result.append({
+                "distribution": distribution,
+                "points": sorted(points, key=lambda x: (x["batch_size"], x["concurrency"]))
+            })
+        logger.info("Point lookup curves: %s" % json.dumps(result))
+        self.result.update({"curves": result})
@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import logging
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from milvus_benchmark import parser
+from milvus_benchmark.runners import utils
+
+logger = logging.getLogger("milvus_benchmark.runners.groundtruth")
+
+# distances of at most QUERY_BATCH x block rows are computed at a time
+QUERY_BATCH = 1000
+BINARY_METRICS = ["jaccard", "hamming"]
+RANGE_OPS = {
+    "GT": np.greater,
+    "GE": np.greater_equal,
+    "LT": np.less,
+    "LE": np.less_equal
+}
+
+
+def to_bits(vectors):
+    """ packed binary vectors (uint8 rows or bytes) to float32 rows of 0/1, so that the distances are matmuls """
+    if len(vectors) and isinstance(vectors[0], bytes):
+        vectors = np.frombuffer(b"".join(vectors), dtype=np.uint8).reshape(len(vectors), -1)
+    return np.unpackbits(np.asarray(vectors, dtype=np.uint8), axis=1).astype(np.float32)
+
+
+def pairwise_distances(queries, vectors, metric_type):
+    """
+    distances used to rank the vectors of each query, lower is nearer
+        l2: squared distance without the norm of the query, which is the same for all the vectors
+        ip: negative inner product
+        hamming/jaccard: computed from the common bits, the vectors are the 0/1 rows given by to_bits
+    """
+    products = queries @ vectors.T
+    if metric_type == "l2":
+        return np.einsum("ij,ij->i", vectors, vectors)[np.newaxis, :] - 2 * products
+    elif metric_type == "ip":
+        return -products
+    elif metric_type in BINARY_METRICS:
+        # exact in float32 as long as the dimension is less than 2^24
+        query_bits = queries.sum(axis=1)[:, np.newaxis]
+        vector_bits = vectors.sum(axis=1)[np.newaxis, :]
+        union = query_bits + vector_bits - products
+        if metric_type == "hamming":
+            return union - products
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distances = 1 - products / union
+        # two empty vectors are the same
+        distances[union == 0] = 0
+        return distances
+    raise Exception("metric_type: %s not supported" % metric_type)
+
+
+def merge_topk(best_distances, best_ids, distances, ids, top_k):
+    """
+    keep the top_k nearest of the former result and the new block,
+    the top_k of the block are selected first, so only their ids are gathered instead of a (nq, block) id matrix
+    """
+    if distances.shape[1] > top_k:
+        part = np.argpartition(distances, top_k - 1, axis=1)[:, :top_k]
+        distances = np.take_along_axis(distances, part, axis=1)
+        block_ids = ids[part]
+    else:
+        block_ids = np.broadcast_to(ids, distances.shape)
+    distances = np.hstack([best_distances, distances])
+    ids = np.hstack([best_ids, block_ids])
+    if distances.shape[1] > top_k:
+        part = np.argpartition(distances, top_k - 1, axis=1)[:, :top_k]
+        distances = np.take_along_axis(distances, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1)
+    return distances, ids
+
+
+def filter_mask(columns, filter_query):
+    """
+    evaluate the filter on the client
+    columns: {field_name: values}
+    filter_query: {"range": {field: {op: value}}} or {"term": {field: {"values": [...]}}}
+    """
+    mask = None
+    for field_name, ops in filter_query.get("range", {}).items():
+        for op, value in ops.items():
+            tmp = RANGE_OPS[op](columns[field_name], value)
+            mask = tmp if mask is None else mask & tmp
+    for field_name, term in filter_query.get("term", {}).items():
+        values = term["values"] if isinstance(term, dict) else term
+        tmp = np.isin(columns[field_name], values)
+        mask = tmp if mask is None else mask & tmp
+    return mask
+
+
+def brute_force_search(queries, blocks, top_k, metric_type, mask=None, threads=None):
+    """
+    Exact top_k search over the blocks
+    queries: (nq, dim) float array, packed uint8 rows or bytes for the binary metrics
+    blocks: iterable of (start_id, vectors), the id of vectors[i] is start_id + i
+    mask: optional bool array over all the ids, or func(ids) -> bool array, only the rows set are searched
+    threads: number of query slices searched concurrently, the cpu count by default
+    return the (nq, top_k) ids sorted by distance, padded with -1 if there are less than top_k rows
+    """
+    if metric_type in BINARY_METRICS:
+        queries = to_bits(queries)
+    else:
+        queries = np.asarray(queries, dtype=np.float32)
+    nq = len(queries)
+    threads = threads or os.cpu_count() or 1
+    batch = min(QUERY_BATCH, max(1, -(-nq // threads)))
+    slices = [slice(i, i + batch) for i in range(0, nq, batch)]
+    best_distances = np.full((nq, top_k), np.inf, dtype=np.float32)
+    best_ids = np.full((nq, top_k), -1, dtype=np.int64)
+
+    def search_slice(s, vectors, ids):
+        # each slice owns its rows of the result, BLAS and the partial sort release the GIL
+        distances = pairwise_distances(queries[s], vectors, metric_type)
+        best_distances[s], best_ids[s] = merge_topk(best_distances[s], best_ids[s], distances, ids, top_k)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for start_id, vectors in blocks:
+            ids = np.arange(start_id, start_id + len(vectors), dtype=np.int64)
+            if mask is not None:
+                selected = mask(ids) if callable(mask) else mask[start_id:start_id + len(vectors)]
+                vectors = vectors[selected]
+                ids = ids[selected]
+            if not len(ids):
+                continue
+            if metric_type in BINARY_METRICS:
+                vectors = to_bits(vectors)
+            else:
+                vectors = np.asarray(vectors, dtype=np.float32)
+            list(executor.map(lambda s: search_slice(s, vectors, ids), slices))
+    order = np.argsort(best_distances, axis=1, kind="stable")
+    return np.take_along_axis(best_ids, order, axis=1)
+
+
+def write_ivecs(file_name, ids):
+    """ each row is the top_k followed by the int32 ids, the format read by utils.get_ground_truth_ids """
+    ids = np.asarray(ids, dtype=np.int32)
+    rows = np.empty((ids.shape[0], ids.shape[1] + 1), dtype=np.int32)
+    rows[:, 0] = ids.shape[1]
+    rows[:, 1:] = ids
+    tmp_file_name = "%s.%d.tmp" % (file_name, os.getpid())
+    rows.tofile(tmp_file_name)
+    os.replace(tmp_file_name, file_name)
+
+
+def update_manifest(entry, groundtruth_dir=utils.GROUNDTRUTH_DIR):
+    """ add the entry to the manifest, the former entry of the same key is replaced """
+    file_name = os.path.join(groundtruth_dir, utils.GROUNDTRUTH_MANIFEST)
+    manifest = utils.load_ground_truth_manifest(groundtruth_dir, cache=False)
+    manifest[entry["key"]] = entry
+    tmp_file_name = "%s.%d.tmp" % (file_name, os.getpid())
+    with open(tmp_file_name, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_file_name, file_name)
+
+
+def iter_source_blocks(data_type, dimension, metric_type, collection_size, block_size):
+    """ the vectors in the order of the insert, the binary rows are packed the same as generate_columnar_values """
+    for start_id, vectors in utils.iter_insert_batches(data_type, dimension, collection_size, block_size,
+                                                       columnar=True):
+        if metric_type in BINARY_METRICS and vectors.shape[1] != dimension // 8:
+            vectors = np.packbits(np.asarray(vectors, dtype=np.uint8), axis=-1)
+        yield start_id, vectors
+
+
+def get_filter_fields(filter_query):
+    fields = list()
+    for item in filter_query.values():
+        fields.extend(item.keys())
+    return fields
+
+
+def build_ground_truth(collection_name, nq, top_k, filter_query=None, ni_per=None, threads=None,
+                       groundtruth_dir=utils.GROUNDTRUTH_DIR):
+    """
+    Compute the exact top_k of the first nq query vectors over the source files of the collection,
+    the scalar fields are the ids as inserted by generate_values, so the filter is evaluated on the ids,
+    ni_per: the batch size of the insert, the vectors are read in the same batches so that they are given the
+    same ids as inserted, e.g. the rows left at the end of each file when ni_per does not divide it are skipped
+    write the ivecs file and add it to the manifest
+    """
+    (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+    # one source file at a time by default
+    block_size = ni_per or utils.get_len_vectors_per_file(data_type, dimension)
+    queries = np.asarray(utils.get_vectors_from_binary(nq, dimension, data_type))
+    if metric_type in BINARY_METRICS and queries.shape[1] != dimension // 8:
+        queries = np.packbits(queries.astype(np.uint8), axis=-1)
+    mask = None
+    if filter_query:
+        mask = lambda ids: filter_mask({field: ids for field in get_filter_fields(filter_query)}, filter_query)
+    key = utils.ground_truth_key(data_type, collection_size, dimension, metric_type, filter_query)
+    logger.info("Build ground truth of %s, nq: %d, top_k: %d, filter: %s" % (
+        collection_name, nq, top_k, json.dumps(filter_query)))
+    start_time = time.time()
+    true_ids = brute_force_search(queries, iter_source_blocks(data_type, dimension, metric_type, collection_size, block_size),
+                                  top_k, metric_type, mask=mask, threads=threads)
+    build_time = round(time.time() - start_time, 2)
+    if not os.path.exists(groundtruth_dir):
+        os.makedirs(groundtruth_dir)
+    file_name = "%s_%s.ivecs" % (collection_name, key[:8])
+    write_ivecs(os.path.join(groundtruth_dir, file_name), true_ids)
+    entry = {
+        "key": key,
+        "collection_name": collection_name,
+        "filter": filter_query,
+        "nq": nq,
+        "top_k": top_k,
+        "ni_per": block_size,
+        "file": file_name,
+        "build_time": build_time
+    }
+    update_manifest(entry, groundtruth_dir)
+    logger.info("Ground truth saved: %s, build time: %ss" % (file_name, build_time))
+    return entry
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="build the exact ground truth of a collection from the source files")
+    arg_parser.add_argument(
+        "--collection-name",
+        required=True,
+        help="collection name, e.g. sift_10m_128_l2")
+    arg_parser.add_argument(
+        "--nq",
+        type=int,
+        default=utils.MAX_NQ,
+        help="number of query vectors")
+    arg_parser.add_argument(
+        "--top-k",
+        type=int,
+        default=1000,
+        help="number of the nearest ids of each query")
+    arg_parser.add_argument(
+        "--filter",
+        action="append",
+        default=[],
+        help="json filter, e.g. '{\"range\": {\"float\": {\"GT\": -1.0, \"LT\": 1000000}}}', can be repeated")
+    arg_parser.add_argument(
+        "--ni-per",
+        type=int,
+        default=None,
+        help="ni_per of the suite inserting the collection, the vectors of a source file by default")
+    arg_parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="number of threads, the cpu count by default")
+    arg_parser.add_argument(
+        "--output-dir",
+        default=utils.GROUNDTRUTH_DIR,
+        help="directory of the ivecs files and the manifest")
+    args = arg_parser.parse_args()
+    filters = [json.loads(item) for item in args.filter] or [None]
+    for filter_query in filters:
+        build_ground_truth(args.collection_name, args.nq, args.top_k, filter_query=filter_query,
+                           ni_per=args.ni_per, threads=args.threads, groundtruth_dir=args.output_dir)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,119 @@
+import math
+import logging
+
+logger = logging.getLogger("milvus_benchmark.runners.histogram")
+
+# 2^11 sub buckets per power of two, the relative error of the recorded value is less than 0.05%
+DEFAULT_SIGNIFICANT_BITS = 11
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9]
+
+
+class LatencyHistogram(object):
+    """
+    HDR-style histogram of request latency
+    values are recorded as integer microseconds into log-linear buckets:
+    the bucket width doubles with every power of two above 2^significant_bits,
+    so the memory is bounded whatever the number of requests is
+    """
+
+    def __init__(self, significant_bits=DEFAULT_SIGNIFICANT_BITS):
+        self._significant_bits = significant_bits
+        self._counts = dict()
+        self._count = 0
+        self._total = 0
+        self._min = None
+        self._max = None
+
+    def _bucket(self, value):
+        shift = max(0, value.bit_length() - self._significant_bits)
+        return (value >> shift) << shift, (1 << shift)
+
+    def record(self, seconds, count=1):
+        """ record a latency given in seconds """
+        self.record_us(int(round(seconds * 1000000)), count=count)
+
+    def record_us(self, value, count=1):
+        value = max(0, int(value))
+        key, _ = self._bucket(value)
+        self._counts[key] = self._counts.get(key, 0) + count
+        self._count += count
+        self._total += value * count
+        if self._min is None or value < self._min:
+            self._min = value
+        if self._max is None or value > self._max:
+            self._max = value
+
+    def merge(self, other):
+        for key, count in other._counts.items():
+            self._counts[key] = self._counts.get(key, 0) + count
+        self._count += other._count
+        self._total += other._total
+        if other._min is not None and (self._min is None or other._min < self._min):
+            self._min = other._min
+        if other._max is not None and (self._max is None or other._max > self._max):
+            self._max = other._max
+
+    def reset(self):
+        self._counts.clear()
+        self._count = 0
+        self._total = 0
+        self._min = None
+        self._max = None
+
+    @property
+    def count(self):
+        return self._count
+
+    def mean_us(self):
+        return self._total / self._count if self._count else 0.0
+
+    def percentile_us(self, percentile):
+        """ return the highest value equivalent to the bucket of the given percentile """
+        if not self._count:
+            return 0
+        rank = max(1, int(math.ceil(percentile / 100.0 * self._count)))
+        cumulative = 0
+        for key in sorted(self._counts.keys()):
+            cumulative += self._counts[key]
+            if cumulative >= rank:
+                _, width = self._bucket(key)
+                return min(key + width - 1, self._max)
+        return self._max
+
+    def summary(self, percentiles=None):
+        """ latency distribution in milliseconds, rounded to the microsecond """
+        if percentiles is None:
+            percentiles = DEFAULT_PERCENTILES
+        result = {
+            "count": self._count,
+            "min": round((self._min or 0) / 1000.0, 3),
+            "max": round((self._max or 0) / 1000.0, 3),
+            "mean": round(self.mean_us() / 1000.0, 3),
+        }
+        for percentile in percentiles:
+            # e.g. p50, p99, p999
+            key = "p" + ("%g" % percentile).replace(".", "")
+            result[key] = round(self.percentile_us(percentile) / 1000.0, 3)
+        return result
+
+    def export(self):
+        """ raw histogram, saved alongside the metric """
+        return {
+            "unit": "us",
+            "significant_bits": self._significant_bits,
+            "count": self._count,
+            "min": self._min,
+            "max": self._max,
+            "counts": [[key, self._counts[key]] for key in sorted(self._counts.keys())]
+        }
+
+    @classmethod
+    def load(cls, data):
+        histogram = cls(significant_bits=data["significant_bits"])
+        for key, count in data["counts"]:
+            histogram._counts[key] = count
+            histogram._count += count
+            histogram._total += key * count
+        histogram._min = data["min"]
+        histogram._max = data["max"]
+        return histogram
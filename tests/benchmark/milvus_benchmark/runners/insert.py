@@ -46,7 +46,16 @@ class InsertRunner(BaseRunner):
         flush = True
         if "flush" in collection and collection["flush"] == "no":
             flush = False
-        self.init_metric(self.name, collection_info, index_info, None)
+        columnar = collection["columnar"] if "columnar" in collection else False
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else 1
+        prefetch_files = collection["prefetch_files"] if "prefetch_files" in collection else 0
+        count_interval = collection["count_interval"] if "count_interval" in collection else 0
+        run_params = {
+            "columnar": columnar,
+            "insert_concurrency": insert_concurrency,
+            "prefetch_files": prefetch_files
+        }
+        self.init_metric(self.name, collection_info, index_info, None, run_params)
         case_metric = copy.deepcopy(self.metric)
         # set metric type as case
         case_metric.set_case_metric_type()
@@ -64,6 +73,10 @@ class InsertRunner(BaseRunner):
             "other_fields": other_fields,
             "build_index": build_index,
             "flush_after_insert": flush,
+            "columnar": columnar,
+            "insert_concurrency": insert_concurrency,
+            "prefetch_files": prefetch_files,
+            "count_interval": count_interval,
             "index_field_name": index_field_name,
             "index_type": index_type,
             "index_param": index_param,
@@ -109,7 +122,11 @@ class InsertRunner(BaseRunner):
         index_field_name = case_param["index_field_name"]
         build_index = case_param["build_index"]
 
-        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"])
+        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"],
+                                 case_param["ni_per"], columnar=case_param["columnar"],
+                                 insert_concurrency=case_param["insert_concurrency"],
+                                 prefetch_files=case_param["prefetch_files"],
+                                 count_interval=case_param["count_interval"])
         flush_time = 0.0
         build_time = 0.0
         if case_param["flush_after_insert"] is True:
@@ -155,6 +172,15 @@ class BPInsertRunner(BaseRunner):
         flush = True
         if "flush" in collection and collection["flush"] == "no":
             flush = False
+        columnar = collection["columnar"] if "columnar" in collection else False
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else 1
+        prefetch_files = collection["prefetch_files"] if "prefetch_files" in collection else 0
+        count_interval = collection["count_interval"] if "count_interval" in collection else 0
+        run_params = {
+            "columnar": columnar,
+            "insert_concurrency": insert_concurrency,
+            "prefetch_files": prefetch_files
+        }
         case_metrics = list()
         case_params = list()
         
@@ -167,7 +193,7 @@ class BPInsertRunner(BaseRunner):
                 "other_fields": other_fields,
                 "ni_per": ni_per
             }
-            self.init_metric(self.name, collection_info, index_info, None)
+            self.init_metric(self.name, collection_info, index_info, None, run_params)
             case_metric = copy.deepcopy(self.metric)
             case_metric.set_case_metric_type()
             case_metrics.append(case_metric)
@@ -182,6 +208,10 @@ class BPInsertRunner(BaseRunner):
                 "other_fields": other_fields,
                 "build_index": build_index,
                 "flush_after_insert": flush,
+                "columnar": columnar,
+                "insert_concurrency": insert_concurrency,
+                "prefetch_files": prefetch_files,
+                "count_interval": count_interval,
                 "index_field_name": index_field_name,
                 "index_type": index_type,
                 "index_param": index_param,
@@ -227,7 +257,11 @@ class BPInsertRunner(BaseRunner):
         index_field_name = case_param["index_field_name"]
         build_index = case_param["build_index"]
         # TODO:
-        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"])
+        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"],
+                                 case_param["ni_per"], columnar=case_param["columnar"],
+                                 insert_concurrency=case_param["insert_concurrency"],
+                                 prefetch_files=case_param["prefetch_files"],
+                                 count_interval=case_param["count_interval"])
         flush_time = 0.0
         build_time = 0.0
         if case_param["flush_after_insert"] is True:
@@ -0,0 +1,134 @@
+import time
+import queue
+import logging
+import threading
+import traceback
+import numpy as np
+
+logger = logging.getLogger("milvus_benchmark.runners.insert_engine")
+
+QUEUE_POLL_INTERVAL = 1
+
+
+class ParallelInsertEngine(object):
+    """
+    Pipelined insert:
+        reader: iterates the batches and prefetches the next files into a bounded queue
+        workers: N threads, each one holds its own connection and sends the batches
+    """
+
+    def __init__(self, insert_core, client_factory, info, concurrency=1, prefetch_files=1, batches_per_file=1,
+                 count_interval=0, columnar=False):
+        """
+        insert_core: func(milvus, info, start_id, vectors, columnar=False) -> (serialize_time, insert_time)
+        client_factory: func() -> MilvusClient, called once per worker
+        count_interval: check the row count every count_interval batches of each worker, 0 means disabled
+        """
+        self._insert_core = insert_core
+        self._client_factory = client_factory
+        self._info = info
+        self._concurrency = max(1, concurrency)
+        self._count_interval = count_interval
+        self._columnar = columnar
+        # the queue holds at most prefetch_files files besides the ones being sent
+        self._queue = queue.Queue(maxsize=max(1, prefetch_files * batches_per_file))
+        self._stop_event = threading.Event()
+        self._errors = []
+        self._workers_result = [None] * self._concurrency
+        self._read_time = 0.0
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self, batches):
+        try:
+            for start_id, vectors in batches:
+                start_time = time.time()
+                if isinstance(vectors, np.ndarray):
+                    # page in the mmap slice in the reader thread instead of the sender
+                    vectors = np.ascontiguousarray(vectors)
+                self._read_time += time.time() - start_time
+                if not self._put((start_id, vectors)):
+                    return
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            self._errors.append(e)
+            self._stop_event.set()
+        finally:
+            for _ in range(self._concurrency):
+                if not self._put(None):
+                    break
+
+    def _work(self, index):
+        rows = 0
+        batches = 0
+        serialize_time = 0.0
+        insert_time = 0.0
+        try:
+            milvus = self._client_factory()
+            while not self._stop_event.is_set():
+                try:
+                    item = self._queue.get(timeout=QUEUE_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+                start_id, vectors = item
+                s_time, ni_time = self._insert_core(milvus, self._info, start_id, vectors, columnar=self._columnar)
+                rows += len(vectors)
+                batches += 1
+                serialize_time += s_time
+                insert_time += ni_time
+                if self._count_interval and batches % self._count_interval == 0:
+                    logger.debug("Worker %d, row count: %d" % (index, milvus.count()))
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            self._errors.append(e)
+            self._stop_event.set()
+        self._workers_result[index] = {
+            "worker": index,
+            "rows": rows,
+            "batches": batches,
+            "serialize_time": round(serialize_time, 2),
+            "insert_time": round(insert_time, 2),
+            "rps": round(rows / insert_time, 2) if insert_time else 0.0
+        }
+
+    def run(self, batches):
+        """
+        Insert all the batches, return the aggregated result and the result of each worker
+        """
+        start_time = time.time()
+        reader = threading.Thread(target=self._read, args=(batches,), name="insert-reader")
+        workers = [threading.Thread(target=self._work, args=(i,), name="insert-worker-%d" % i)
+                   for i in range(self._concurrency)]
+        reader.start()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self._stop_event.set()
+        reader.join()
+        total_time = time.time() - start_time
+        if self._errors:
+            raise self._errors[0]
+        rows = sum([r["rows"] for r in self._workers_result])
+        batches = sum([r["batches"] for r in self._workers_result])
+        insert_time = sum([r["insert_time"] for r in self._workers_result])
+        result = {
+            "total_time": round(total_time, 2),
+            # requests are sent concurrently, so the aggregate rps is based on the wall time
+            "rps": round(rows / total_time, 2),
+            "ni_time": round(insert_time / batches, 2) if batches else 0.0,
+            "serialize_time": round(sum([r["serialize_time"] for r in self._workers_result]), 2),
+            "read_time": round(self._read_time, 2),
+            "insert_concurrency": self._concurrency,
+            "workers": self._workers_result
+        }
+        return result
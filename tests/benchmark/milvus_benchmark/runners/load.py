@@ -0,0 +1,213 @@
+import time
+import copy
+import json
+import logging
+import numpy as np
+from milvus_benchmark import parser
+from milvus_benchmark import utils as common_utils
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.load")
+
+LOAD_COLLECTION = "collection"
+LOAD_PARTITIONS = "partitions"
+DEFAULT_PARTITION_NAME = "_default"
+DEFAULT_RUN_COUNT = 3
+DEFAULT_STEADY_TIME = 60
+# the rolling median over STEADY_WINDOW requests is steady within STEADY_TOLERANCE of the baseline,
+# the baseline is the median of the last part of the run
+DEFAULT_STEADY_WINDOW = 20
+DEFAULT_STEADY_TOLERANCE = 0.1
+BASELINE_RATIO = 0.25
+RELEASE_INTERVAL_TIME = 5
+
+
+def time_to_steady(times, latencies, window=DEFAULT_STEADY_WINDOW, tolerance=DEFAULT_STEADY_TOLERANCE):
+    """
+    times: seconds from the load finished to the start of each request, latencies: seconds
+    return (time to steady, requests to steady, baseline latency),
+    the steady state starts at the first window from which all the rolling medians are within the tolerance,
+    (None, None, baseline) if the latency is not steady at the end of the run
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    size = len(latencies)
+    if size < 2 * window:
+        return None, None, None
+    baseline = float(np.median(latencies[-max(window, int(size * BASELINE_RATIO)):]))
+    # medians[i] is the median of latencies[i:i + window]
+    medians = np.array([np.median(latencies[i:i + window]) for i in range(size - window + 1)])
+    unsteady = np.nonzero(medians > baseline * (1 + tolerance))[0]
+    start = 0 if not len(unsteady) else unsteady[-1] + 1
+    if start >= len(medians):
+        return None, None, baseline
+    return float(times[start]), int(start), baseline
+
+
+class LoadRunner(BaseRunner):
+    """
+    run release and load of an existing collection:
+        load_time: wall time of load_collection or load_partitions,
+        first_query: latency of the first search after the load, the caches are cold,
+        time_to_steady: the searches are sent one by one for steady_time after the load,
+        the time until the latency settles to the latency at the end of the run
+    """
+    name = "load_performance"
+
+    def __init__(self, env, metric):
+        super(LoadRunner, self).__init__(env, metric)
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        load_types = collection["load_types"] if "load_types" in collection else [LOAD_COLLECTION]
+        for load_type in load_types:
+            if load_type not in [LOAD_COLLECTION, LOAD_PARTITIONS]:
+                raise Exception("Load type: %s not supported" % load_type)
+        partition_names = collection["partition_names"] if "partition_names" in collection else [DEFAULT_PARTITION_NAME]
+        run_count = collection["run_count"] if "run_count" in collection else DEFAULT_RUN_COUNT
+        steady_time = common_utils.timestr_to_int(collection["steady_time"]) if "steady_time" in collection else DEFAULT_STEADY_TIME
+        steady_window = collection["steady_window"] if "steady_window" in collection else DEFAULT_STEADY_WINDOW
+        steady_tolerance = collection["steady_tolerance"] if "steady_tolerance" in collection else DEFAULT_STEADY_TOLERANCE
+        top_k = collection["top_k"]
+        nq = collection["nq"]
+        search_param = collection["search_param"]
+        vector_type = utils.get_vector_type(data_type)
+        index_field_name = utils.get_default_field_name(vector_type)
+        search_info = {
+            "topk": top_k,
+            "query": utils.get_vectors_from_binary(nq, dimension, data_type),
+            "metric_type": utils.metric_type_trans(metric_type),
+            "params": search_param}
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size
+        }
+        self.init_metric(self.name, collection_info, None, None)
+        cases = list()
+        case_metrics = list()
+        for load_type in load_types:
+            for i in range(run_count):
+                case_metric = copy.deepcopy(self.metric)
+                case_metric.set_case_metric_type()
+                case_metric.search = {
+                    "nq": nq,
+                    "topk": top_k,
+                    "search_param": search_param
+                }
+                case_metric.run_params = {
+                    "load_type": load_type,
+                    "partition_names": partition_names if load_type == LOAD_PARTITIONS else None,
+                    "run": i,
+                    "steady_time": steady_time
+                }
+                case = {
+                    "collection_name": collection_name,
+                    "collection_size": collection_size,
+                    "index_field_name": index_field_name,
+                    "load_type": load_type,
+                    "partition_names": partition_names,
+                    "run": i,
+                    "steady_time": steady_time,
+                    "steady_window": steady_window,
+                    "steady_tolerance": steady_tolerance,
+                    "vector_query": {"vector": {index_field_name: search_info}}
+                }
+                cases.append(case)
+                case_metrics.append(case_metric)
+        return cases, case_metrics
+
+    def group_key(self, case):
+        return [case["collection_name"]]
+
+    def prepare(self, **case_param):
+        collection_name = case_param["collection_name"]
+        self.milvus.set_collection(collection_name)
+        if not self.milvus.exists_collection():
+            raise Exception("collection name: {} not existed".format(collection_name))
+        logger.info(self.milvus.describe_index(case_param["index_field_name"]))
+
+    def release(self):
+        try:
+            self.milvus.release_collection()
+        except Exception as e:
+            # not loaded
+            logger.debug(str(e))
+        # the query nodes drop the segments asynchronously
+        time.sleep(RELEASE_INTERVAL_TIME)
+
+    def run_case(self, case_metric, **case_param):
+        load_type = case_param["load_type"]
+        vector_query = case_param["vector_query"]
+        self.release()
+        segments = self.milvus.get_segment_infos()
+        rows = sum([item["num_rows"] for item in segments])
+        logger.info("Start load %s, segments: %d, rows: %d" % (load_type, len(segments), rows))
+        start_time = time.perf_counter()
+        if load_type == LOAD_COLLECTION:
+            self.milvus.load_collection(timeout=3600)
+        else:
+            self.milvus.load_partitions(case_param["partition_names"], timeout=3600)
+        load_end_time = time.perf_counter()
+        load_time = load_end_time - start_time
+        # sent one by one, the first one is the cold query
+        times = []
+        latencies = []
+        histogram = LatencyHistogram()
+        deadline = load_end_time + case_param["steady_time"]
+        while True:
+            request_start = time.perf_counter()
+            if request_start >= deadline and latencies:
+                break
+            self.milvus.query(vector_query, log=False)
+            latency = time.perf_counter() - request_start
+            times.append(request_start - load_end_time)
+            latencies.append(latency)
+            histogram.record(latency)
+        steady_time, steady_requests, baseline = time_to_steady(times, latencies, window=case_param["steady_window"],
+                                                                tolerance=case_param["steady_tolerance"])
+        tmp_result = {
+            "load_type": load_type,
+            "load_time": round(load_time, 3),
+            "segments": len(segments),
+            "rows": rows,
+            "load_rows_per_second": round(rows / max(load_time, 1e-6), 2),
+            "first_query_time": round(latencies[0] * 1000, 3),
+            "steady_latency": round(baseline * 1000, 3) if baseline is not None else None,
+            "time_to_steady": round(steady_time, 3) if steady_time is not None else None,
+            "queries_to_steady": steady_requests,
+            "requests": len(latencies),
+            "latency": histogram.summary()
+        }
+        logger.info(tmp_result)
+        return tmp_result
+
+    def summarize(self, case_metrics):
+        """ min/mean/max of the runs for each load type, the cold start numbers vary between the runs """
+        runs = dict()
+        for case_metric in case_metrics:
+            value = case_metric.metrics["value"]
+            if case_metric.status != "RUN_SUCC" or "load_time" not in value:
+                continue
+            runs.setdefault(value["load_type"], []).append(value)
+        result = []
+        for load_type, values in runs.items():
+            item = {
+                "load_type": load_type,
+                "runs": len(values),
+                "segments": values[-1]["segments"],
+                "rows": values[-1]["rows"]
+            }
+            for key in ["load_time", "first_query_time", "steady_latency", "time_to_steady"]:
+                points = [v[key] for v in values if v[key] is not None]
+                item[key] = {
+                    "min": min(points),
+                    "mean": round(sum(points) / len(points), 3),
+                    "max": max(points)
+                } if points else None
+            result.append(item)
+        logger.info("Load summary: %s" % json.dumps(result))
+        self.result.update({"load": result})
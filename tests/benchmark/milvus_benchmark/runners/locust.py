@@ -3,6 +3,7 @@ import time
 import copy
 import logging
 from . import locust_user
+from .locust_stats import detect_growth
 from .base import BaseRunner
 from milvus_benchmark import parser
 from milvus_benchmark import utils
@@ -44,8 +45,23 @@ class LocustRunner(BaseRunner):
         logger.info(run_params)
         locust_stats = locust_user.locust_executor(self.hostname, self.port, collection_name,
                                                    connection_type=connection_type, run_params=run_params)
+        logger.info({k: v for k, v in locust_stats.items() if k != "time_series"})
         return locust_stats
 
+    def summarize(self, case_metrics):
+        """ check the memory sampled during the cases for steady growth """
+        memory_trends = []
+        for case_metric in case_metrics:
+            series = case_metric.resources.get("series", {}) if case_metric.resources else {}
+            trends = dict()
+            for key in ["server_rss", "client_rss"]:
+                if key in series:
+                    trends[key] = detect_growth(series["time"], series[key])
+                    if trends[key] and trends[key]["growing"]:
+                        logger.warning("%s keeps growing over the run: %s" % (key, trends[key]))
+            memory_trends.append(trends)
+        self.result.update({"memory_trends": memory_trends})
+
 
 class LocustInsertRunner(LocustRunner):
     """run insert"""
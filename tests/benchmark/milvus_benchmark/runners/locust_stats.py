@@ -0,0 +1,248 @@
+import math
+import time
+import logging
+import numpy as np
+
+from .histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.locust_stats")
+
+TOTAL = "total"
+# at most MAX_POINTS intervals are kept for each task whatever the during time is
+MAX_POINTS = 360
+MIN_INTERVAL = 1
+# the first and the last part of the run compared for the degradation
+COMPARE_RATIO = 0.25
+DEFAULT_DEGRADATION_THRESHOLD = 0.1
+# the growth is regarded as a trend only when the values fit the line well
+MIN_CORRELATION = 0.8
+MIN_TREND_POINTS = 8
+
+
+def get_interval(during_time, max_points=MAX_POINTS):
+    return max(MIN_INTERVAL, int(math.ceil(during_time / float(max_points))))
+
+
+class IntervalStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.latency = LatencyHistogram()
+
+
+class TimeSeriesStats(object):
+    """
+    Requests of every task recorded into fixed intervals from the start of the run,
+    fed by the request events fired by MilvusTask.
+    The intervals are aligned to the wall clock, so that the stats of the worker processes can be merged
+    """
+
+    def __init__(self, interval=MIN_INTERVAL):
+        self._interval = interval
+        self._start_time = None
+        self._end_time = None
+        self._base = 0
+        # {name: {interval index: IntervalStats}}
+        self._series = dict()
+        self._users = dict()
+
+    def start(self, start_time=None):
+        self._start_time = start_time or time.time()
+        self._base = int(self._start_time // self._interval)
+
+    def stop(self):
+        self._end_time = time.time()
+
+    def _index(self, now=None):
+        return int((now or time.time()) // self._interval) - self._base
+
+    def _get(self, name, index):
+        return self._series.setdefault(name, dict()).setdefault(index, IntervalStats())
+
+    def record(self, name, response_time, failed=False):
+        """ response_time in milliseconds, as fired by the locust events """
+        if self._start_time is None:
+            self.start()
+        index = self._index()
+        for key in [name, TOTAL]:
+            item = self._get(key, index)
+            item.requests += 1
+            if failed:
+                item.failures += 1
+            else:
+                item.latency.record_us(response_time * 1000)
+
+    def record_users(self, users):
+        if self._start_time is not None:
+            self._users[self._index()] = users
+
+    def on_success(self, request_type, name, response_time, response_length, **kwargs):
+        self.record(name, response_time)
+
+    def on_failure(self, request_type, name, response_time, exception, response_length=0, **kwargs):
+        self.record(name, response_time, failed=True)
+
+    def listen(self, events):
+        events.request_success.add_listener(self.on_success)
+        events.request_failure.add_listener(self.on_failure)
+
+    def remove(self, events):
+        events.request_success.remove_listener(self.on_success)
+        events.request_failure.remove_listener(self.on_failure)
+
+    def dump(self):
+        """ the raw intervals with the absolute index, sent from the worker process to the master """
+        return {
+            "interval": self._interval,
+            "series": {name: [[index + self._base, item.requests, item.failures, item.latency.export()]
+                              for index, item in series.items()] for name, series in self._series.items()}
+        }
+
+    def merge(self, data):
+        if data["interval"] != self._interval:
+            raise Exception("Interval: %s not equal to %s" % (data["interval"], self._interval))
+        for name, items in data["series"].items():
+            for index, requests, failures, histogram in items:
+                # requests sent before the start of the master are counted into the first interval
+                item = self._get(name, max(0, index - self._base))
+                item.requests += requests
+                item.failures += failures
+                item.latency.merge(LatencyHistogram.load(histogram))
+
+    @property
+    def run_time(self):
+        if self._start_time is None:
+            return 0
+        return (self._end_time or time.time()) - self._start_time
+
+    def export(self):
+        """ {"interval": seconds, "time": [...], "users": [...], "tasks": {name: {"rps": [...], ...}}} """
+        if self._start_time is None:
+            return {"interval": self._interval, "time": [], "tasks": dict()}
+        end_time = self._end_time or time.time()
+        points = self._index(end_time) + 1
+        if self._series:
+            points = max(points, max([max(item.keys()) for item in self._series.values()]) + 1)
+        # seconds from the start of the run
+        result = {
+            "interval": self._interval,
+            "time": [round(max(0, (self._base + i) * self._interval - self._start_time), 3) for i in range(points)],
+            "tasks": dict()
+        }
+        if self._users:
+            result["users"] = [self._users.get(i) for i in range(points)]
+        for name, series in self._series.items():
+            task = {"rps": [], "fail_ratio": [], "p50": [], "p99": [], "mean": []}
+            for i in range(points):
+                item = series.get(i)
+                # the first and the last intervals are partial
+                length = min(end_time, (self._base + i + 1) * self._interval) - \
+                    max(self._start_time, (self._base + i) * self._interval)
+                if item is None:
+                    task["rps"].append(0.0)
+                    task["fail_ratio"].append(None)
+                    for key in ["p50", "p99", "mean"]:
+                        task[key].append(None)
+                    continue
+                latency = item.latency.summary(percentiles=[50, 99])
+                task["rps"].append(round(item.requests / max(length, 1e-6), 2))
+                task["fail_ratio"].append(round(item.failures / float(item.requests), 4))
+                task["p50"].append(latency["p50"] if latency["count"] else None)
+                task["p99"].append(latency["p99"] if latency["count"] else None)
+                task["mean"].append(latency["mean"] if latency["count"] else None)
+            result["tasks"][name] = task
+        return result
+
+    def summary(self):
+        """ run average of each task, the rps is the number of requests over the run time """
+        result = dict()
+        run_time = max(self.run_time, 1e-6)
+        for name, series in self._series.items():
+            latency = LatencyHistogram()
+            requests = 0
+            failures = 0
+            for item in series.values():
+                latency.merge(item.latency)
+                requests += item.requests
+                failures += item.failures
+            result[name] = {
+                "requests": requests,
+                "failures": failures,
+                "rps": round(requests / run_time, 2),
+                "fail_ratio": round(failures / float(requests), 4) if requests else 0.0,
+                "latency": latency.summary()
+            }
+        return result
+
+
+def linear_trend(times, values):
+    """
+    least squares line of the values over the times, None values skipped
+    return (relative growth over the run, correlation) or None if there are too few points
+    """
+    points = [(t, v) for t, v in zip(times, values) if v is not None]
+    if len(points) < MIN_TREND_POINTS:
+        return None
+    x = np.array([p[0] for p in points], dtype=np.float64)
+    y = np.array([p[1] for p in points], dtype=np.float64)
+    mean = y.mean()
+    if mean == 0 or x.std() == 0:
+        return None
+    slope, _ = np.polyfit(x, y, 1)
+    correlation = 0.0 if y.std() == 0 else float(np.corrcoef(x, y)[0, 1])
+    return float(slope * (x[-1] - x[0]) / abs(mean)), correlation
+
+
+def compare_parts(values, ratio=COMPARE_RATIO):
+    """ the mean of the last part relative to the first part, the first interval is skipped as the ramp up """
+    values = [v for v in values[1:] if v is not None]
+    size = int(len(values) * ratio)
+    if size < 1:
+        return None
+    first = sum(values[:size]) / size
+    last = sum(values[-size:]) / size
+    if not first:
+        return None
+    return last / first - 1
+
+
+def detect_trends(time_series, threshold=DEFAULT_DEGRADATION_THRESHOLD):
+    """
+    For each task:
+        rps_change/latency_change: the last quarter compared with the first quarter
+        degraded: the rps dropped or the p99 grew more than the threshold with a clear linear trend
+    """
+    result = dict()
+    times = time_series["time"]
+    for name, task in time_series["tasks"].items():
+        rps_change = compare_parts(task["rps"])
+        latency_change = compare_parts(task["p99"])
+        rps_trend = linear_trend(times, task["rps"])
+        latency_trend = linear_trend(times, task["p99"])
+        degraded = False
+        if rps_change is not None and rps_change < -threshold and rps_trend and rps_trend[1] <= -MIN_CORRELATION:
+            degraded = True
+        if latency_change is not None and latency_change > threshold and latency_trend \
+                and latency_trend[1] >= MIN_CORRELATION:
+            degraded = True
+        result[name] = {
+            "rps_change": round(rps_change, 4) if rps_change is not None else None,
+            "latency_change": round(latency_change, 4) if latency_change is not None else None,
+            "degraded": degraded
+        }
+        if degraded:
+            logger.warning("Task %s degraded over the run: %s" % (name, result[name]))
+    return result
+
+
+def detect_growth(times, values, threshold=DEFAULT_DEGRADATION_THRESHOLD):
+    """ steady growth of e.g. the resident memory, the sign of a leak """
+    trend = linear_trend(times, values)
+    if trend is None:
+        return None
+    growth, correlation = trend
+    return {
+        "growth": round(growth, 4),
+        "correlation": round(correlation, 4),
+        "growing": growth > threshold and correlation >= MIN_CORRELATION
+    }
@@ -4,6 +4,7 @@ import random
 import logging
 from locust import User, events
 from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.pool import get_pool
 
 logger = logging.getLogger("milvus_benchmark.runners.locust_task")
 
@@ -18,7 +19,8 @@ class MilvusTask(object):
             host = kwargs.get("host")
             port = kwargs.get("port")
             collection_name = kwargs.get("collection_name")
-            self.m = MilvusClient(host=host, port=port, collection_name=collection_name)
+            # each user borrows a pooled connection, the users share the channels of the pool
+            self.m = MilvusClient(host=host, port=port, collection_name=collection_name, pool=get_pool(host, port))
 
     def __getattr__(self, name):
         func = getattr(self.m, name)
@@ -1,6 +1,11 @@
+import time
+import queue
+import socket
 import logging
 import random
 import pdb
+import multiprocessing
+from contextlib import closing
 import gevent
 # import gevent.monkey
 # gevent.monkey.patch_all()
@@ -12,14 +17,20 @@ from locust import LoadTestShape
 from locust.stats import stats_printer, print_stats
 from locust.log import setup_logging, greenlet_exception_logger
 from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.pool import get_pool
 from .locust_task import MilvusTask
 from .locust_tasks import Tasks
+from .locust_stats import TimeSeriesStats, get_interval, detect_trends, DEFAULT_DEGRADATION_THRESHOLD
 from . import utils
+from . import datagen
 
 locust.stats.CONSOLE_STATS_INTERVAL_SEC = 20
 logger = logging.getLogger("milvus_benchmark.runners.locust_user")
 nq = 10000
 nb = 100000
+LOCAL_HOST = "127.0.0.1"
+WORKER_READY_TIMEOUT = 120
+WORKER_EXIT_TIMEOUT = 30
 
 
 class StepLoadShape(LoadTestShape):
@@ -54,8 +65,8 @@ class MyUser(User):
     pass
 
 
-def locust_executor(host, port, collection_name, connection_type="single", run_params=None):
-    m = MilvusClient(host=host, port=port, collection_name=collection_name)
+def setup_user(host, port, collection_name, connection_type, run_params, with_client=True):
+    """ set the tasks, the data and the client of MyUser, the master process only needs the tasks """
     MyUser.tasks = {}
     MyUser.op_info = run_params["op_info"]
     MyUser.params = {}
@@ -65,24 +76,103 @@ def locust_executor(host, port, collection_name, connection_type="single", run_p
         MyUser.tasks.update(task)
         MyUser.params[op] = value["params"] if "params" in value else None
     logger.info(MyUser.tasks)
+    if not with_client:
+        return
+    generator = datagen.get_generator()
     MyUser.values = {
-        "ids": [random.randint(1000000, 10000000) for _ in range(nb)],
-        "get_ids": [random.randint(1, 10000000) for _ in range(nb)],
-        "X": utils.generate_vectors(nq, MyUser.op_info["dimension"])
+        "ids": generator.scalars(nb, low=1000000, high=10000001).tolist(),
+        "get_ids": generator.scalars(nb, low=1, high=10000001).tolist(),
+        "X": generator.float_vectors(nq, MyUser.op_info["dimension"])
     }
-
+    m = MilvusClient(host=host, port=port, collection_name=collection_name, pool=get_pool(host, port))
     # MyUser.tasks = {Tasks.query: 1, Tasks.flush: 1}
     MyUser.client = MilvusTask(host=host, port=port, collection_name=collection_name, connection_type=connection_type,
                                m=m)
+
+
+def get_shape(run_params):
     if "load_shape" in run_params and run_params["load_shape"]:
-        test = StepLoadShape() 
-        test.init(run_params["step_time"], run_params["step_load"], run_params["spawn_rate"], run_params["during_time"])
-        env = Environment(events=events, user_classes=[MyUser], shape_class=test)
-        runner = env.create_local_runner()
-        env.runner.start_shape()
+        shape = StepLoadShape()
+        shape.init(run_params["step_time"], run_params["step_load"], run_params["spawn_rate"],
+                   run_params["during_time"])
+        return shape
+    return None
+
+
+def sample_users(runner, time_series_stats, interval):
+    while True:
+        time_series_stats.record_users(runner.user_count)
+        gevent.sleep(interval)
+
+
+def run_worker(host, port, collection_name, connection_type, run_params, master_port, stats_interval, result_queue):
+    """
+    worker process: run the users spawned by the master,
+    the time series is sent back through the queue, the locust stats are reported to the master by locust
+    """
+    setup_user(host, port, collection_name, connection_type, run_params)
+    env = Environment(events=events, user_classes=[MyUser])
+    runner = env.create_worker_runner(LOCAL_HOST, master_port)
+    time_series_stats = TimeSeriesStats(interval=stats_interval)
+    time_series_stats.listen(events)
+    time_series_stats.start()
+    runner.greenlet.join()
+    time_series_stats.stop()
+    result_queue.put(time_series_stats.dump())
+
+
+def get_free_port():
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind((LOCAL_HOST, 0))
+        return s.getsockname()[1]
+
+
+def locust_executor(host, port, collection_name, connection_type="single", run_params=None):
+    """
+    workers: number of worker processes, the users are spawned on the workers by a master runner in this process,
+    the grpc client blocks the gevent loop, so one process can only send a few requests at a time
+    """
+    workers = run_params["workers"] if "workers" in run_params else 0
+    shape = get_shape(run_params)
+    clients_num = run_params["clients_num"] if "clients_num" in run_params else 0
+    step_load = run_params["step_load"] if "step_load" in run_params else 0
+    step_time = run_params["step_time"] if "step_time" in run_params else 0
+    spawn_rate = run_params["spawn_rate"]
+    during_time = run_params["during_time"]
+    stats_interval = run_params["stats_interval"] if "stats_interval" in run_params else get_interval(during_time)
+    threshold = run_params["degradation_threshold"] if "degradation_threshold" in run_params \
+        else DEFAULT_DEGRADATION_THRESHOLD
+    # per task and per interval stats, the locust stats only keep the totals and a sliding window
+    time_series_stats = TimeSeriesStats(interval=stats_interval)
+    processes = []
+    if workers > 1:
+        setup_user(host, port, collection_name, connection_type, run_params, with_client=False)
+        env = Environment(events=events, user_classes=[MyUser], shape_class=shape)
+        master_port = get_free_port()
+        runner = env.create_master_runner(master_bind_host=LOCAL_HOST, master_bind_port=master_port)
+        # spawn instead of fork, the grpc channels of this process can not be used in the children
+        context = multiprocessing.get_context("spawn")
+        result_queue = context.Queue()
+        for i in range(workers):
+            process = context.Process(target=run_worker, name="locust-worker-%d" % i,
+                                      args=(host, port, collection_name, connection_type, run_params, master_port,
+                                            stats_interval, result_queue))
+            process.start()
+            processes.append(process)
+        deadline = time.time() + WORKER_READY_TIMEOUT
+        while len(runner.clients.ready) < workers:
+            if time.time() > deadline or not all([process.is_alive() for process in processes]):
+                runner.quit()
+                for process in processes:
+                    process.terminate()
+                raise Exception("Only %d of %d locust workers ready" % (len(runner.clients.ready), workers))
+            gevent.sleep(0.1)
+        logger.info("%d locust workers ready" % workers)
     else:
-        env = Environment(events=events, user_classes=[MyUser])
+        setup_user(host, port, collection_name, connection_type, run_params)
+        env = Environment(events=events, user_classes=[MyUser], shape_class=shape)
         runner = env.create_local_runner()
+        time_series_stats.listen(events)
     # setup logging
     # setup_logging("WARNING", "/dev/null")
     # greenlet_exception_logger(logger=logger)
@@ -90,20 +180,44 @@ def locust_executor(host, port, collection_name, connection_type="single", run_p
     # env.create_web_ui("127.0.0.1", 8089)
     # gevent.spawn(stats_printer(env.stats), env, "test", full_history=True)
     # events.init.fire(environment=env, runner=runner)
-    clients_num = run_params["clients_num"] if "clients_num" in run_params else 0
-    step_load = run_params["step_load"] if "step_load" in run_params else 0
-    step_time = run_params["step_time"] if "step_time" in run_params else 0
-    spawn_rate = run_params["spawn_rate"]
-    during_time = run_params["during_time"]
-    runner.start(clients_num, spawn_rate=spawn_rate)
+    time_series_stats.start()
+    users_greenlet = gevent.spawn(sample_users, runner, time_series_stats, stats_interval)
+    if shape:
+        # the user count is given by the shape, on the master it is distributed to the workers
+        runner.start_shape()
+    else:
+        runner.start(clients_num, spawn_rate=spawn_rate)
     gevent.spawn_later(during_time, lambda: runner.quit())
     runner.greenlet.join()
+    users_greenlet.kill()
+    if processes:
+        for process in processes:
+            try:
+                time_series_stats.merge(result_queue.get(timeout=WORKER_EXIT_TIMEOUT))
+            except queue.Empty:
+                logger.error("Time series of a locust worker lost")
+        for process in processes:
+            process.join(WORKER_EXIT_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+    else:
+        time_series_stats.remove(events)
+    time_series_stats.stop()
     print_stats(env.stats)
+    tasks_summary = time_series_stats.summary()
+    time_series = time_series_stats.export()
+    total = tasks_summary.get("total", {"rps": 0.0})
     result = {
-        "rps": round(env.stats.total.current_rps, 1),  # Number of interface requests per second
+        "rps": total["rps"],  # Average number of requests per second over the run
+        "last_rps": round(env.stats.total.current_rps, 1),  # Requests per second of the last seconds
         "fail_ratio": env.stats.total.fail_ratio,  # Interface request failure rate
         "max_response_time": round(env.stats.total.max_response_time, 1),  # Maximum interface response time
-        "avg_response_time": round(env.stats.total.avg_response_time, 1)  # ratio of average response time
+        "avg_response_time": round(env.stats.total.avg_response_time, 1),  # ratio of average response time
+        "workers": workers,
+        "tasks": tasks_summary,
+        "time_series": time_series,
+        # the throughput is expected to change with the step load
+        "trends": None if shape else detect_trends(time_series, threshold=threshold)
     }
     runner.stop()
     return result
@@ -0,0 +1,452 @@
+import time
+import copy
+import json
+import queue
+import logging
+import threading
+import numpy as np
+
+from milvus_benchmark import parser
+from milvus_benchmark import utils
+from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.pool import get_pool
+from milvus_benchmark.runners import utils as runner_utils
+from milvus_benchmark.runners import datagen
+from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.histogram import LatencyHistogram
+from milvus_benchmark.runners.qps import FAILURE_BACKOFF
+
+logger = logging.getLogger("milvus_benchmark.runners.mixed")
+
+QUERY_CHECK = "query"
+SEARCH_CHECK = "search"
+DEFAULT_DURING_TIME = 120
+DEFAULT_INSERT_BATCH = 100
+DEFAULT_PROBE_INTERVAL = 1
+DEFAULT_POLL_INTERVAL = 0.05
+DEFAULT_VISIBILITY_TIMEOUT = 60
+DEFAULT_NI = 50000
+
+
+class MaintenanceWindow(object):
+    """
+    Tracks the flush/compaction in progress, a request overlaps with them
+    if one was running at its start or one started or ended before its end
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self._epoch = 0
+
+    def enter(self):
+        with self._lock:
+            self._active += 1
+            self._epoch += 1
+
+    def exit(self):
+        with self._lock:
+            self._active -= 1
+            self._epoch += 1
+
+    def snapshot(self):
+        return self._active, self._epoch
+
+    def overlapped(self, snapshot):
+        active, epoch = snapshot
+        return bool(active) or epoch != self._epoch
+
+
+class MixedResult(object):
+    """ the records of all the threads of one case """
+
+    def __init__(self, checks):
+        self._lock = threading.Lock()
+        self.insert_latency = LatencyHistogram()
+        self.inserted = 0
+        self.insert_failures = 0
+        self.search_latency = LatencyHistogram()
+        self.search_latency_idle = LatencyHistogram()
+        self.search_latency_maintenance = LatencyHistogram()
+        self.search_failures = 0
+        self.visible_latency = {check: LatencyHistogram() for check in checks}
+        self.visible_timeouts = {check: 0 for check in checks}
+        self.probes = 0
+        self.skipped_probes = 0
+        self.maintenance = {"flush": LatencyHistogram(), "compact": LatencyHistogram()}
+        self.maintenance_failures = {"flush": 0, "compact": 0}
+
+    def record_insert(self, latency, rows):
+        with self._lock:
+            self.insert_latency.record(latency)
+            self.inserted += rows
+
+    def record_insert_failure(self):
+        with self._lock:
+            self.insert_failures += 1
+
+    def record_search(self, latency, overlapped):
+        with self._lock:
+            self.search_latency.record(latency)
+            if overlapped:
+                self.search_latency_maintenance.record(latency)
+            else:
+                self.search_latency_idle.record(latency)
+
+    def record_search_failure(self):
+        with self._lock:
+            self.search_failures += 1
+
+    def record_visible(self, check, latency):
+        with self._lock:
+            if latency is None:
+                self.visible_timeouts[check] += 1
+            else:
+                self.visible_latency[check].record(latency)
+
+    def record_maintenance(self, op, latency):
+        with self._lock:
+            if latency is None:
+                self.maintenance_failures[op] += 1
+            else:
+                self.maintenance[op].record(latency)
+
+
+class MixedReadWriteRunner(BaseRunner):
+    """
+    run insert, search and query at the same time:
+        the writer inserts rows at the given rate in batches, a probe row of a batch is sampled every probe_interval,
+        the pollers poll the probe with query by id and search until it is visible,
+        the searchers run the closed loop search, the latency is split by the overlap with flush/compaction,
+        the maintenance thread flushes and compacts the collection periodically
+    """
+    name = "mixed_read_write_performance"
+
+    def __init__(self, env, metric):
+        super(MixedReadWriteRunner, self).__init__(env, metric)
+        self._clients = []
+        # the ids of the rows inserted during the cases start from the collection size
+        self._next_id = None
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        ni_per = collection["ni_per"] if "ni_per" in collection else DEFAULT_NI
+        index_type = collection["index_type"]
+        index_param = collection["index_param"]
+        insert_rates = collection["insert_rates"]
+        insert_batch = collection["insert_batch"] if "insert_batch" in collection else DEFAULT_INSERT_BATCH
+        search_concurrency = collection["search_concurrency"]
+        poll_concurrency = collection["poll_concurrency"]
+        checks = collection["visibility_checks"] if "visibility_checks" in collection else [QUERY_CHECK, SEARCH_CHECK]
+        for check in checks:
+            if check not in [QUERY_CHECK, SEARCH_CHECK]:
+                raise Exception("Visibility check: %s not supported" % check)
+        probe_interval = collection["probe_interval"] if "probe_interval" in collection else DEFAULT_PROBE_INTERVAL
+        poll_interval = collection["poll_interval"] if "poll_interval" in collection else DEFAULT_POLL_INTERVAL
+        visibility_timeout = utils.timestr_to_int(collection["visibility_timeout"]) \
+            if "visibility_timeout" in collection else DEFAULT_VISIBILITY_TIMEOUT
+        flush_interval = utils.timestr_to_int(collection["flush_interval"]) if "flush_interval" in collection else 0
+        compact_interval = utils.timestr_to_int(collection["compact_interval"]) \
+            if "compact_interval" in collection else 0
+        during_time = utils.timestr_to_int(collection["during_time"]) \
+            if "during_time" in collection else DEFAULT_DURING_TIME
+        top_k = collection["top_k"]
+        nq = collection["nq"]
+        search_param = collection["search_param"]
+        vector_type = runner_utils.get_vector_type(data_type)
+        index_field_name = runner_utils.get_default_field_name(vector_type)
+        base_query_vectors = runner_utils.get_vectors_from_binary(runner_utils.MAX_NQ, dimension, data_type)
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size
+        }
+        index_info = {
+            "index_type": index_type,
+            "index_param": index_param
+        }
+        search_info = {
+            "topk": top_k,
+            "query": base_query_vectors[0:nq],
+            "metric_type": runner_utils.metric_type_trans(metric_type),
+            "params": search_param}
+        self.init_metric(self.name, collection_info, index_info, None)
+        cases = list()
+        case_metrics = list()
+        # one case for each ingest rate, 0 is the baseline without insert
+        for insert_rate in insert_rates:
+            case_metric = copy.deepcopy(self.metric)
+            case_metric.set_case_metric_type()
+            case_metric.search = {
+                "nq": nq,
+                "topk": top_k,
+                "search_param": search_param
+            }
+            case_metric.run_params = {
+                "insert_rate": insert_rate,
+                "insert_batch": insert_batch,
+                "search_concurrency": search_concurrency,
+                "poll_concurrency": poll_concurrency,
+                "flush_interval": flush_interval,
+                "compact_interval": compact_interval,
+                "during_time": during_time
+            }
+            case = {
+                "collection_name": collection_name,
+                "data_type": data_type,
+                "collection_size": collection_size,
+                "dimension": dimension,
+                "metric_type": metric_type,
+                "vector_type": vector_type,
+                "ni_per": ni_per,
+                "index_field_name": index_field_name,
+                "index_type": index_type,
+                "index_param": index_param,
+                "insert_rate": insert_rate,
+                "insert_batch": insert_batch,
+                "search_concurrency": search_concurrency,
+                "poll_concurrency": poll_concurrency,
+                "visibility_checks": checks,
+                "probe_interval": probe_interval,
+                "poll_interval": poll_interval,
+                "visibility_timeout": visibility_timeout,
+                "flush_interval": flush_interval,
+                "compact_interval": compact_interval,
+                "during_time": during_time,
+                "vector_query": {"vector": {index_field_name: search_info}}
+            }
+            cases.append(case)
+            case_metrics.append(case_metric)
+        return cases, case_metrics
+
+    def group_key(self, case):
+        # the collection is loaded once, the rows inserted by each case are kept for the next ones
+        return [case["collection_name"], case["index_type"], case["index_param"]]
+
+    def prepare(self, **case_param):
+        collection_name = case_param["collection_name"]
+        index_field_name = case_param["index_field_name"]
+        self.milvus.set_collection(collection_name)
+        if self.milvus.exists_collection():
+            logger.debug("Start drop collection")
+            self.milvus.drop()
+            time.sleep(runner_utils.DELETE_INTERVAL_TIME)
+        self.milvus.create_collection(case_param["dimension"], data_type=case_param["vector_type"])
+        self.insert(self.milvus, collection_name, case_param["data_type"], case_param["dimension"],
+                    case_param["collection_size"], case_param["ni_per"], columnar=True)
+        self.milvus.flush()
+        logger.info(self.milvus.count())
+        self.milvus.create_index(index_field_name, case_param["index_type"], case_param["metric_type"],
+                                 index_param=case_param["index_param"])
+        logger.debug(self.milvus.describe_index(index_field_name))
+        self.milvus.load_collection(timeout=1200)
+        self._next_id = case_param["collection_size"]
+
+    def get_clients(self, collection_name, num):
+        """ each thread borrows a pooled connection, reuse them across the cases """
+        while len(self._clients) < num:
+            self._clients.append(MilvusClient(collection_name=collection_name, host=self.hostname, port=self.port,
+                                              pool=get_pool(self.hostname, self.port)))
+        return self._clients[:num]
+
+    def run_case(self, case_metric, **case_param):
+        insert_rate = case_param["insert_rate"]
+        insert_batch = case_param["insert_batch"]
+        dimension = case_param["dimension"]
+        index_field_name = case_param["index_field_name"]
+        vector_query = case_param["vector_query"]
+        checks = case_param["visibility_checks"]
+        poll_concurrency = case_param["poll_concurrency"] if insert_rate else 0
+        flush_interval = case_param["flush_interval"]
+        compact_interval = case_param["compact_interval"]
+        during_time = case_param["during_time"]
+        clients = self.get_clients(case_param["collection_name"],
+                                   1 + case_param["search_concurrency"] + poll_concurrency + 1)
+        writer_client = clients[0]
+        search_clients = clients[1:1 + case_param["search_concurrency"]]
+        poll_clients = clients[1 + case_param["search_concurrency"]:-1]
+        maintenance_client = clients[-1]
+        info = self.milvus.get_info()
+        generator = datagen.get_generator()
+        result = MixedResult(checks)
+        window = MaintenanceWindow()
+        probes = queue.Queue()
+        stop_event = threading.Event()
+        start_time = time.perf_counter()
+        deadline = start_time + during_time
+
+        def write():
+            interval = insert_batch / float(insert_rate)
+            next_probe_time = start_time
+            i = 0
+            while True:
+                # open loop, the batches are sent at the rate whatever the latency is
+                intended_time = start_time + i * interval
+                if intended_time >= deadline:
+                    break
+                now = time.perf_counter()
+                if intended_time > now:
+                    time.sleep(intended_time - now)
+                start_id = self._next_id
+                self._next_id += insert_batch
+                i += 1
+                vectors = generator.float_vectors(insert_batch, dimension, part=start_id)
+                ids = np.arange(start_id, start_id + insert_batch, dtype=np.int64)
+                entities = runner_utils.generate_columnar_entities(info, vectors, ids)
+                request_start = time.perf_counter()
+                res = writer_client.insert(entities, log=False)
+                request_end = time.perf_counter()
+                if res is None:
+                    result.record_insert_failure()
+                    continue
+                result.record_insert(request_end - request_start, insert_batch)
+                if request_end >= next_probe_time:
+                    next_probe_time = request_end + case_param["probe_interval"]
+                    # the last row of the batch, visible latency is counted from the insert request
+                    if probes.qsize() >= len(poll_clients):
+                        result.skipped_probes += 1
+                    else:
+                        result.probes += 1
+                        probes.put((int(ids[-1]), vectors[-1:], request_start))
+
+        def is_visible(client, check, probe_id, probe_vector):
+            if check == QUERY_CHECK:
+                return bool(client.get([probe_id], log=False))
+            search_info = dict(vector_query["vector"][index_field_name])
+            search_info["query"] = probe_vector.tolist()
+            res = client.query({"vector": {index_field_name: search_info}}, log=False)
+            return probe_id in client.get_ids(res)[0]
+
+        def poll(client):
+            while True:
+                try:
+                    probe_id, probe_vector, insert_time = probes.get(timeout=case_param["poll_interval"])
+                except queue.Empty:
+                    if stop_event.is_set():
+                        return
+                    continue
+                pending = list(checks)
+                timeout_time = insert_time + case_param["visibility_timeout"]
+                while pending:
+                    for check in list(pending):
+                        try:
+                            visible = is_visible(client, check, probe_id, probe_vector)
+                        except Exception as e:
+                            logger.debug(str(e))
+                            visible = False
+                        if visible:
+                            result.record_visible(check, time.perf_counter() - insert_time)
+                            pending.remove(check)
+                    if pending and time.perf_counter() >= timeout_time:
+                        for check in pending:
+                            result.record_visible(check, None)
+                        logger.warning("Row %d not visible in %ss: %s" % (
+                            probe_id, case_param["visibility_timeout"], pending))
+                        break
+                    if pending:
+                        time.sleep(case_param["poll_interval"])
+
+        def search(client):
+            while time.perf_counter() < deadline:
+                snapshot = window.snapshot()
+                request_start = time.perf_counter()
+                try:
+                    client.query(vector_query, log=False)
+                except Exception as e:
+                    logger.error(str(e))
+                    result.record_search_failure()
+                    time.sleep(max(min(FAILURE_BACKOFF, deadline - time.perf_counter()), 0))
+                    continue
+                result.record_search(time.perf_counter() - request_start, window.overlapped(snapshot))
+
+        def maintain():
+            next_time = {"flush": start_time + flush_interval, "compact": start_time + compact_interval}
+            intervals = {"flush": flush_interval, "compact": compact_interval}
+            ops = {"flush": maintenance_client.flush, "compact": maintenance_client.compact}
+            while True:
+                enabled = [op for op in next_time if intervals[op]]
+                if not enabled:
+                    return
+                op = min(enabled, key=lambda x: next_time[x])
+                if next_time[op] >= deadline or stop_event.wait(max(0, next_time[op] - time.perf_counter())):
+                    return
+                window.enter()
+                op_start = time.perf_counter()
+                try:
+                    ops[op]()
+                    result.record_maintenance(op, time.perf_counter() - op_start)
+                except Exception as e:
+                    logger.error("%s failed: %s" % (op, str(e)))
+                    result.record_maintenance(op, None)
+                finally:
+                    window.exit()
+                next_time[op] += intervals[op]
+
+        logger.info("Start mixed load, insert rate: %s, search concurrency: %d, poll concurrency: %d" % (
+            insert_rate, len(search_clients), len(poll_clients)))
+        load_threads = [threading.Thread(target=search, args=(client,)) for client in search_clients]
+        if insert_rate:
+            load_threads.append(threading.Thread(target=write))
+        background_threads = [threading.Thread(target=poll, args=(client,)) for client in poll_clients]
+        background_threads.append(threading.Thread(target=maintain))
+        for t in load_threads + background_threads:
+            t.start()
+        for t in load_threads:
+            t.join()
+        elapsed = time.perf_counter() - start_time
+        # the pollers drain the probes left and the maintenance thread stops, after the load ends
+        stop_event.set()
+        for t in background_threads:
+            t.join()
+        tmp_result = {
+            "insert_rate": insert_rate,
+            "insert_rps": round(result.inserted / elapsed, 2),
+            "inserted": result.inserted,
+            "insert_failures": result.insert_failures,
+            "insert_latency": result.insert_latency.summary(),
+            "probes": result.probes,
+            "skipped_probes": result.skipped_probes,
+            "visible_latency": {check: result.visible_latency[check].summary() for check in checks},
+            "visible_timeouts": result.visible_timeouts,
+            "qps": round(result.search_latency.count / elapsed, 2),
+            "search_failures": result.search_failures,
+            "latency": result.search_latency.summary(),
+            "latency_idle": result.search_latency_idle.summary(),
+            "latency_maintenance": result.search_latency_maintenance.summary(),
+            "maintenance": {op: {"latency": result.maintenance[op].summary(),
+                                 "failures": result.maintenance_failures[op]} for op in result.maintenance},
+            "histogram": result.search_latency.export()
+        }
+        logger.info({k: v for k, v in tmp_result.items() if k != "histogram"})
+        return tmp_result
+
+    def summarize(self, case_metrics):
+        """ the search latency degradation and the visible latency over the ingest rate """
+        curve = []
+        for case_metric in case_metrics:
+            value = case_metric.metrics["value"]
+            if case_metric.status != "RUN_SUCC" or "latency" not in value:
+                continue
+            idle_p99 = value["latency_idle"]["p99"]
+            curve.append({
+                "insert_rate": value["insert_rate"],
+                "insert_rps": value["insert_rps"],
+                "qps": value["qps"],
+                "p50": value["latency"]["p50"],
+                "p99": value["latency"]["p99"],
+                "visible_p50": {check: item["p50"] for check, item in value["visible_latency"].items()},
+                "visible_p99": {check: item["p99"] for check, item in value["visible_latency"].items()},
+                # the slow down of the search overlapping with flush/compaction
+                "maintenance_interference": round(value["latency_maintenance"]["p99"] / idle_p99, 3)
+                if idle_p99 and value["latency_maintenance"]["count"] else None
+            })
+        curve.sort(key=lambda x: x["insert_rate"])
+        if curve and curve[0]["p99"]:
+            baseline = curve[0]
+            for point in curve:
+                point["p99_degradation"] = round(point["p99"] / baseline["p99"], 3)
+                point["qps_degradation"] = round(point["qps"] / baseline["qps"], 3) if baseline["qps"] else None
+        logger.info("Mixed read/write curve: %s" % json.dumps(curve))
+        self.result.update({"curve": curve})
@@ -0,0 +1,153 @@
+import copy
+import json
+import logging
+import itertools
+
+from milvus_benchmark import utils
+from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.pool import get_pool
+from milvus_benchmark.runners.accuracy import AccAccuracyRunner
+from milvus_benchmark.runners.qps import run_closed_loop
+
+logger = logging.getLogger("milvus_benchmark.runners.pareto")
+
+DEFAULT_RECALL_TARGETS = [0.9, 0.95, 0.99]
+DEFAULT_CONCURRENCY = 1
+DEFAULT_DURING_TIME = 30
+DEFAULT_WARMUP_TIME = 3
+DEFAULT_QPS_NQ = 1
+
+
+def pareto_frontier(points):
+    """
+    points: [{"recall", "qps", ...}]
+    return the points that no other point beats on both recall and qps, sorted by recall
+    """
+    frontier = []
+    # scan from the highest recall, a point is kept only if it is faster than all the kept ones
+    for point in sorted(points, key=lambda x: (-x["recall"], -x["qps"])):
+        if not frontier or point["qps"] > frontier[-1]["qps"]:
+            frontier.append(point)
+    frontier.reverse()
+    return frontier
+
+
+def auto_tune(frontier, recall_targets):
+    """
+    for each recall target, the fastest point reaching it, None if the target is not reachable
+    """
+    result = []
+    for target in recall_targets:
+        candidates = [point for point in frontier if point["recall"] >= target]
+        best = max(candidates, key=lambda x: x["qps"]) if candidates else None
+        result.append({"recall_target": target, "best": best})
+    return result
+
+
+class ParetoRunner(AccAccuracyRunner):
+    """
+    run ann accuracy and search throughput in the same pass:
+        recall is calculated from the full nq search, the same as ann_accuracy
+        qps is measured with closed loop clients sending qps_nq vectors per request
+    """
+    name = "ann_pareto"
+
+    def __init__(self, env, metric):
+        super(ParetoRunner, self).__init__(env, metric)
+        self._clients = []
+
+    def extract_cases(self, collection):
+        cases, case_metrics = super(ParetoRunner, self).extract_cases(collection)
+        concurrency = collection["concurrency"] if "concurrency" in collection else DEFAULT_CONCURRENCY
+        during_time = utils.timestr_to_int(collection["during_time"]) if "during_time" in collection else DEFAULT_DURING_TIME
+        warmup_time = utils.timestr_to_int(collection["warmup_time"]) if "warmup_time" in collection else DEFAULT_WARMUP_TIME
+        qps_nq = collection["qps_nq"] if "qps_nq" in collection else DEFAULT_QPS_NQ
+        recall_targets = collection["recall_targets"] if "recall_targets" in collection else DEFAULT_RECALL_TARGETS
+        self.metric.run_params = {"recall_targets": recall_targets}
+        case_params = {
+            "concurrency": concurrency,
+            "during_time": during_time,
+            "warmup_time": warmup_time,
+            "qps_nq": qps_nq
+        }
+
+        def update_metric(case_metric):
+            case_metric.run_params = {
+                "concurrency": concurrency,
+                "during_time": during_time,
+                "qps_nq": qps_nq
+            }
+
+        # the cases are built when they are run
+        cases.apply(lambda case: case.update(case_params))
+        case_metrics.apply(update_metric)
+        return cases, case_metrics
+
+    def get_clients(self, collection_name, num):
+        """ each client borrows a pooled connection, reuse them across the cases """
+        while len(self._clients) < num:
+            self._clients.append(MilvusClient(collection_name=collection_name, host=self.hostname, port=self.port,
+                                              pool=get_pool(self.hostname, self.port)))
+        return self._clients[:num]
+
+    def run_case(self, case_metric, **case_param):
+        # recall of the full query set
+        tmp_result = super(ParetoRunner, self).run_case(case_metric, **case_param)
+        # throughput, each request takes the next qps_nq vectors of the query set
+        index_field_name = case_param["index_field_name"]
+        search_info = case_param["vector_query"]["vector"][index_field_name]
+        query_vectors = search_info["query"]
+        qps_nq = min(case_param["qps_nq"], len(query_vectors))
+        loops = max(1, len(query_vectors) // qps_nq)
+        vector_queries = []
+        for i in range(loops):
+            tmp_search_info = dict(search_info)
+            tmp_search_info["query"] = query_vectors[i * qps_nq:(i + 1) * qps_nq]
+            vector_queries.append({"vector": {index_field_name: tmp_search_info}})
+        counter = itertools.count()
+        filter_query = case_param["filter_query"]
+
+        def query_func(client):
+            client.query(vector_queries[next(counter) % loops], filter_query=filter_query, log=False)
+
+        clients = self.get_clients(case_param["collection_name"], case_param["concurrency"])
+        result, during_time = run_closed_loop(clients, query_func, case_param["during_time"],
+                                              case_param["warmup_time"])
+        requests = result.latency.count
+        tmp_result.update({
+            # vectors searched per second, comparable across qps_nq
+            "qps": round(requests * qps_nq / during_time, 2),
+            "requests": requests,
+            "failures": result.failures,
+            "latency": result.latency.summary()
+        })
+        logger.info(tmp_result)
+        return tmp_result
+
+    def summarize(self, case_metrics):
+        points = []
+        for case_metric in case_metrics:
+            value = case_metric.metrics["value"]
+            if case_metric.status != "RUN_SUCC" or "qps" not in value:
+                continue
+            points.append({
+                "index": copy.deepcopy(case_metric.index),
+                "search": copy.deepcopy(case_metric.search),
+                "recall": value["recall"],
+                "qps": value["qps"]
+            })
+        frontier = pareto_frontier(points)
+        recall_targets = self.metric.run_params["recall_targets"] if self.metric.run_params else DEFAULT_RECALL_TARGETS
+        summary = {
+            "points": points,
+            "frontier": frontier,
+            "auto_tune": auto_tune(frontier, recall_targets)
+        }
+        for item in summary["auto_tune"]:
+            if item["best"]:
+                logger.info("Recall target: %s, index: %s, search_param: %s, recall: %s, qps: %s" % (
+                    item["recall_target"], json.dumps(item["best"]["index"]),
+                    json.dumps(item["best"]["search"]["search_param"]), item["best"]["recall"], item["best"]["qps"]))
+            else:
+                logger.info("Recall target: %s not reached" % item["recall_target"])
+        self.result.update(summary)
@@ -0,0 +1,362 @@
+import time
+import copy
+import asyncio
+import json
+import logging
+import threading
+import itertools
+from milvus_benchmark import parser
+from milvus_benchmark import utils
+from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.pool import get_pool
+from milvus_benchmark.async_client import AsyncMilvusClient
+from milvus_benchmark.runners import utils as runner_utils
+from milvus_benchmark.runners.search import SearchRunner, DEFAULT_WARM_QUERY_TIMES
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.qps")
+
+CLOSED_LOOP_MODE = "closed"
+OPEN_LOOP_MODE = "open"
+DEFAULT_DURING_TIME = 60
+DEFAULT_WARMUP_TIME = 5
+# the open loop level is saturated when the achieved qps is lower than 95% of the target rate
+SATURATION_RATIO = 0.95
+# a client waits after a failed request instead of retrying at once against a server that is down
+FAILURE_BACKOFF = 0.1
+
+
+class LoadResult(object):
+    """ requests recorded by all the clients of one load level """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = LatencyHistogram()
+        self.service_time = LatencyHistogram()
+        self.failures = 0
+
+    def record(self, latency, service_time):
+        with self._lock:
+            self.latency.record(latency)
+            self.service_time.record(service_time)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+
+def run_closed_loop(clients, query_func, during_time, warmup_time):
+    """
+    Every client sends the next request as soon as the previous one returns,
+    the number of in-flight requests equals the number of clients
+    """
+    result = LoadResult()
+    start_time = time.perf_counter()
+    record_time = start_time + warmup_time
+    deadline = record_time + during_time
+
+    def work(client):
+        while True:
+            request_start = time.perf_counter()
+            if request_start >= deadline:
+                break
+            try:
+                query_func(client)
+            except Exception as e:
+                logger.error(str(e))
+                if request_start >= record_time:
+                    result.record_failure()
+                time.sleep(max(min(FAILURE_BACKOFF, deadline - time.perf_counter()), 0))
+                continue
+            if request_start >= record_time:
+                latency = time.perf_counter() - request_start
+                result.record(latency, latency)
+
+    threads = [threading.Thread(target=work, args=(client,)) for client in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return result, during_time
+
+
+def run_open_loop(clients, query_func, rate, during_time, warmup_time):
+    """
+    Requests are scheduled at a fixed arrival rate whatever the response time is,
+    the latency is measured from the intended send time to correct the coordinated omission
+    """
+    result = LoadResult()
+    counter = itertools.count()
+    start_time = time.perf_counter()
+    record_time = start_time + warmup_time
+    deadline = record_time + during_time
+    interval = 1.0 / rate
+
+    def work(client):
+        while True:
+            intended_time = start_time + next(counter) * interval
+            if intended_time >= deadline:
+                break
+            now = time.perf_counter()
+            if intended_time > now:
+                time.sleep(intended_time - now)
+            request_start = time.perf_counter()
+            try:
+                query_func(client)
+            except Exception as e:
+                logger.error(str(e))
+                if intended_time >= record_time:
+                    result.record_failure()
+                continue
+            request_end = time.perf_counter()
+            if intended_time >= record_time:
+                result.record(request_end - intended_time, request_end - request_start)
+
+    threads = [threading.Thread(target=work, args=(client,)) for client in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # the late requests are still running after the deadline, count the real time
+    return result, max(during_time, time.perf_counter() - record_time)
+
+
+def run_async_open_loop(request, rate, during_time, warmup_time, max_in_flight):
+    """
+    Open loop driven by one event loop instead of a thread per client:
+    each request is a task started at its intended time, at most max_in_flight of them are in flight,
+    request is a zero-argument coroutine function, e.g. calling the AsyncMilvusClient,
+    the latency is measured from the intended send time as run_open_loop
+    """
+    result = LoadResult()
+    interval = 1.0 / rate
+
+    async def send(intended_time, record_time, semaphore):
+        async with semaphore:
+            request_start = time.perf_counter()
+            try:
+                await request()
+            except Exception as e:
+                logger.error(str(e))
+                if intended_time >= record_time:
+                    result.record_failure()
+                return
+            request_end = time.perf_counter()
+            if intended_time >= record_time:
+                result.record(request_end - intended_time, request_end - request_start)
+
+    async def schedule():
+        semaphore = asyncio.Semaphore(max_in_flight)
+        start_time = time.perf_counter()
+        record_time = start_time + warmup_time
+        deadline = record_time + during_time
+        tasks = set()
+        for i in itertools.count():
+            intended_time = start_time + i * interval
+            if intended_time >= deadline:
+                break
+            delay = intended_time - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(send(intended_time, record_time, semaphore))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        return record_time
+
+    record_time = asyncio.run(schedule())
+    # the late requests are still running after the deadline, count the real time
+    return result, max(during_time, time.perf_counter() - record_time)
+
+
+def find_knee(curve, mode):
+    """
+    closed loop: the level with the max power (qps / mean latency), beyond it the latency grows faster than the qps
+    open loop: the last rate that the server could keep up with
+    """
+    if not curve:
+        return None
+    if mode == CLOSED_LOOP_MODE:
+        def power(point):
+            return point["qps"] / point["latency"]["mean"] if point["latency"]["mean"] else 0
+        return max(curve, key=power)
+    knee = None
+    for point in sorted(curve, key=lambda x: x["rate"]):
+        if point["qps"] < point["rate"] * SATURATION_RATIO:
+            break
+        knee = point
+    return knee
+
+
+class QPSSearchRunner(SearchRunner):
+    """run concurrent search with closed loop or open loop load"""
+    name = "qps_search_performance"
+
+    def __init__(self, env, metric):
+        super(QPSSearchRunner, self).__init__(env, metric)
+        self._clients = []
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        mode = collection["mode"] if "mode" in collection else CLOSED_LOOP_MODE
+        if mode not in [CLOSED_LOOP_MODE, OPEN_LOOP_MODE]:
+            raise Exception("Load mode: %s not supported" % mode)
+        top_k = collection["top_k"]
+        nq = collection["nq"]
+        search_param = collection["search_param"]
+        filters = collection["filters"] if "filters" in collection else []
+        during_time = utils.timestr_to_int(collection["during_time"]) if "during_time" in collection else DEFAULT_DURING_TIME
+        warmup_time = utils.timestr_to_int(collection["warmup_time"]) if "warmup_time" in collection else DEFAULT_WARMUP_TIME
+        warm_query_times = collection["warm_query_times"] if "warm_query_times" in collection else DEFAULT_WARM_QUERY_TIMES
+        if mode == CLOSED_LOOP_MODE:
+            # one case for each number of in-flight clients
+            levels = [{"concurrency": c, "rate": None, "max_in_flight": None} for c in collection["concurrencies"]]
+        else:
+            # one case for each arrival rate, sent by a fixed pool of clients,
+            # or by the tasks of one event loop with at most max_in_flight requests in flight
+            max_in_flight = collection["max_in_flight"] if "max_in_flight" in collection else None
+            clients_num = max_in_flight or collection["clients_num"]
+            levels = [{"concurrency": clients_num, "rate": r, "max_in_flight": max_in_flight}
+                      for r in collection["rates"]]
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size
+        }
+        index_info = None
+        vector_type = runner_utils.get_vector_type(data_type)
+        index_field_name = runner_utils.get_default_field_name(vector_type)
+        base_query_vectors = runner_utils.get_vectors_from_binary(runner_utils.MAX_NQ, dimension, data_type)
+        filter_query = []
+        filter_param = []
+        for filter in filters:
+            if isinstance(filter, dict) and "range" in filter:
+                filter_query.append(eval(filter["range"]))
+                filter_param.append(filter["range"])
+            if isinstance(filter, dict) and "term" in filter:
+                filter_query.append(eval(filter["term"]))
+                filter_param.append(filter["term"])
+        search_info = {
+            "topk": top_k,
+            "query": base_query_vectors[0:nq],
+            "metric_type": runner_utils.metric_type_trans(metric_type),
+            "params": search_param}
+        vector_query = {"vector": {index_field_name: search_info}}
+        self.init_metric(self.name, collection_info, index_info, None, {"mode": mode})
+        cases = list()
+        case_metrics = list()
+        for level in levels:
+            case_metric = copy.deepcopy(self.metric)
+            case_metric.set_case_metric_type()
+            case_metric.search = {
+                "nq": nq,
+                "topk": top_k,
+                "search_param": search_param,
+                "filter": filter_param
+            }
+            case_metric.run_params = {
+                "mode": mode,
+                "concurrency": level["concurrency"],
+                "rate": level["rate"],
+                "during_time": during_time
+            }
+            if level["max_in_flight"]:
+                case_metric.run_params["max_in_flight"] = level["max_in_flight"]
+            case = {
+                "collection_name": collection_name,
+                "index_field_name": index_field_name,
+                "mode": mode,
+                "concurrency": level["concurrency"],
+                "rate": level["rate"],
+                "max_in_flight": level["max_in_flight"],
+                "during_time": during_time,
+                "warmup_time": warmup_time,
+                "warm_query_times": warm_query_times,
+                "filter_query": filter_query,
+                "vector_query": vector_query
+            }
+            cases.append(case)
+            case_metrics.append(case_metric)
+        logger.info("Load levels: %s" % json.dumps(levels))
+        return cases, case_metrics
+
+    def get_clients(self, collection_name, num):
+        """ each client borrows a pooled connection, reuse them across the levels """
+        while len(self._clients) < num:
+            self._clients.append(MilvusClient(collection_name=collection_name, host=self.hostname, port=self.port,
+                                              pool=get_pool(self.hostname, self.port)))
+        return self._clients[:num]
+
+    def run_case(self, case_metric, **case_param):
+        mode = case_param["mode"]
+        concurrency = case_param["concurrency"]
+        vector_query = case_param["vector_query"]
+        filter_query = case_param["filter_query"]
+        max_in_flight = case_param.get("max_in_flight")
+        async_stats = None
+
+        def query_func(client):
+            client.query(vector_query, filter_query=filter_query, log=False)
+
+        logger.info("Start %s loop load, concurrency: %d, rate: %s" % (mode, concurrency, case_param["rate"]))
+        if max_in_flight:
+            # the requests share one pooled connection, the blocking calls run in the threads of the facade
+            async_client = AsyncMilvusClient(self.get_clients(case_param["collection_name"], 1)[0],
+                                             max_workers=max_in_flight)
+            try:
+                result, during_time = run_async_open_loop(
+                    lambda: async_client.query(vector_query, filter_query=filter_query), case_param["rate"],
+                    case_param["during_time"], case_param["warmup_time"], max_in_flight)
+                async_stats = async_client.stats().get("query")
+            finally:
+                async_client.close()
+        elif mode == CLOSED_LOOP_MODE:
+            clients = self.get_clients(case_param["collection_name"], concurrency)
+            result, during_time = run_closed_loop(clients, query_func, case_param["during_time"],
+                                                  case_param["warmup_time"])
+        else:
+            clients = self.get_clients(case_param["collection_name"], concurrency)
+            result, during_time = run_open_loop(clients, query_func, case_param["rate"], case_param["during_time"],
+                                                case_param["warmup_time"])
+        requests = result.latency.count
+        tmp_result = {
+            "concurrency": concurrency,
+            "rate": case_param["rate"],
+            "qps": round(requests / during_time, 2),
+            "requests": requests,
+            "failures": result.failures,
+            "latency": result.latency.summary(),
+            "service_time": result.service_time.summary(),
+            "histogram": result.latency.export()
+        }
+        if async_stats:
+            # time waiting for a free thread of the facade, included in the latency
+            tmp_result["executor_wait"] = async_stats["wait"]
+        logger.info({k: v for k, v in tmp_result.items() if k != "histogram"})
+        return tmp_result
+
+    def summarize(self, case_metrics):
+        mode = case_metrics[0].run_params["mode"] if case_metrics else CLOSED_LOOP_MODE
+        curve = []
+        for case_metric in case_metrics:
+            value = case_metric.metrics["value"]
+            if case_metric.status != "RUN_SUCC" or "qps" not in value:
+                continue
+            curve.append({
+                "concurrency": value["concurrency"],
+                "rate": value["rate"],
+                "qps": value["qps"],
+                "latency": value["latency"]
+            })
+        knee = find_knee(curve, mode)
+        summary = {
+            "mode": mode,
+            "curve": curve,
+            "max_qps": max([point["qps"] for point in curve]) if curve else 0,
+            "knee": knee
+        }
+        logger.info("Throughput curve: %s" % json.dumps(summary))
+        self.result.update(summary)
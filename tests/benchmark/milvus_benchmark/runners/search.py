@@ -6,9 +6,50 @@ import logging
 from milvus_benchmark import parser
 from milvus_benchmark.runners import utils
 from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.histogram import LatencyHistogram
 
 logger = logging.getLogger("milvus_benchmark.runners.search")
 
+DEFAULT_WARM_QUERY_TIMES = 2
+
+
+def run_search(milvus, vector_query, filter_query, run_count, warmup_runs=0):
+    """
+    Run the search warmup_runs times without recording, then run_count times
+    with every latency recorded in the histogram
+    """
+    histogram = LatencyHistogram()
+    for i in range(warmup_runs):
+        logger.debug("Start warmup query, run %d of %s" % (i+1, warmup_runs))
+        milvus.query(vector_query, filter_query=filter_query)
+    for i in range(run_count):
+        logger.debug("Start run query, run %d of %s" % (i+1, run_count))
+        start_time = time.perf_counter()
+        _query_res = milvus.query(vector_query, filter_query=filter_query)
+        histogram.record(time.perf_counter() - start_time)
+    return histogram
+
+
+def warm_up(milvus, case_param):
+    """ warm up the loaded collection with the search param of the case """
+    times = case_param["warm_query_times"]
+    if not times:
+        return
+    index_field_name = case_param["index_field_name"]
+    search_info = case_param["vector_query"]["vector"][index_field_name]
+    milvus.warm_query(index_field_name, search_info["params"], search_info["metric_type"], times=times)
+
+
+def search_result(histogram):
+    """ keep search_time(min) and avc_search_time(mean), add the latency distribution """
+    latency = histogram.summary()
+    return {
+        "search_time": round(latency["min"] / 1000.0, 2),
+        "avc_search_time": round(latency["mean"] / 1000.0, 2),
+        "latency": latency,
+        "histogram": histogram.export()
+    }
+
 
 class SearchRunner(BaseRunner):
     """run search"""
@@ -24,7 +65,8 @@ class SearchRunner(BaseRunner):
         top_ks = collection["top_ks"]
         nqs = collection["nqs"]
         filters = collection["filters"] if "filters" in collection else []
-        
+        warmup_runs = collection["warmup_runs"] if "warmup_runs" in collection else 0
+        warm_query_times = collection["warm_query_times"] if "warm_query_times" in collection else DEFAULT_WARM_QUERY_TIMES
         search_params = collection["search_params"]
         # TODO: get fields by describe_index
         # fields = self.get_fields(self.milvus, collection_name)
@@ -40,53 +82,45 @@ class SearchRunner(BaseRunner):
         index_info = None
         vector_type = utils.get_vector_type(data_type)
         index_field_name = utils.get_default_field_name(vector_type)
-        base_query_vectors = utils.get_vectors_from_binary(utils.MAX_NQ, dimension, data_type)
-        cases = list()
-        case_metrics = list()
+        # loaded once, the cases take views of the first nq vectors
+        query_vectors = parser.QueryVectors(utils.load_query_vectors(utils.MAX_NQ, dimension, data_type))
         self.init_metric(self.name, collection_info, index_info, None)
-        for search_param in search_params:
-            logger.info("Search param: %s" % json.dumps(search_param))
-            for filter in filters:
-                filter_query = []
-                filter_param = []
-                if filter and isinstance(filter, dict):
-                    if "range" in filter:
-                        filter_query.append(eval(filter["range"]))
-                        filter_param.append(filter["range"])
-                    elif "term" in filter:
-                        filter_query.append(eval(filter["term"]))
-                        filter_param.append(filter["term"])
-                    else:
-                        raise Exception("%s not supported" % filter)
-                logger.info("filter param: %s" % json.dumps(filter_param))
-                for nq in nqs:
-                    query_vectors = base_query_vectors[0:nq]
-                    for top_k in top_ks:
-                        search_info = {
-                            "topk": top_k, 
-                            "query": query_vectors, 
-                            "metric_type": utils.metric_type_trans(metric_type), 
-                            "params": search_param}
-                        # TODO: only update search_info
-                        case_metric = copy.deepcopy(self.metric)
-                        case_metric.set_case_metric_type()
-                        case_metric.search = {
-                            "nq": nq,
-                            "topk": top_k,
-                            "search_param": search_param,
-                            "filter": filter_param
-                        }
-                        vector_query = {"vector": {index_field_name: search_info}}
-                        case = {
-                            "collection_name": collection_name,
-                            "index_field_name": index_field_name,
-                            "run_count": run_count,
-                            "filter_query": filter_query,
-                            "vector_query": vector_query,
-                        }
-                        cases.append(case)
-                        case_metrics.append(case_metric)
-        return cases, case_metrics
+        matrix = parser.matrix_parser(collection, [
+            ("search_param", search_params),
+            ("filter", filters or [None]),
+            ("nq", nqs),
+            ("top_k", top_ks)])
+
+        def build_metric(combination):
+            filter_query, filter_param = utils.parse_filter(combination["filter"])
+            case_metric = copy.deepcopy(self.metric)
+            case_metric.set_case_metric_type()
+            case_metric.search = {
+                "nq": combination["nq"],
+                "topk": combination["top_k"],
+                "search_param": combination["search_param"],
+                "filter": filter_param
+            }
+            return case_metric
+
+        def build_case(combination):
+            filter_query, filter_param = utils.parse_filter(combination["filter"])
+            search_info = {
+                "topk": combination["top_k"],
+                "query": query_vectors.query(combination["nq"]),
+                "metric_type": utils.metric_type_trans(metric_type),
+                "params": combination["search_param"]}
+            return {
+                "collection_name": collection_name,
+                "index_field_name": index_field_name,
+                "run_count": run_count,
+                "warmup_runs": warmup_runs,
+                "warm_query_times": warm_query_times,
+                "filter_query": filter_query,
+                "vector_query": {"vector": {index_field_name: search_info}},
+            }
+
+        return parser.LazyCases(matrix, build_case), parser.LazyCases(matrix, build_metric, cache=True)
 
     def prepare(self, **case_param):
         collection_name = case_param["collection_name"]
@@ -97,25 +131,14 @@ class SearchRunner(BaseRunner):
         logger.debug(self.milvus.count())
         logger.info("Start load collection")
         self.milvus.load_collection(timeout=1200)
-        # TODO: enable warm query
-        # self.milvus.warm_query(index_field_name, search_params[0], times=2)
+        warm_up(self.milvus, case_param)
 
     def run_case(self, case_metric, **case_param):
         # index_field_name = case_param["index_field_name"]
-        run_count = case_param["run_count"]
-        avg_query_time = 0.0
-        min_query_time = 0.0
-        total_query_time = 0.0        
-        for i in range(run_count):
-            logger.debug("Start run query, run %d of %s" % (i+1, run_count))
-            start_time = time.time()
-            _query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"])
-            interval_time = time.time() - start_time
-            total_query_time += interval_time
-            if (i == 0) or (min_query_time > interval_time):
-                min_query_time = round(interval_time, 2)
-        avg_query_time = round(total_query_time/run_count, 2)
-        tmp_result = {"search_time": min_query_time, "avc_search_time": avg_query_time}
+        histogram = run_search(self.milvus, case_param["vector_query"], case_param["filter_query"],
+                               case_param["run_count"], warmup_runs=case_param["warmup_runs"])
+        tmp_result = search_result(histogram)
+        logger.info(tmp_result["latency"])
         return tmp_result
 
 
@@ -139,9 +162,10 @@ class InsertSearchRunner(BaseRunner):
         nqs = collection["nqs"]
         other_fields = collection["other_fields"] if "other_fields" in collection else None
         filters = collection["filters"] if "filters" in collection else []
-        filter_query = []
         search_params = collection["search_params"]
         ni_per = collection["ni_per"]
+        warmup_runs = collection["warmup_runs"] if "warmup_runs" in collection else 0
+        warm_query_times = collection["warm_query_times"] if "warm_query_times" in collection else DEFAULT_WARM_QUERY_TIMES
 
         # TODO: get fields by describe_index
         # fields = self.get_fields(self.milvus, collection_name)
@@ -158,64 +182,56 @@ class InsertSearchRunner(BaseRunner):
         }
         vector_type = utils.get_vector_type(data_type)
         index_field_name = utils.get_default_field_name(vector_type)
-        # Get the path of the query.npy file stored on the NAS and get its data
-        base_query_vectors = utils.get_vectors_from_binary(utils.MAX_NQ, dimension, data_type)
-        cases = list()
-        case_metrics = list()
+        # Get the path of the query.npy file stored on the NAS and get its data, loaded once for all the cases
+        query_vectors = parser.QueryVectors(utils.load_query_vectors(utils.MAX_NQ, dimension, data_type))
         self.init_metric(self.name, collection_info, index_info, None)
-        
-        for search_param in search_params:
-            if not filters:
-                filters.append(None)
-            for filter in filters:
-                # filter_param = []
-                filter_query = []
-                if isinstance(filter, dict) and "range" in filter:
-                    filter_query.append(eval(filter["range"]))
-                    # filter_param.append(filter["range"])
-                if isinstance(filter, dict) and "term" in filter:
-                    filter_query.append(eval(filter["term"]))
-                    # filter_param.append(filter["term"])
-                # logger.info("filter param: %s" % json.dumps(filter_param))
-                for nq in nqs:
-                    # Take nq groups of data for query
-                    query_vectors = base_query_vectors[0:nq]
-                    for top_k in top_ks:
-                        search_info = {
-                            "topk": top_k, 
-                            "query": query_vectors, 
-                            "metric_type": utils.metric_type_trans(metric_type), 
-                            "params": search_param}
-                        # TODO: only update search_info
-                        case_metric = copy.deepcopy(self.metric)
-                        case_metric.set_case_metric_type()
-                        case_metric.search = {
-                            "nq": nq,
-                            "topk": top_k,
-                            "search_param": search_param,
-                            "filter": filter_query
-                        }
-                        vector_query = {"vector": {index_field_name: search_info}}
-                        case = {
-                            "collection_name": collection_name,
-                            "index_field_name": index_field_name,
-                            "other_fields": other_fields,
-                            "dimension": dimension,
-                            "data_type": data_type,
-                            "vector_type": vector_type,
-                            "collection_size": collection_size,
-                            "ni_per": ni_per,
-                            "build_index": build_index,
-                            "index_type": index_type,
-                            "index_param": index_param,
-                            "metric_type": metric_type,
-                            "run_count": run_count,
-                            "filter_query": filter_query,
-                            "vector_query": vector_query,
-                        }
-                        cases.append(case)
-                        case_metrics.append(case_metric)
-        return cases, case_metrics
+        matrix = parser.matrix_parser(collection, [
+            ("search_param", search_params),
+            ("filter", filters or [None]),
+            ("nq", nqs),
+            ("top_k", top_ks)])
+
+        def build_metric(combination):
+            filter_query, filter_param = utils.parse_filter(combination["filter"])
+            case_metric = copy.deepcopy(self.metric)
+            case_metric.set_case_metric_type()
+            case_metric.search = {
+                "nq": combination["nq"],
+                "topk": combination["top_k"],
+                "search_param": combination["search_param"],
+                "filter": filter_query
+            }
+            return case_metric
+
+        def build_case(combination):
+            filter_query, filter_param = utils.parse_filter(combination["filter"])
+            search_info = {
+                "topk": combination["top_k"],
+                # Take nq groups of data for query
+                "query": query_vectors.query(combination["nq"]),
+                "metric_type": utils.metric_type_trans(metric_type),
+                "params": combination["search_param"]}
+            return {
+                "collection_name": collection_name,
+                "index_field_name": index_field_name,
+                "other_fields": other_fields,
+                "dimension": dimension,
+                "data_type": data_type,
+                "vector_type": vector_type,
+                "collection_size": collection_size,
+                "ni_per": ni_per,
+                "build_index": build_index,
+                "index_type": index_type,
+                "index_param": index_param,
+                "metric_type": metric_type,
+                "run_count": run_count,
+                "warmup_runs": warmup_runs,
+                "warm_query_times": warm_query_times,
+                "filter_query": filter_query,
+                "vector_query": {"vector": {index_field_name: search_info}},
+            }
+
+        return parser.LazyCases(matrix, build_case), parser.LazyCases(matrix, build_metric, cache=True)
 
     def prepare(self, **case_param):
         collection_name = case_param["collection_name"]
@@ -267,26 +283,17 @@ class InsertSearchRunner(BaseRunner):
         load_start_time = time.time() 
         self.milvus.load_collection(timeout=1200)
         logger.debug({"load_time": round(time.time()-load_start_time, 2)})
+        warm_up(self.milvus, case_param)
         
     def run_case(self, case_metric, **case_param):
-        run_count = case_param["run_count"]
-        avg_query_time = 0.0
-        min_query_time = 0.0
-        total_query_time = 0.0        
-        for i in range(run_count):
-            # Number of successive queries
-            logger.debug("Start run query, run %d of %s" % (i+1, run_count))
-            logger.info(case_metric.search)
-            start_time = time.time()
-            _query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"])
-            interval_time = time.time() - start_time
-            total_query_time += interval_time
-            if (i == 0) or (min_query_time > interval_time):
-                min_query_time = round(interval_time, 2)
-        avg_query_time = round(total_query_time/run_count, 2)
-        logger.info("Min query time: %.2f, avg query time: %.2f" % (min_query_time, avg_query_time))
+        logger.info(case_metric.search)
+        histogram = run_search(self.milvus, case_param["vector_query"], case_param["filter_query"],
+                               case_param["run_count"], warmup_runs=case_param["warmup_runs"])
         # insert_result: "total_time", "rps", "ni_time"
-        tmp_result = {"insert": self.insert_result, "build_time": self.build_time, "search_time": min_query_time, "avc_search_time": avg_query_time}
+        tmp_result = {"insert": self.insert_result, "build_time": self.build_time}
+        tmp_result.update(search_result(histogram))
+        logger.info("Min query time: %.2f, avg query time: %.2f" % (tmp_result["search_time"], tmp_result["avc_search_time"]))
+        logger.info(tmp_result["latency"])
         # 
         # logger.info("Start load collection")
         # self.milvus.load_collection(timeout=1200)
@@ -1,5 +1,7 @@
 import os
 import pdb
+import json
+import hashlib
 import logging
 import numpy as np
 import sklearn.preprocessing
@@ -9,6 +11,7 @@ from itertools import product
 
 from pymilvus import DataType
 from milvus_benchmark import config
+from . import datagen
 
 logger = logging.getLogger("milvus_benchmark.runners.utils")
 
@@ -34,12 +37,16 @@ HAMMING_SRC_DATA_DIR = config.RAW_DATA_DIR + 'hamming/'
 STRUCTURE_SRC_DATA_DIR = config.RAW_DATA_DIR + 'structure/'
 BINARY_SRC_DATA_DIR = config.RAW_DATA_DIR + 'binary/'
 SIFT_SRC_GROUNDTRUTH_DATA_DIR = SIFT_SRC_DATA_DIR + 'gnd'
+# the ground truth built by runners/groundtruth.py
+GROUNDTRUTH_DIR = config.RAW_DATA_DIR + 'groundtruth/'
+GROUNDTRUTH_MANIFEST = 'manifest.json'
 
 DEFAULT_F_FIELD_NAME = 'float_vector'
 DEFAULT_B_FIELD_NAME = 'binary_vector'
 DEFAULT_INT_FIELD_NAME = 'int64'
 DEFAULT_FLOAT_FIELD_NAME = 'float'
 DEFAULT_DOUBLE_FIELD_NAME = "double"
+DEFAULT_PRIMARY_FIELD_NAME = "id"
 
 GROUNDTRUTH_MAP = {
     "1000000": "idx_1M.ivecs",
@@ -83,12 +90,14 @@ def get_len_vectors_per_file(data_type, dimension):
     return vectors_per_file
 
 
-def get_vectors_from_binary(nq, dimension, data_type):
+def load_query_vectors(nq, dimension, data_type):
+    """ the first nq query vectors as an array """
     # use the first file, nq should be less than VECTORS_PER_FILE
     if nq > MAX_NQ:
         raise Exception("Over size nq")
     if data_type == "local":
-        return generate_vectors(nq, dimension)
+        # the same query vectors for every run
+        return datagen.get_generator().float_vectors(nq, dimension, part=-1)
     elif data_type == "random":
         file_name = RANDOM_SRC_DATA_DIR + 'query_%d.npy' % dimension
     elif data_type == "sift":
@@ -98,12 +107,15 @@ def get_vectors_from_binary(nq, dimension, data_type):
     elif data_type == "binary":
         file_name = BINARY_SRC_DATA_DIR + 'query.npy'
     data = np.load(file_name)
-    vectors = data[0:nq].tolist()
-    return vectors
+    return data[0:nq]
+
+
+def get_vectors_from_binary(nq, dimension, data_type):
+    return load_query_vectors(nq, dimension, data_type).tolist()
 
 
 def generate_vectors(nb, dim):
-    return [[random.random() for _ in range(dim)] for _ in range(nb)]
+    return np.random.random((nb, dim)).tolist()
 
 
 def generate_values(data_type, vectors, ids):
@@ -128,6 +140,92 @@ def generate_entities(info, vectors, ids=None):
     return entities
 
 
+def load_vectors_from_file(file_name, mmap=True):
+    """
+    Load the source npy file, with mmap the returned array is backed by the page cache,
+    slicing it does not copy the data
+    """
+    return np.load(file_name, mmap_mode="r" if mmap else None)
+
+
+def iter_insert_batches(data_type, dimension, size, ni, columnar=False):
+    """
+    Yield (start_id, vectors) for every ni-sized batch of the collection,
+    vectors are generated for the local data type and loaded from the npy files otherwise
+    """
+    vectors_per_file = get_len_vectors_per_file(data_type, dimension)
+    i = 0
+    if data_type == "local" or not data_type:
+        while i < (size // vectors_per_file):
+            for j in range(vectors_per_file // ni):
+                start_id = i * vectors_per_file + j * ni
+                # seeded by the start id, the collection is the same for every run
+                vectors = datagen.get_generator().float_vectors(ni, dimension, part=start_id)
+                if not columnar:
+                    vectors = vectors.tolist()
+                yield start_id, vectors
+            i += 1
+    elif vectors_per_file >= ni:
+        while i < (size // vectors_per_file):
+            file_name = gen_file_name(i, dimension, data_type)
+            data = load_vectors_from_file(file_name, mmap=columnar)
+            for j in range(vectors_per_file // ni):
+                vectors = data[j * ni:(j + 1) * ni]
+                if len(vectors):
+                    yield i * vectors_per_file + j * ni, vectors
+            i += 1
+    else:
+        loops = ni // vectors_per_file
+        while i < (size // vectors_per_file):
+            vectors = []
+            for j in range(loops):
+                file_name = gen_file_name(i + j, dimension, data_type)
+                vectors.append(load_vectors_from_file(file_name, mmap=columnar))
+            yield i * vectors_per_file, np.concatenate(vectors)
+            i += loops
+
+
+def generate_columnar_values(field, vectors, ids):
+    """
+    Same as generate_values, but keep the values as contiguous numpy arrays
+    vectors: 2-D ndarray
+    ids: 1-D int64 ndarray, e.g. np.arange(start_id, end_id)
+    """
+    data_type = field["type"]
+    values = None
+    if data_type in [DataType.INT32, DataType.INT64]:
+        values = ids
+    elif data_type in [DataType.FLOAT, DataType.DOUBLE]:
+        values = ids.astype(np.float64)
+    elif data_type == DataType.FLOAT_VECTOR:
+        values = np.ascontiguousarray(vectors, dtype=np.float32)
+    elif data_type == DataType.BINARY_VECTOR:
+        # binary vectors are sent as bytes, pack the bits if the source is not packed yet
+        dimension = field["params"]["dim"]
+        if vectors.shape[1] != dimension // 8:
+            vectors = np.packbits(vectors.astype(np.uint8), axis=-1)
+        vectors = np.ascontiguousarray(vectors, dtype=np.uint8)
+        values = [row.tobytes() for row in vectors]
+    return values
+
+
+def generate_columnar_entities(info, vectors, ids):
+    entities = []
+    for field in info["fields"]:
+        entities.append(
+            {"name": field["name"], "type": field["type"], "values": generate_columnar_values(field, vectors, ids)})
+    return entities
+
+
+def ids_to_expr(ids, field_name=DEFAULT_PRIMARY_FIELD_NAME):
+    """
+    term expression of the ids, e.g. "id in [1, 2, 3]"
+    the ids are converted to python ints first: str() of a large ndarray is truncated with "...",
+    and str() of a list of numpy ints may not be a valid expression
+    """
+    return "%s in %s" % (field_name, str(np.asarray(ids, dtype=np.int64).tolist()))
+
+
 def metric_type_trans(metric_type):
     if metric_type in METRIC_MAP.keys():
         return METRIC_MAP[metric_type]
@@ -135,6 +233,26 @@ def metric_type_trans(metric_type):
         raise Exception("metric_type: %s not in METRIC_MAP" % metric_type)
 
 
+def parse_filter(filter):
+    """
+    filter of the suite, e.g. {"range": "..."} or {"term": "..."}, to (filter_query, filter_param),
+    a new filter_query for each filter, None is the search without filter
+    """
+    filter_query = []
+    filter_param = []
+    if filter is None:
+        return filter_query, filter_param
+    if not isinstance(filter, dict) or not ("range" in filter or "term" in filter):
+        raise Exception("%s not supported" % filter)
+    if "range" in filter:
+        filter_query.append(eval(filter["range"]))
+        filter_param.append(filter["range"])
+    if "term" in filter:
+        filter_query.append(eval(filter["term"]))
+        filter_param.append(filter["term"])
+    return filter_query, filter_param
+
+
 def get_dataset(hdf5_file_path):
     if not os.path.exists(hdf5_file_path):
         raise Exception("%s not existed" % hdf5_file_path)
@@ -227,36 +345,116 @@ def gen_file_name(idx, dimension, data_type):
     return fname
 
 
-def get_recall_value(true_ids, result_ids):
+def result_ids_to_array(result_ids, top_k):
     """
-    Use the intersection length
-    true_ids: neighbors taken from the dataset
-    result_ids: ids returned by query
+    Convert the id lists returned by query into a (nq, top_k) array,
+    the rows with less than top_k results are padded with -1
     """
-    sum_radio = 0.0
+    ids_array = np.full((len(result_ids), top_k), -1, dtype=np.int64)
     for index, item in enumerate(result_ids):
-        # tmp = set(item).intersection(set(flat_id_list[index]))
-
-        # Get the value of true_ids and the returned value to do the intersection
-        tmp = set(true_ids[index]).intersection(set(item))
+        length = min(len(item), top_k)
+        ids_array[index, :length] = item[:length]
+    return ids_array
 
-        # Add up each ratio
-        sum_radio = sum_radio + len(tmp) / len(item)
-        # logger.debug(sum_radio)
 
-    # Calculate the average ratio and take three digits after the decimal point
-    return round(sum_radio / len(result_ids), 3)
+def get_recall_metrics(true_ids, result_ids):
+    """
+    Compute the metrics over the whole result matrix
+    true_ids: (nq, k) neighbors taken from the dataset
+    result_ids: (nq, top_k) ids returned by query, padded with -1
+    recall: hits / top_k, precision: hits / returned ids, map: mean average precision
+    """
+    true_ids = np.asarray(true_ids, dtype=np.int64)
+    if not isinstance(result_ids, np.ndarray):
+        result_ids = result_ids_to_array(result_ids, true_ids.shape[1])
+    result_ids = result_ids.astype(np.int64, copy=False)
+    nq, top_k = result_ids.shape
+    valid = result_ids >= 0
+    # shift the ids of each query into its own range, after sorting each row the flattened
+    # ground truth is globally sorted and one searchsorted call matches every row separately
+    span = int(max(true_ids.max(), result_ids.max())) + 1
+    offsets = np.arange(nq, dtype=np.int64).reshape(-1, 1) * span
+    sorted_true_ids = (np.sort(true_ids, axis=1) + offsets).ravel()
+    shifted_result_ids = (result_ids + offsets).ravel()
+    positions = np.searchsorted(sorted_true_ids, shifted_result_ids)
+    positions[positions == len(sorted_true_ids)] = 0
+    hits = (sorted_true_ids[positions] == shifted_result_ids).reshape(nq, top_k) & valid
+    hits_num = hits.sum(axis=1)
+    returned_num = np.maximum(valid.sum(axis=1), 1)
+    precision_at_rank = np.cumsum(hits, axis=1) / np.arange(1, top_k + 1)
+    average_precision = (precision_at_rank * hits).sum(axis=1) / min(top_k, true_ids.shape[1])
+    return {
+        "recall": round(float((hits_num / top_k).mean()), 3),
+        "precision": round(float((hits_num / returned_num).mean()), 3),
+        "map": round(float(average_precision.mean()), 3)
+    }
 
 
-def get_ground_truth_ids(collection_size):
-    fname = GROUNDTRUTH_MAP[str(collection_size)]
-    fname = SIFT_SRC_GROUNDTRUTH_DATA_DIR + "/" + fname
-    a = np.fromfile(fname, dtype='int32')
+def get_recall_value(true_ids, result_ids):
+    """
+    Use the intersection length
+    true_ids: neighbors taken from the dataset
+    result_ids: ids returned by query
+    """
+    return get_recall_metrics(true_ids, result_ids)["recall"]
+
+
+# ground truth arrays loaded by file name, mapped instead of read into memory
+_ground_truth_cache = dict()
+_ground_truth_manifests = dict()
+
+
+def ground_truth_key(data_type, collection_size, dimension, metric_type, filter_query=None):
+    key = {
+        "data_type": data_type,
+        "collection_size": collection_size,
+        "dimension": dimension,
+        "metric_type": metric_type,
+        "filter": filter_query or None
+    }
+    return hashlib.md5(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_ground_truth_manifest(groundtruth_dir=GROUNDTRUTH_DIR, cache=True):
+    """ {key: {"file", "nq", "top_k", ...}}, empty if no ground truth has been built """
+    if cache and groundtruth_dir in _ground_truth_manifests:
+        return _ground_truth_manifests[groundtruth_dir]
+    file_name = os.path.join(groundtruth_dir, GROUNDTRUTH_MANIFEST)
+    manifest = dict()
+    if os.path.exists(file_name):
+        with open(file_name) as f:
+            manifest = json.load(f)
+    _ground_truth_manifests[groundtruth_dir] = manifest
+    return manifest
+
+
+def load_ivecs(fname):
+    if fname in _ground_truth_cache:
+        return _ground_truth_cache[fname]
+    a = np.memmap(fname, dtype='int32', mode='r')
     d = a[0]
-    true_ids = a.reshape(-1, d + 1)[:, 1:].copy()
+    true_ids = a.reshape(-1, d + 1)[:, 1:]
+    _ground_truth_cache[fname] = true_ids
     return true_ids
 
 
+def get_ground_truth_ids(collection_size, data_type="sift", dimension=128, metric_type="l2", filter_query=None,
+                         nq=0, top_k=0):
+    """
+    The ground truth in the manifest is used if it covers nq and top_k,
+    otherwise fall back to the sift ground truth of GROUNDTRUTH_MAP, which is unfiltered
+    """
+    key = ground_truth_key(data_type, collection_size, dimension, metric_type, filter_query)
+    entry = load_ground_truth_manifest().get(key)
+    if entry and entry["nq"] >= nq and entry["top_k"] >= top_k:
+        return load_ivecs(os.path.join(GROUNDTRUTH_DIR, entry["file"]))
+    if filter_query or str(collection_size) not in GROUNDTRUTH_MAP:
+        raise Exception("No ground truth of %s_%s_%s_%s, filter: %s, build it with runners/groundtruth.py" % (
+            data_type, collection_size, dimension, metric_type, json.dumps(filter_query)))
+    fname = GROUNDTRUTH_MAP[str(collection_size)]
+    return load_ivecs(SIFT_SRC_GROUNDTRUTH_DATA_DIR + "/" + fname)
+
+
 def normalize(metric_type, X):
     if metric_type == "ip":
         logger.info("Set normalize for metric_type: %s" % metric_type)
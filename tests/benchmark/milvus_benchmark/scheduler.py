@@ -1,27 +1,191 @@
-# import logging
-# from apscheduler.schedulers.background import BackgroundScheduler
-# from apscheduler.schedulers.blocking import BlockingScheduler
-
-# from apscheduler.jobstores.mongodb import MongoDBJobStore
-# from apscheduler.executors.pool import ProcessPoolExecutor, ThreadPoolExecutor
-# from apscheduler.executors.debug import DebugExecutor
-# import config
-# from pymongo import MongoClient
-
-# logger = logging.basicConfig()
-
-# mongo_client = MongoClient(config.MONGO_SERVER)
-# jobstores = {
-#     'default': MongoDBJobStore(database=config.SCHEDULER_DB, collection=config.JOB_COLLECTION, client=mongo_client)
-# }
-
-# executors = {
-#     'default': ThreadPoolExecutor(max_workers=100)
-# }
-
-# job_defaults = {
-#     'coalesce': True,
-#     'max_instances': 32
-# }
-# # TODO:
-# back_scheduler = BackgroundScheduler(executors=executors, job_defaults=job_defaults, logger=logger)
\ No newline at end of file
+import sys
+import uuid
+import json
+import time
+import signal
+import sqlite3
+import logging
+import threading
+import traceback
+import multiprocessing
+
+from milvus_benchmark import config
+
+logger = logging.getLogger("milvus_benchmark.scheduler")
+
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+SUCC = "RUN_SUCC"
+FAILED = "RUN_FAILED"
+TIMEOUT = "TIMEOUT"
+DEFAULT_RETRIES = 1
+# seconds given to the job to save the metric and tear down the env after the timeout
+TERMINATE_GRACE_TIME = 60
+POLL_INTERVAL = 1
+
+
+class JobQueue(object):
+    """
+    Job queue in sqlite, the jobs of one invocation share a batch id and the queue only sees its own batch,
+    so the jobs left by the former runs, possibly of other suites, are not run again.
+    A batch killed halfway is resumed explicitly: JobQueue(batch=id, resume=True) sets its running jobs pending
+    """
+
+    def __init__(self, path=config.SCHEDULER_DB_PATH, batch=None, resume=False):
+        if resume and not batch:
+            raise Exception("Job batch to resume not given")
+        self._path = path
+        self._batch = batch or "%s-%s" % (time.strftime("%Y%m%d%H%M%S"), uuid.uuid4().hex[:8])
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS %s (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                               "run_type TEXT, suite TEXT, env_mode TEXT, env_params TEXT, timeout INTEGER, "
+                               "retries INTEGER, attempts INTEGER DEFAULT 0, status TEXT, endpoint TEXT, "
+                               "message TEXT, created REAL, updated REAL, batch TEXT)" % config.JOB_COLLECTION)
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(%s)" % config.JOB_COLLECTION)]
+            if "batch" not in columns:
+                # created before the batches
+                self._conn.execute("ALTER TABLE %s ADD COLUMN batch TEXT" % config.JOB_COLLECTION)
+            if resume:
+                cursor = self._conn.execute("UPDATE %s SET status = ? WHERE status = ? AND batch = ?"
+                                            % config.JOB_COLLECTION, (PENDING, RUNNING, self._batch))
+                logger.info("Resume job batch %s, %d running jobs pending again" % (self._batch, cursor.rowcount))
+
+    @property
+    def batch(self):
+        return self._batch
+
+    def add(self, run_type, suite, env_mode, env_params, timeout=None, retries=DEFAULT_RETRIES):
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO %s (run_type, suite, env_mode, env_params, timeout, retries, status, created, updated, "
+                "batch) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)" % config.JOB_COLLECTION,
+                (run_type, json.dumps(suite), env_mode, json.dumps(env_params), timeout, retries, PENDING, now, now,
+                 self._batch))
+            return cursor.lastrowid
+
+    def acquire(self, endpoint):
+        """ take the oldest pending job, return None if there is no one """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, run_type, suite, env_mode, env_params, timeout, retries, attempts FROM %s "
+                "WHERE status = ? AND batch = ? ORDER BY id LIMIT 1" % config.JOB_COLLECTION,
+                (PENDING, self._batch)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE %s SET status = ?, endpoint = ?, attempts = attempts + 1, updated = ? "
+                               "WHERE id = ?" % config.JOB_COLLECTION, (RUNNING, json.dumps(endpoint), time.time(), row[0]))
+        return {
+            "id": row[0],
+            "run_type": row[1],
+            "suite": json.loads(row[2]),
+            "env_mode": row[3],
+            "env_params": json.loads(row[4]),
+            "timeout": row[5],
+            "retries": row[6],
+            "attempts": row[7] + 1
+        }
+
+    def finish(self, job, status, message=""):
+        """ the failed job is pending again until it runs out of the retries """
+        if status != SUCC and job["attempts"] <= job["retries"]:
+            logger.info("Job %d %s, retry %d/%d" % (job["id"], status, job["attempts"], job["retries"]))
+            status = PENDING
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE %s SET status = ?, message = ?, updated = ? WHERE id = ?"
+                               % config.JOB_COLLECTION, (status, message, time.time(), job["id"]))
+
+    def count(self, status):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM %s WHERE status = ? AND batch = ?"
+                                      % config.JOB_COLLECTION, (status, self._batch)).fetchone()[0]
+
+    def jobs(self):
+        """ the jobs of the batch """
+        with self._lock:
+            rows = self._conn.execute("SELECT id, run_type, env_params, status FROM %s WHERE batch = ? ORDER BY id"
+                                      % config.JOB_COLLECTION, (self._batch,)).fetchall()
+        return [{"id": row[0], "run_type": row[1], "env_params": json.loads(row[2]), "status": row[3]}
+                for row in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+def _exit_on_terminate(signum, frame):
+    # raise SystemExit in the job, so that the metric is saved and the env is torn down in run_suite
+    sys.exit(-1)
+
+
+def _run_job(run_func, job, env_params):
+    signal.signal(signal.SIGTERM, _exit_on_terminate)
+    result = False
+    try:
+        result = run_func(job["run_type"], job["suite"], job["env_mode"], env_params, timeout=job["timeout"])
+    finally:
+        from milvus_benchmark.metrics import api
+        api.close()
+    sys.exit(0 if result else 1)
+
+
+class Scheduler(object):
+    """
+    Run the jobs of the queue concurrently, one job at a time on each endpoint:
+        local: endpoint is {"host": string, "port": string}, set into the env params of the job
+        helm: endpoint is a slot of helm release, each job deploys its own server
+    Each job runs in a child process, killed when it runs over the timeout
+    """
+
+    def __init__(self, run_func, job_queue, endpoints):
+        """ run_func: func(run_type, suite, env_mode, env_params, timeout=None) -> bool """
+        self._run_func = run_func
+        self._queue = job_queue
+        self._endpoints = endpoints
+
+    def _run(self, job, endpoint):
+        env_params = dict(job["env_params"])
+        if job["env_mode"] == "local" and endpoint:
+            env_params.update(endpoint)
+        process = multiprocessing.Process(target=_run_job, args=(self._run_func, job, env_params),
+                                          name="job-%d" % job["id"])
+        process.start()
+        process.join(job["timeout"])
+        if process.is_alive():
+            logger.error("Job %d timeout after %ss, terminate it" % (job["id"], job["timeout"]))
+            process.terminate()
+            process.join(TERMINATE_GRACE_TIME)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            return TIMEOUT
+        return SUCC if process.exitcode == 0 else FAILED
+
+    def _work(self, endpoint):
+        while True:
+            job = self._queue.acquire(endpoint)
+            if job is None:
+                return
+            logger.info("Run job %d: %s on endpoint: %s, attempt: %d" % (
+                job["id"], job["run_type"], json.dumps(endpoint), job["attempts"]))
+            message = ""
+            try:
+                status = self._run(job, endpoint)
+            except Exception as e:
+                logger.error(traceback.format_exc())
+                status = FAILED
+                message = str(e)
+            logger.info("Job %d finished: %s" % (job["id"], status))
+            self._queue.finish(job, status, message)
+
+    def run(self):
+        """ block until all the jobs finished, return True if all of them succeeded """
+        failed = self._queue.count(FAILED) + self._queue.count(TIMEOUT)
+        workers = [threading.Thread(target=self._work, args=(endpoint,), name="endpoint-%d" % i)
+                   for i, endpoint in enumerate(self._endpoints)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return self._queue.count(FAILED) + self._queue.count(TIMEOUT) == failed
@@ -0,0 +1,34 @@
+import pytest
+from milvus_benchmark.runners.build import segments_done, BuildTracker, SEGMENT_STATE_FLUSHED
+
+
+class FakeClient(object):
+    def __init__(self, states):
+        self._states = states
+
+    def flush(self):
+        pass
+
+    def get_segment_infos(self):
+        return [{"state": state, "num_rows": 100} for state in self._states]
+
+
+def test_segments_done():
+    assert segments_done([100, 50, 200], 0) == 0
+    assert segments_done([100, 50, 200], 160) == 2
+    assert segments_done([100, 50, 200], 350) == 3
+
+
+def test_seal():
+    tracker = BuildTracker(FakeClient([SEGMENT_STATE_FLUSHED] * 2), "float_vector", poll_interval=0.01)
+    tracker.seal()
+    assert len(tracker.segments) == 2
+    assert "seal" in tracker.phases
+
+
+def test_seal_timeout():
+    # a segment never flushed
+    tracker = BuildTracker(FakeClient([SEGMENT_STATE_FLUSHED, SEGMENT_STATE_FLUSHED - 1]), "float_vector",
+                           poll_interval=0.01, build_timeout=0.05)
+    with pytest.raises(Exception):
+        tracker.seal()
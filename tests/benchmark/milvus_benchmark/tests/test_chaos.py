@@ -0,0 +1,33 @@
+from milvus_benchmark.runners.chaos import analyze_fault, count_lost_requests
+from milvus_benchmark.runners.locust_stats import TimeSeriesStats
+
+
+def test_analyze_fault():
+    times = list(range(30))
+    rps = [100] * 10 + [20] * 10 + [50] * 2 + [100] * 8
+    p99 = [10] * 10 + [100] * 10 + [10] * 10
+    time_series = {
+        "interval": 1,
+        "time": times,
+        "tasks": {"search": {"rps": rps, "fail_ratio": [0] * 30, "p99": p99}}
+    }
+    result = analyze_fault(time_series, 10, 20)["search"]
+    assert result["baseline"] == {"rps": 100, "p99": 10}
+    assert result["fault"]["rps"] == 20
+    assert result["rps_change"] == -0.8
+    assert result["p99_change"] == 9
+    assert result["time_to_recover"] == 2
+    # not recovered at the end of the run
+    time_series["tasks"]["search"]["rps"] = rps[:20] + [50] * 10
+    assert analyze_fault(time_series, 10, 20)["search"]["time_to_recover"] is None
+
+
+def test_count_lost_requests():
+    stats = TimeSeriesStats()
+    stats.record("search", 10, failed=True)
+    stats.record("search", 10)
+    stats.record("insert", 20, failed=True)
+    summary = stats.summary()
+    assert summary["total"]["failures"] == 2
+    assert count_lost_requests(summary) == 2
+    assert count_lost_requests(dict()) == 0
@@ -0,0 +1,52 @@
+import numpy as np
+from milvus_benchmark.runners import datagen
+from milvus_benchmark.runners.datagen import DataGenerator
+
+
+def batched(func, nb, ni_per):
+    return np.concatenate([func(min(ni_per, nb - start), start) for start in range(0, nb, ni_per)])
+
+
+def test_float_vectors_batch_size():
+    generator = DataGenerator()
+    nb = 3 * datagen.BLOCK_SIZE + 100
+    expected = generator.float_vectors(nb, 8)
+    for ni_per in [1, 700, datagen.BLOCK_SIZE, 5000]:
+        vectors = batched(lambda n, part: generator.float_vectors(n, 8, part=part), nb, ni_per)
+        assert np.array_equal(vectors, expected)
+
+
+def test_gaussian_mixture_batch_size():
+    generator = DataGenerator()
+    expected = generator.float_vectors(2000, 8, distribution=datagen.GAUSSIAN_MIXTURE, clusters=10)
+    vectors = batched(lambda n, part: generator.float_vectors(
+        n, 8, distribution=datagen.GAUSSIAN_MIXTURE, clusters=10, part=part), 2000, 300)
+    assert np.array_equal(vectors, expected)
+
+
+def test_binary_vectors_batch_size():
+    generator = DataGenerator()
+    expected = generator.binary_vectors(2500, 64)
+    assert expected.shape == (2500, 8)
+    vectors = batched(lambda n, part: generator.binary_vectors(n, 64, part=part), 2500, 999)
+    assert np.array_equal(vectors, expected)
+
+
+def test_seed():
+    assert np.array_equal(DataGenerator(seed=1).float_vectors(10, 4), DataGenerator(seed=1).float_vectors(10, 4))
+    assert not np.array_equal(DataGenerator(seed=1).float_vectors(10, 4), DataGenerator(seed=2).float_vectors(10, 4))
+    assert np.array_equal(DataGenerator(seed=1).scalars(10, distribution=datagen.ZIPF),
+                          DataGenerator(seed=1).scalars(10, distribution=datagen.ZIPF))
+
+
+def test_query_part():
+    generator = DataGenerator()
+    assert not np.array_equal(generator.float_vectors(10, 4, part=-1), generator.float_vectors(10, 4))
+
+
+def test_cache(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    vectors = DataGenerator(cache_dir=cache_dir).float_vectors(100, 4, part=50)
+    cached = DataGenerator(cache_dir=cache_dir).float_vectors(100, 4, part=50)
+    assert np.array_equal(vectors, cached)
+    assert np.array_equal(vectors, DataGenerator().float_vectors(100, 4, part=50))
@@ -0,0 +1,36 @@
+import numpy as np
+from milvus_benchmark.runners.utils import ids_to_expr
+from milvus_benchmark.runners.get import draw_ids, get_deleted_ids, UNIFORM, ZIPF, RECENT, MISSING, DELETED
+
+
+def test_ids_to_expr():
+    assert ids_to_expr([1, 2, 3]) == "id in [1, 2, 3]"
+    assert ids_to_expr(np.array([7], dtype=np.int32), field_name="pk") == "pk in [7]"
+    # str() of a large ndarray is truncated
+    expr = ids_to_expr(np.arange(5000))
+    assert "..." not in expr
+    assert expr.endswith("4998, 4999]")
+
+
+def test_draw_ids():
+    rng = np.random.default_rng(0)
+    collection_size, recent_size, deleted_size = 10000, 100, 50
+    ids = draw_ids(rng, UNIFORM, 1000, collection_size)
+    assert ids.min() >= 0 and ids.max() < collection_size
+    ids = draw_ids(rng, ZIPF, 1000, collection_size)
+    assert ids.max() < collection_size
+    assert len(np.unique(ids)) < 1000
+    ids = draw_ids(rng, RECENT, 1000, collection_size, recent_size=recent_size)
+    assert ids.min() >= collection_size and ids.max() < collection_size + recent_size
+    ids = draw_ids(rng, MISSING, 1000, collection_size, recent_size=recent_size)
+    assert ids.min() >= collection_size + recent_size
+    ids = draw_ids(rng, DELETED, 1000, collection_size, deleted_size=deleted_size)
+    assert np.isin(ids, get_deleted_ids(collection_size, deleted_size)).all()
+
+
+def test_get_deleted_ids():
+    deleted_ids = get_deleted_ids(10000, 50)
+    assert len(deleted_ids) == 50
+    assert deleted_ids[0] == 0 and deleted_ids[-1] == 9800
+    assert len(get_deleted_ids(5, 10)) == 5
+    assert len(get_deleted_ids(10000, 0)) == 0
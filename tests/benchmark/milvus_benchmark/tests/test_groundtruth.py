@@ -0,0 +1,72 @@
+import numpy as np
+from milvus_benchmark.runners.groundtruth import merge_topk, brute_force_search
+
+
+def exact_distances(queries, vectors, metric_type):
+    queries = queries.astype(np.float64)
+    vectors = vectors.astype(np.float64)
+    if metric_type == "l2":
+        return ((queries[:, np.newaxis, :] - vectors[np.newaxis, :, :]) ** 2).sum(axis=2)
+    return -queries @ vectors.T
+
+
+def split_blocks(vectors, sizes):
+    blocks = []
+    start = 0
+    for size in sizes:
+        blocks.append((start, vectors[start:start + size]))
+        start += size
+    return blocks
+
+
+def test_merge_topk():
+    rng = np.random.default_rng(0)
+    nq, top_k = 5, 4
+    best_distances = np.full((nq, top_k), np.inf, dtype=np.float32)
+    best_ids = np.full((nq, top_k), -1, dtype=np.int64)
+    all_distances = []
+    # one block wider and one narrower than top_k
+    for start, size in [(0, 10), (10, 3)]:
+        distances = rng.random((nq, size), dtype=np.float32)
+        all_distances.append(distances)
+        ids = np.arange(start, start + size, dtype=np.int64)
+        best_distances, best_ids = merge_topk(best_distances, best_ids, distances, ids, top_k)
+    expected = np.argsort(np.hstack(all_distances), axis=1)[:, :top_k]
+    order = np.argsort(best_distances, axis=1)
+    assert np.array_equal(np.take_along_axis(best_ids, order, axis=1), expected)
+
+
+def test_brute_force_search():
+    rng = np.random.default_rng(1)
+    vectors = rng.random((1000, 16), dtype=np.float32)
+    queries = rng.random((20, 16), dtype=np.float32)
+    top_k = 10
+    for metric_type in ["l2", "ip"]:
+        ids = brute_force_search(queries, split_blocks(vectors, [300, 5, 695]), top_k, metric_type, threads=2)
+        distances = exact_distances(queries, vectors, metric_type)
+        expected = np.sort(distances, axis=1)[:, :top_k]
+        assert np.allclose(np.take_along_axis(distances, ids, axis=1), expected, rtol=1e-4, atol=1e-4)
+
+
+def test_brute_force_search_mask_and_padding():
+    rng = np.random.default_rng(2)
+    vectors = rng.random((100, 8), dtype=np.float32)
+    queries = rng.random((3, 8), dtype=np.float32)
+    mask = np.zeros(100, dtype=bool)
+    mask[[3, 50, 97]] = True
+    ids = brute_force_search(queries, split_blocks(vectors, [40, 60]), 5, "l2", mask=mask)
+    assert ids.shape == (3, 5)
+    assert (ids[:, 3:] == -1).all()
+    for row in ids:
+        assert sorted(row[:3].tolist()) == [3, 50, 97]
+
+
+def test_brute_force_search_hamming():
+    rng = np.random.default_rng(3)
+    bits = rng.random((200, 64)) < 0.5
+    vectors = np.packbits(bits, axis=1)
+    query_bits = rng.random((4, 64)) < 0.5
+    ids = brute_force_search(np.packbits(query_bits, axis=1), [(0, vectors)], 5, "hamming")
+    distances = (query_bits[:, np.newaxis, :] != bits[np.newaxis, :, :]).sum(axis=2)
+    expected = np.sort(distances, axis=1)[:, :5]
+    assert np.array_equal(np.take_along_axis(distances, ids, axis=1), expected)
@@ -0,0 +1,54 @@
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+
+def test_percentile_relative_error():
+    histogram = LatencyHistogram()
+    for value in range(1, 100001):
+        histogram.record_us(value)
+    assert histogram.count == 100000
+    for percentile in [50, 90, 99, 99.9]:
+        expected = percentile / 100.0 * 100000
+        assert abs(histogram.percentile_us(percentile) - expected) <= expected * 0.001
+
+
+def test_record_seconds():
+    histogram = LatencyHistogram()
+    histogram.record(0.002)
+    histogram.record(0.004)
+    summary = histogram.summary()
+    assert summary["count"] == 2
+    assert summary["min"] == 2.0
+    assert summary["max"] == 4.0
+    assert summary["mean"] == 3.0
+
+
+def test_merge():
+    merged = LatencyHistogram()
+    total = LatencyHistogram()
+    for i in range(4):
+        part = LatencyHistogram()
+        for value in range(i * 1000, (i + 1) * 1000):
+            part.record_us(value)
+            total.record_us(value)
+        merged.merge(part)
+    assert merged.export() == total.export()
+    assert merged.summary() == total.summary()
+
+
+def test_export_load():
+    histogram = LatencyHistogram()
+    for value in [10, 200, 3000, 40000, 500000]:
+        histogram.record_us(value, count=3)
+    loaded = LatencyHistogram.load(histogram.export())
+    assert loaded.count == 15
+    assert loaded.export() == histogram.export()
+    assert loaded.percentile_us(99) == histogram.percentile_us(99)
+
+
+def test_empty():
+    histogram = LatencyHistogram()
+    assert histogram.percentile_us(99) == 0
+    assert histogram.summary()["count"] == 0
+    histogram.record_us(5)
+    histogram.reset()
+    assert histogram.count == 0
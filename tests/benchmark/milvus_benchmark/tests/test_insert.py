@@ -0,0 +1,96 @@
+import time
+import numpy as np
+import pytest
+from pymilvus import DataType
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners.base import BaseRunner
+
+DIMENSION = 16
+
+
+class FakeMilvus(object):
+    def __init__(self):
+        self.entities = []
+
+    def insert(self, entities):
+        time.sleep(0.01)
+        self.entities.append(entities)
+
+
+def get_info(data_type=DataType.FLOAT_VECTOR, dimension=DIMENSION):
+    return {"fields": [
+        {"name": "id", "type": DataType.INT64},
+        {"name": "float", "type": DataType.FLOAT},
+        {"name": "vector", "type": data_type, "params": {"dim": dimension}}
+    ]}
+
+
+@pytest.fixture
+def source_files(tmp_path, monkeypatch):
+    """ 4 files of 10 vectors """
+    rng = np.random.default_rng(0)
+    data = rng.random((40, DIMENSION), dtype=np.float32)
+    for i in range(4):
+        np.save(str(tmp_path / ("%d.npy" % i)), data[i * 10:(i + 1) * 10])
+    monkeypatch.setattr(utils, "get_len_vectors_per_file", lambda data_type, dimension: 10)
+    monkeypatch.setattr(utils, "gen_file_name", lambda i, dimension, data_type: str(tmp_path / ("%d.npy" % i)))
+    return data
+
+
+def test_load_vectors_from_file(source_files):
+    vectors = utils.load_vectors_from_file(utils.gen_file_name(1, DIMENSION, "sift"))
+    assert isinstance(vectors, np.memmap)
+    assert np.array_equal(vectors, source_files[10:20])
+    vectors = utils.load_vectors_from_file(utils.gen_file_name(1, DIMENSION, "sift"), mmap=False)
+    assert not isinstance(vectors, np.memmap)
+    assert np.array_equal(vectors, source_files[10:20])
+
+
+@pytest.mark.parametrize("ni", [5, 10, 20])
+def test_iter_insert_batches(source_files, ni):
+    rows = list(utils.iter_insert_batches("sift", DIMENSION, 40, ni))
+    columns = list(utils.iter_insert_batches("sift", DIMENSION, 40, ni, columnar=True))
+    assert [start_id for start_id, _ in columns] == list(range(0, 40, ni))
+    assert [start_id for start_id, _ in rows] == [start_id for start_id, _ in columns]
+    for (start_id, row_vectors), (_, vectors) in zip(rows, columns):
+        assert len(vectors) == ni
+        assert np.array_equal(row_vectors, vectors)
+        assert np.array_equal(vectors, source_files[start_id:start_id + ni])
+
+
+def test_iter_insert_batches_local():
+    rows = list(utils.iter_insert_batches("local", DIMENSION, utils.SIFT_VECTORS_PER_FILE, 50000))
+    columns = list(utils.iter_insert_batches("local", DIMENSION, utils.SIFT_VECTORS_PER_FILE, 50000, columnar=True))
+    assert [start_id for start_id, _ in rows] == [start_id for start_id, _ in columns] == [0, 50000]
+    for (_, row_vectors), (_, vectors) in zip(rows, columns):
+        assert isinstance(row_vectors, list)
+        assert np.array_equal(np.array(row_vectors, dtype=np.float32), vectors)
+
+
+def test_insert_core_columnar(source_files):
+    info = get_info()
+    vectors = source_files[10:20]
+    row_milvus = FakeMilvus()
+    BaseRunner.insert_core(None, row_milvus, info, 10, vectors)
+    milvus = FakeMilvus()
+    serialize_time, insert_time = BaseRunner.insert_core(None, milvus, info, 10, vectors, columnar=True)
+    assert serialize_time >= 0
+    # the insert request is not counted in the serialize time
+    assert insert_time >= 0.01
+    [row_entities], [entities] = row_milvus.entities, milvus.entities
+    assert [entity["name"] for entity in entities] == ["id", "float", "vector"]
+    ids, floats, column = [entity["values"] for entity in entities]
+    assert ids.dtype == np.int64
+    assert ids.tolist() == row_entities[0]["values"] == list(range(10, 20))
+    assert floats.tolist() == row_entities[1]["values"]
+    assert column.dtype == np.float32 and column.flags["C_CONTIGUOUS"]
+    assert np.array_equal(column, np.array(row_entities[2]["values"], dtype=np.float32))
+
+
+def test_insert_core_columnar_binary():
+    info = get_info(data_type=DataType.BINARY_VECTOR)
+    bits = np.random.default_rng(0).random((4, DIMENSION)) < 0.5
+    milvus = FakeMilvus()
+    BaseRunner.insert_core(None, milvus, info, 0, bits.astype(np.uint8), columnar=True)
+    values = milvus.entities[0][2]["values"]
+    assert values == [row.tobytes() for row in np.packbits(bits, axis=-1)]
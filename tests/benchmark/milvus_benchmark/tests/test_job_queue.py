@@ -0,0 +1,61 @@
+import pytest
+from milvus_benchmark import scheduler
+from milvus_benchmark.scheduler import JobQueue
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "scheduler.db")
+
+
+def add_job(queue, run_type="search_performance", retries=1):
+    return queue.add(run_type, {"collections": []}, "local", {"host": "127.0.0.1"}, retries=retries)
+
+
+def test_batch_isolation(path):
+    former = JobQueue(path=path)
+    add_job(former)
+    former.close()
+    queue = JobQueue(path=path)
+    assert queue.batch != former.batch
+    assert queue.acquire("local") is None
+    job_id = add_job(queue)
+    assert queue.acquire("local")["id"] == job_id
+    queue.close()
+
+
+def test_resume(path):
+    queue = JobQueue(path=path)
+    first = add_job(queue)
+    second = add_job(queue)
+    job = queue.acquire("local")
+    assert job["id"] == first
+    assert queue.count(scheduler.RUNNING) == 1
+    # killed halfway, the running job is left
+    queue.close()
+    assert JobQueue(path=path, batch=queue.batch).count(scheduler.PENDING) == 1
+    resumed = JobQueue(path=path, batch=queue.batch, resume=True)
+    assert resumed.count(scheduler.RUNNING) == 0
+    assert [resumed.acquire("local")["id"], resumed.acquire("local")["id"]] == [first, second]
+    assert resumed.acquire("local") is None
+    resumed.close()
+
+
+def test_resume_without_batch(path):
+    with pytest.raises(Exception):
+        JobQueue(path=path, resume=True)
+
+
+def test_retries(path):
+    queue = JobQueue(path=path)
+    add_job(queue, retries=1)
+    job = queue.acquire("local")
+    queue.finish(job, scheduler.FAILED)
+    assert queue.count(scheduler.PENDING) == 1
+    job = queue.acquire("local")
+    assert job["attempts"] == 2
+    queue.finish(job, scheduler.FAILED)
+    assert queue.count(scheduler.FAILED) == 1
+    assert queue.acquire("local") is None
+    assert [item["status"] for item in queue.jobs()] == [scheduler.FAILED]
+    queue.close()
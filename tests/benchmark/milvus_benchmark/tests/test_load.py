@@ -0,0 +1,10 @@
+from milvus_benchmark.runners.load import time_to_steady
+
+
+def test_time_to_steady():
+    latencies = [0.1] * 40 + [0.01] * 160
+    times = [i * 0.5 for i in range(len(latencies))]
+    assert time_to_steady(times, latencies) == (15.5, 31, 0.01)
+    assert time_to_steady(times, [0.01] * 200) == (0.0, 0, 0.01)
+    # too few requests
+    assert time_to_steady(times[:10], latencies[:10]) == (None, None, None)
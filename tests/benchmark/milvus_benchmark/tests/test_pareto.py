@@ -0,0 +1,12 @@
+from milvus_benchmark.runners.pareto import pareto_frontier
+
+
+def test_pareto_frontier():
+    points = [
+        {"name": "a", "recall": 0.9, "qps": 100},
+        {"name": "b", "recall": 0.95, "qps": 80},
+        {"name": "c", "recall": 0.92, "qps": 70},
+        {"name": "d", "recall": 0.99, "qps": 10}
+    ]
+    assert [point["name"] for point in pareto_frontier(points)] == ["a", "b", "d"]
+    assert pareto_frontier([]) == []
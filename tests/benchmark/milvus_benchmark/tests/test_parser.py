@@ -0,0 +1,60 @@
+from milvus_benchmark.parser import CaseMatrix, LazyCases
+
+
+def test_product_order():
+    matrix = CaseMatrix([("nq", [1, 10]), ("top_k", [1, 10, 100])])
+    assert len(matrix) == 6
+    assert matrix.total == 6
+    assert list(matrix)[:3] == [{"nq": 1, "top_k": 1}, {"nq": 1, "top_k": 10}, {"nq": 1, "top_k": 100}]
+    assert matrix[-1] == {"nq": 10, "top_k": 100}
+
+
+def test_exclude_include():
+    matrix = CaseMatrix([("nq", [1, 10]), ("search_param", [{"nprobe": 1}, {"nprobe": 8}])],
+                        exclude=[{"nq": 10, "search_param": {"nprobe": 8}}],
+                        include=[{"nq": 100, "search_param": {"nprobe": 1}}])
+    cases = list(matrix)
+    assert len(cases) == 4
+    assert {"nq": 10, "search_param": {"nprobe": 8}} not in cases
+    assert cases[-1] == {"nq": 100, "search_param": {"nprobe": 1}}
+
+
+def test_lhs_sample():
+    matrix = CaseMatrix([("a", [1, 2, 3, 4]), ("b", [1, 2, 3, 4]), ("c", [1, 2])],
+                        sample={"method": "lhs", "size": 4, "seed": 1})
+    cases = list(matrix)
+    assert len(cases) == 4
+    # every value of the axes is covered evenly
+    assert sorted(case["a"] for case in cases) == [1, 2, 3, 4]
+    assert sorted(case["b"] for case in cases) == [1, 2, 3, 4]
+    assert sorted(case["c"] for case in cases) == [1, 1, 2, 2]
+    again = CaseMatrix([("a", [1, 2, 3, 4]), ("b", [1, 2, 3, 4]), ("c", [1, 2])],
+                       sample={"method": "lhs", "size": 4, "seed": 1})
+    assert list(again) == cases
+
+
+def test_random_sample():
+    matrix = CaseMatrix([("a", list(range(10))), ("b", list(range(10)))],
+                        exclude=[{"a": 0}], sample={"method": "random", "size": 20, "seed": 1})
+    cases = list(matrix)
+    assert len(cases) == 20
+    assert all(case["a"] != 0 for case in cases)
+    assert len(set((case["a"], case["b"]) for case in cases)) == 20
+
+
+def test_lazy_cases():
+    built = []
+
+    def build(combination):
+        built.append(combination)
+        return dict(combination)
+
+    matrix = CaseMatrix([("nq", [1, 10])])
+    cases = LazyCases(matrix, build)
+    cases.apply(lambda case: case.update({"top_k": 10}))
+    assert built == []
+    assert cases[1] == {"nq": 10, "top_k": 10}
+    assert cases[1] is not cases[1]
+    metrics = LazyCases(matrix, build, cache=True)
+    assert metrics[0] is metrics[0]
+    assert len(metrics) == 2
@@ -0,0 +1,17 @@
+from milvus_benchmark.runners.utils import get_recall_metrics
+
+
+def test_get_recall_metrics():
+    true_ids = [[1, 2, 3, 4], [5, 6, 7, 8]]
+    result_ids = [[1, 9, 3, 10], [5, 6, 7, 8]]
+    metrics = get_recall_metrics(true_ids, result_ids)
+    assert metrics["recall"] == 0.75
+    assert metrics["precision"] == 0.75
+    # ap of the first query: (1/1 + 2/3) / 4
+    assert metrics["map"] == round((1 + 2 / 3) / 8 + 0.5, 3)
+
+
+def test_get_recall_metrics_padded():
+    metrics = get_recall_metrics([[1, 2]], [[2]])
+    assert metrics["recall"] == 0.5
+    assert metrics["precision"] == 1.0
@@ -0,0 +1,51 @@
+from milvus_benchmark.metrics.regression import detect_regressions
+
+
+def make_doc(run_id, qps, run_type="search_performance"):
+    return {
+        "run_id": run_id,
+        "status": "RUN_SUCC",
+        "metrics": {"type": run_type, "value": {"qps": qps}},
+        "collection": {"dataset_name": "sift_1m_128_l2"},
+        "index": {"index_type": "ivf_flat"},
+        "search": {"nq": 1},
+        "run_params": None,
+        "hardware": {"id": "host"}
+    }
+
+
+def baseline_docs(run_type="search_performance"):
+    return [make_doc(run_id, qps, run_type=run_type) for run_id, qps in enumerate([100, 101, 99, 100, 102], 1)]
+
+
+def test_regression():
+    docs = baseline_docs() + [make_doc(6, 50)]
+    report = detect_regressions(docs)
+    assert len(report) == 1
+    assert report[0]["metric"] == "qps"
+    assert report[0]["run_id"] == 6
+    assert report[0]["baseline"] == 100
+    assert report[0]["current"] == 50
+
+
+def test_no_regression():
+    docs = baseline_docs() + [make_doc(6, 101)]
+    assert detect_regressions(docs) == []
+    # not enough former runs
+    assert detect_regressions(baseline_docs()[:2] + [make_doc(6, 50)]) == []
+
+
+def test_regression_of_every_run():
+    # two suites of the same invocation saved with different run ids, only the first one regressed
+    docs = baseline_docs() + [make_doc(6, 50)]
+    docs += baseline_docs(run_type="qps_performance") + [make_doc(7, 100, run_type="qps_performance")]
+    assert detect_regressions(docs) == []
+    report = detect_regressions(docs, run_ids=[6, 7])
+    assert [item["run_id"] for item in report] == [6]
+    assert report[0]["case"]["run_type"] == "search_performance"
+
+
+def test_failed_runs_ignored():
+    failed = make_doc(6, 1)
+    failed["status"] = "RUN_FAILED"
+    assert detect_regressions(baseline_docs() + [failed], run_ids=[6]) == []
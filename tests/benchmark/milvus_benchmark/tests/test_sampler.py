@@ -0,0 +1,25 @@
+from milvus_benchmark.metrics.sampler import ResourceSampler
+
+
+def stop_with(series):
+    sampler = ResourceSampler()
+    sampler._series = series
+    return sampler.stop()
+
+
+def test_client_saturated():
+    resources = stop_with({"time": [1, 2], "client_cpu": [0.95, 0.97], "host_cpu_ratio": [0.2, 0.2]})
+    assert resources["client_saturated"]
+    assert not resources["host_saturated"]
+    resources = stop_with({"time": [1, 2], "client_cpu": [0.1, 0.1], "worker_cpu_max": [0.99, 0.93],
+                           "host_cpu_ratio": [0.3, 0.3]})
+    assert resources["client_saturated"]
+
+
+def test_host_saturated():
+    # the server of the local env keeps the host busy, the client is not the bottleneck
+    resources = stop_with({"time": [1, 2], "client_cpu": [0.2, 0.3], "worker_cpu_max": [0.4, 0.4],
+                           "host_cpu_ratio": [0.95, 0.99]})
+    assert not resources["client_saturated"]
+    assert resources["host_saturated"]
+    assert resources["summary"]["host_cpu_ratio"] == {"mean": 0.97, "max": 0.99}